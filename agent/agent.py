@@ -1,15 +1,75 @@
 import argparse
+import base64
+import copy
+import hashlib
 import json
 import os
+import random
+import re
 import socket
 import subprocess
 import sys
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from urllib import request, error
 
 
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 60.0
+DEFAULT_INTERVALS = {"poll_seconds": 60, "heartbeat_seconds": 300}
+INTERVAL_BOUNDS = (10, 3600)
+DUE_TOLERANCE_SECONDS = 5
+FAILURE_BACKOFF_MAX_SECONDS = 1800
+SPOOL_MAX_ITEMS = 500
+SPOOL_MAX_BYTES = 20 * 1024 * 1024
+SPOOL_BATCH_ITEMS = 50
+SPOOL_BATCH_BYTES = 1024 * 1024
+SYNC_VERSION = 1
+SYNC_RECHECK_SECONDS = 3600
+COLUMNAR_CONTENT_TYPE = "application/vnd.autopatch.columnar+json"
+
+telemetry = {"phases": {}, "commands": {}, "requests": {}, "scan_seconds": None}
+telemetry_lock = threading.Lock()
+
+
+def reset_telemetry():
+    with telemetry_lock:
+        telemetry["phases"] = {}
+        telemetry["commands"] = {}
+        telemetry["requests"] = {}
+
+
+def telemetry_snapshot() -> dict:
+    with telemetry_lock:
+        return copy.deepcopy(telemetry)
+
+
+def add_stat(group: str, name: str, **values):
+    with telemetry_lock:
+        entry = telemetry[group].setdefault(name, {"count": 0})
+        entry["count"] += 1
+        for key, value in values.items():
+            entry[key] = round(entry.get(key, 0) + value, 3)
+        if "seconds" in values:
+            entry["max_seconds"] = round(max(entry.get("max_seconds", 0), values["seconds"]), 3)
+
+
+@contextmanager
+def phase(name: str):
+    wall = time.monotonic()
+    cpu = time.process_time()
+    children = os.times()
+    try:
+        yield
+    finally:
+        after = os.times()
+        child_cpu = (after.children_user - children.children_user) + (after.children_system - children.children_system)
+        add_stat("phases", name, seconds=time.monotonic() - wall, cpu_seconds=time.process_time() - cpu, child_cpu_seconds=child_cpu)
+
+
 def read_env_file(path: Path) -> dict:
     data = {}
     if not path.exists():
@@ -40,35 +100,117 @@ def write_agent_token(state_dir: Path, token: str):
     token_file.write_text(token)
 
 
+def request_name(method: str, url: str) -> str:
+    path = "/" + url.split("://", 1)[-1].split("/", 1)[-1].split("?", 1)[0]
+    return f"{method} {re.sub(r'/[0-9]+', '/{id}', path)}"
+
+
 def http_json(method: str, url: str, headers: dict, payload: dict | None, timeout: int = 15):
     data = None
     if payload is not None:
         data = json.dumps(payload).encode("utf-8")
-        headers["Content-Type"] = "application/json"
+        headers.setdefault("Content-Type", "application/json")
     req = request.Request(url, data=data, headers=headers, method=method)
-    with request.urlopen(req, timeout=timeout) as resp:
-        body = resp.read().decode("utf-8")
-        if not body:
-            return {}
-        return json.loads(body)
+    start = time.monotonic()
+    try:
+        with request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+    except Exception:
+        add_stat("requests", request_name(method, url), seconds=time.monotonic() - start, sent_bytes=len(data or b""), errors=1)
+        raise
+    add_stat("requests", request_name(method, url), seconds=time.monotonic() - start, sent_bytes=len(data or b""), received_bytes=len(body))
+    if not body:
+        return {}
+    return json.loads(body.decode("utf-8"))
+
+
+def count_retry(method: str, url: str):
+    with telemetry_lock:
+        entry = telemetry["requests"].setdefault(request_name(method, url), {"count": 0})
+        entry["retries"] = entry.get("retries", 0) + 1
+
+
+def retry_after(exc: Exception) -> float | None:
+    if not isinstance(exc, error.HTTPError) or exc.headers is None:
+        return None
+    try:
+        delay = float(exc.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+    if not delay >= 0:
+        return None
+    return min(delay, RETRY_MAX_SECONDS)
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_SECONDS, cap: float = RETRY_MAX_SECONDS) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
 
 
 def http_json_retry(method: str, url: str, headers: dict, payload: dict | None, retries: int = 3):
     last_error = None
-    for _ in range(retries):
+    for attempt in range(retries):
+        if attempt:
+            count_retry(method, url)
         try:
             return http_json(method, url, headers, payload)
         except error.HTTPError as exc:
             last_error = exc
-            time.sleep(2)
+            if exc.code < 500 and exc.code not in {408, 429}:
+                raise
+            delay = retry_after(exc)
         except Exception as exc:
             last_error = exc
-            time.sleep(2)
+            delay = None
+        if attempt + 1 < retries:
+            time.sleep(delay if delay is not None else backoff_delay(attempt))
     raise last_error
 
 
+def columnar_inventory(inventory: dict) -> dict:
+    updates = inventory.get("updates") or []
+    flags = bytearray((len(updates) + 7) // 8)
+    for index, update in enumerate(updates):
+        if update.get("is_security"):
+            flags[index >> 3] |= 1 << (index & 7)
+    packages = {
+        "name": [update["name"] for update in updates],
+        "current": [update.get("current_version") for update in updates],
+        "candidate": [update.get("candidate_version") for update in updates],
+        "security": base64.b64encode(bytes(flags)).decode("ascii"),
+    }
+    compact = {key: value for key, value in inventory.items() if key != "updates"}
+    compact["packages"] = packages
+    return compact
+
+
+def columnar_payload(payload: dict) -> dict:
+    compact = dict(payload)
+    if compact.get("inventory"):
+        compact["inventory"] = columnar_inventory(compact["inventory"])
+    if compact.get("results"):
+        compact["results"] = [columnar_payload(result) for result in compact["results"]]
+    return compact
+
+
+def post_inventory(url: str, headers: dict, payload: dict, state_dir: Path):
+    if is_due(state_dir, "columnar_unsupported", SYNC_RECHECK_SECONDS):
+        try:
+            return http_json_retry("POST", url, {**headers, "Content-Type": COLUMNAR_CONTENT_TYPE}, columnar_payload(payload))
+        except error.HTTPError as exc:
+            if exc.code not in {415, 422}:
+                raise
+            mark_done(state_dir, "columnar_unsupported")
+    return http_json_retry("POST", url, dict(headers), payload)
+
+
 def run_cmd(args: list[str], timeout: int = 900):
-    proc = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+    start = time.monotonic()
+    try:
+        proc = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        add_stat("commands", " ".join(args[:2]), seconds=time.monotonic() - start, failures=1)
+        raise
+    add_stat("commands", " ".join(args[:2]), seconds=time.monotonic() - start, failures=int(proc.returncode != 0))
     return proc.returncode, proc.stdout, proc.stderr
 
 
@@ -121,15 +263,27 @@ def parse_apt_updates(output: str) -> list[dict]:
         name = parts[1]
         current = None
         candidate = None
-        if "[" in line and "]" in line:
-            current = line.split("[", 1)[1].split("]", 1)[0]
-        if "(" in line:
-            candidate = line.split("(", 1)[1].split(" ", 1)[0]
-        updates.append({"name": name, "current_version": current, "candidate_version": candidate, "is_security": False})
+        origins = ""
+        head, _, tail = line.partition("(")
+        if "[" in head and "]" in head:
+            current = head.split("[", 1)[1].split("]", 1)[0]
+        if tail:
+            candidate, _, origins = tail.partition(" ")
+        updates.append({"name": name, "current_version": current, "candidate_version": candidate, "is_security": "security" in origins.lower()})
     return updates
 
 
-def parse_yum_updates(output: str) -> list[dict]:
+def advisory_package(nevra: str) -> str:
+    base, _, arch = nevra.rpartition(".")
+    return f"{base.rsplit('-', 2)[0]}.{arch}"
+
+
+def parse_yum_updates(output: str, advisories: str = "") -> list[dict]:
+    security = set()
+    for line in advisories.splitlines():
+        parts = line.split()
+        if len(parts) >= 3 and "." in parts[2]:
+            security.add(advisory_package(parts[2]))
     updates = []
     for line in output.splitlines():
         if not line or line.startswith("Last metadata expiration check"):
@@ -139,7 +293,7 @@ def parse_yum_updates(output: str) -> list[dict]:
             continue
         name = parts[0]
         candidate = parts[1]
-        updates.append({"name": name, "current_version": None, "candidate_version": candidate, "is_security": False})
+        updates.append({"name": name, "current_version": None, "candidate_version": candidate, "is_security": name in security})
     return updates
 
 
@@ -148,35 +302,27 @@ def list_updates(pm: str) -> list[dict]:
         code, out, _ = run_cmd(["apt-get", "-s", "upgrade"])
         return parse_apt_updates(out) if code == 0 else []
     if pm in {"dnf", "yum"}:
-        code, out, _ = run_cmd([pm, "-q", "check-update"])
-        if code in {0, 100}:
-            return parse_yum_updates(out)
+        code, out, _ = run_cmd([pm, "-q", "-C", "check-update"])
+        if code not in {0, 100}:
+            code, out, _ = run_cmd([pm, "-q", "check-update"])
+        if code not in {0, 100}:
+            return []
+        advisories = ""
+        if code == 100:
+            advisory_code, advisory_out, _ = run_cmd([pm, "-q", "-C", "updateinfo", "list", "security"])
+            advisories = advisory_out if advisory_code == 0 else ""
+        return parse_yum_updates(out, advisories)
     return []
 
 
-def list_security_updates(pm: str) -> list[dict]:
-    if pm == "apt":
-        if shutil_which("unattended-upgrades"):
-            code, out, _ = run_cmd(["unattended-upgrades", "--dry-run"])
-            if code == 0:
-                updates = []
-                for line in out.splitlines():
-                    if line.startswith("Inst "):
-                        name = line.split()[1]
-                        updates.append({"name": name, "current_version": None, "candidate_version": None, "is_security": True})
-                return updates
-        return []
-    if pm in {"dnf", "yum"}:
-        if shutil_which(pm):
-            code, out, _ = run_cmd([pm, "updateinfo", "list", "security"])
-            if code == 0:
-                updates = []
-                for line in out.splitlines():
-                    parts = line.split()
-                    if len(parts) >= 3:
-                        updates.append({"name": parts[2], "current_version": None, "candidate_version": None, "is_security": True})
-                return updates
-    return []
+def get_boot_time() -> str | None:
+    path = Path("/proc/stat")
+    if not path.exists():
+        return None
+    for line in path.read_text().splitlines():
+        if line.startswith("btime "):
+            return datetime.fromtimestamp(int(line.split()[1]), tz=timezone.utc).isoformat()
+    return None
 
 
 def reboot_required(pm: str, updates: list[dict]) -> bool:
@@ -200,9 +346,12 @@ def collect_inventory() -> dict:
     os_version = os_release.get("VERSION_ID", "unknown")
     kernel = os.uname().release
     pm = detect_package_manager()
-    updates = list_updates(pm)
-    security_updates = list_security_updates(pm)
-    reboot = reboot_required(pm, updates)
+    start = time.monotonic()
+    with phase("list_updates"):
+        updates = list_updates(pm)
+    with phase("reboot_required"):
+        reboot = reboot_required(pm, updates)
+    telemetry["scan_seconds"] = round(time.monotonic() - start, 3)
     return {
         "hostname": hostname,
         "ip": ip,
@@ -212,20 +361,87 @@ def collect_inventory() -> dict:
         "package_manager": pm,
         "last_update_time": get_last_update_time(pm),
         "reboot_required": reboot,
-        "updates": updates,
-        "security_updates": security_updates
+        "boot_time": get_boot_time(),
+        "updates": updates
     }
 
 
-def apply_patches(pm: str, security_only: bool) -> tuple[int, str, str]:
+PACKAGE_CACHE_DIRS = {
+    "apt": (Path("/var/cache/apt/archives"), "*.deb"),
+    "dnf": (Path("/var/cache/dnf"), "*.rpm"),
+    "yum": (Path("/var/cache/yum"), "*.rpm"),
+}
+PREFETCH_MAX_AGE = timedelta(hours=24)
+
+
+def package_cache_bytes(pm: str) -> int:
+    if pm not in PACKAGE_CACHE_DIRS:
+        return 0
+    path, pattern = PACKAGE_CACHE_DIRS[pm]
+    if not path.exists():
+        return 0
+    total = 0
+    for item in path.rglob(pattern):
+        try:
+            total += item.stat().st_size
+        except OSError:
+            continue
+    return total
+
+
+def has_fresh_prefetch(state_dir: Path) -> bool:
+    path = state_dir / "prefetch_stamp"
+    if not path.exists():
+        return False
+    staged = datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc)
+    return datetime.now(timezone.utc) - staged < PREFETCH_MAX_AGE
+
+
+def prefetch_packages(pm: str, state_dir: Path) -> tuple[int, str, str, dict]:
     stdout = ""
     stderr = ""
+    before = package_cache_bytes(pm)
     if pm == "apt":
         code, out, err = run_cmd(["apt-get", "update"])
         stdout += out
         stderr += err
-        if code != 0:
-            return code, stdout, stderr
+        if code == 0:
+            code, out, err = run_cmd(["apt-get", "-y", "-d", "upgrade"])
+            stdout += out
+            stderr += err
+    elif pm in {"dnf", "yum"}:
+        code, out, err = run_cmd([pm, "-y", "--downloadonly", "update"])
+        stdout += out
+        stderr += err
+    else:
+        return 1, "", "Unsupported package manager", {}
+    staged_bytes = max(package_cache_bytes(pm) - before, 0)
+    if code == 0:
+        state_dir.mkdir(parents=True, exist_ok=True)
+        (state_dir / "prefetch_stamp").write_text(datetime.now(timezone.utc).isoformat())
+    return code, stdout, stderr, {"staged_bytes": staged_bytes}
+
+
+def apply_patches(pm: str, security_only: bool, state_dir: Path) -> tuple[int, str, str, dict]:
+    start = time.monotonic()
+    staged = has_fresh_prefetch(state_dir)
+    code, stdout, stderr = install_updates(pm, security_only, staged)
+    metrics = {"install_seconds": round(time.monotonic() - start, 3)}
+    if staged and code == 0:
+        (state_dir / "prefetch_stamp").unlink(missing_ok=True)
+    return code, stdout, stderr, metrics
+
+
+def install_updates(pm: str, security_only: bool, staged: bool) -> tuple[int, str, str]:
+    stdout = ""
+    stderr = ""
+    if pm == "apt":
+        if not staged:
+            code, out, err = run_cmd(["apt-get", "update"])
+            stdout += out
+            stderr += err
+            if code != 0:
+                return code, stdout, stderr
         if security_only and shutil_which("unattended-upgrades"):
             code, out, err = run_cmd(["unattended-upgrades", "-d"])
         else:
@@ -235,6 +451,8 @@ def apply_patches(pm: str, security_only: bool) -> tuple[int, str, str]:
         return code, stdout, stderr
     if pm in {"dnf", "yum"}:
         cmd = [pm, "-y", "update"]
+        if staged:
+            cmd.append("--cacheonly")
         if security_only:
             cmd.append("--security")
         code, out, err = run_cmd(cmd)
@@ -244,36 +462,205 @@ def apply_patches(pm: str, security_only: bool) -> tuple[int, str, str]:
     return 1, "", "Unsupported package manager"
 
 
-def execute_job(job_type: str) -> tuple[int, str, str]:
+def execute_job(job_type: str, state_dir: Path) -> tuple[int, str, str, dict]:
     pm = detect_package_manager()
     if job_type in {"SCAN_NOW", "REPORT_ONLY"}:
-        return 0, "Scan complete", ""
+        return 0, "Scan complete", "", {}
+    if job_type == "PREFETCH_PACKAGES":
+        return prefetch_packages(pm, state_dir)
     if job_type == "APPLY_PATCHES":
-        return apply_patches(pm, False)
+        return apply_patches(pm, False, state_dir)
     if job_type == "APPLY_SECURITY_ONLY":
-        return apply_patches(pm, True)
+        return apply_patches(pm, True, state_dir)
     if job_type == "REBOOT":
+        (state_dir / "last_heartbeat").unlink(missing_ok=True)
         code, out, err = run_cmd(["reboot"])
-        return code, out, err
-    return 1, "", "Unknown job type"
+        return code, out, err, {}
+    return 1, "", "Unknown job type", {}
 
 
-def should_send_heartbeat(state_dir: Path) -> bool:
+def read_machine_id() -> str:
+    path = Path("/etc/machine-id")
+    try:
+        return path.read_text().strip()[:64] if path.exists() else ""
+    except OSError:
+        return ""
+
+
+def host_fraction() -> float:
+    digest = hashlib.sha256((read_machine_id() or socket.gethostname()).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) / 0x100000000
+
+
+def next_slot_delay(interval: float, fraction: float, now: float | None = None) -> float:
+    now = time.time() if now is None else now
+    return interval - ((now - fraction * interval) % interval)
+
+
+def load_intervals(state_dir: Path) -> dict:
+    intervals = dict(DEFAULT_INTERVALS)
+    path = state_dir / "intervals.json"
+    if path.exists():
+        try:
+            intervals.update(json.loads(path.read_text()))
+        except ValueError:
+            pass
+    return intervals
+
+
+def save_intervals(state_dir: Path, data: dict):
+    hints = data.get("intervals") if isinstance(data, dict) else None
+    if not hints:
+        return
+    low, high = INTERVAL_BOUNDS
+    current = load_intervals(state_dir)
+    updated = dict(current)
+    for key in DEFAULT_INTERVALS:
+        if isinstance(hints.get(key), (int, float)):
+            updated[key] = min(max(int(hints[key]), low), high)
+    if updated != current:
+        state_dir.mkdir(parents=True, exist_ok=True)
+        (state_dir / "intervals.json").write_text(json.dumps(updated))
+
+
+def is_due(state_dir: Path, name: str, interval: float) -> bool:
     state_dir.mkdir(parents=True, exist_ok=True)
-    path = state_dir / "last_heartbeat"
+    path = state_dir / name
     if not path.exists():
         return True
-    last = datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc)
-    return datetime.now(timezone.utc) - last > timedelta(minutes=5)
+    return time.time() - path.stat().st_mtime + DUE_TOLERANCE_SECONDS >= interval
+
+
+def mark_done(state_dir: Path, name: str):
+    (state_dir / name).write_text(datetime.now(timezone.utc).isoformat())
+
+
+def should_send_heartbeat(state_dir: Path) -> bool:
+    return is_due(state_dir, "last_heartbeat", load_intervals(state_dir)["heartbeat_seconds"])
 
 
 def update_heartbeat(state_dir: Path):
-    path = state_dir / "last_heartbeat"
-    path.write_text(datetime.now(timezone.utc).isoformat())
+    mark_done(state_dir, "last_heartbeat")
+
+
+def in_backoff(state_dir: Path) -> bool:
+    path = state_dir / "backoff.json"
+    if not path.exists():
+        return False
+    try:
+        return time.time() < json.loads(path.read_text())["until"]
+    except (ValueError, KeyError):
+        return False
+
+
+def record_failure(state_dir: Path):
+    path = state_dir / "backoff.json"
+    failures = 0
+    if path.exists():
+        try:
+            failures = json.loads(path.read_text())["failures"]
+        except (ValueError, KeyError):
+            failures = 0
+    failures += 1
+    delay = backoff_delay(failures, load_intervals(state_dir)["poll_seconds"], FAILURE_BACKOFF_MAX_SECONDS)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"failures": failures, "until": time.time() + delay}))
+
+
+def clear_failures(state_dir: Path):
+    (state_dir / "backoff.json").unlink(missing_ok=True)
+
+
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, error.HTTPError):
+        return exc.code >= 500 or exc.code in {408, 429}
+    return True
+
+
+def spool_item(state_dir: Path, kind: str, payload: dict):
+    directory = state_dir / "spool"
+    directory.mkdir(parents=True, exist_ok=True)
+    if kind == "heartbeat":
+        for path in directory.glob("*-heartbeat.json"):
+            path.unlink(missing_ok=True)
+    path = directory / f"{time.time_ns():020d}-{kind}.json"
+    temp = path.with_suffix(".tmp")
+    temp.write_text(json.dumps({"type": kind, "payload": payload}))
+    temp.replace(path)
+    trim_spool(directory)
+
+
+def spooled_items(state_dir: Path) -> list[Path]:
+    directory = state_dir / "spool"
+    return sorted(directory.glob("*.json")) if directory.exists() else []
+
+
+def trim_spool(directory: Path):
+    items = sorted(directory.glob("*.json"))
+    sizes = {path: path.stat().st_size for path in items}
+    total = sum(sizes.values())
+    while items and (len(items) > SPOOL_MAX_ITEMS or total > SPOOL_MAX_BYTES):
+        oldest = items.pop(0)
+        total -= sizes[oldest]
+        oldest.unlink(missing_ok=True)
+
+
+def replay_spool(token: str, backend_url: str, state_dir: Path):
+    headers = {"X-AGENT-TOKEN": token}
+    items = spooled_items(state_dir)
+    isolate = 0
+    while items:
+        batch = []
+        size = 0
+        limit = 1 if isolate else SPOOL_BATCH_ITEMS
+        for path in items:
+            item = json.loads(path.read_text())
+            length = path.stat().st_size
+            if batch and (len(batch) >= limit or size + length > SPOOL_BATCH_BYTES):
+                break
+            batch.append((path, item))
+            size += length
+        try:
+            data = http_json_retry("POST", f"{backend_url}/api/agent/batch", headers, {"items": [item for _, item in batch]})
+        except error.HTTPError as exc:
+            if exc.code in {404, 405}:
+                replay_legacy(headers, backend_url, state_dir, items)
+                return
+            if is_transient(exc):
+                raise
+            if len(batch) > 1:
+                isolate = len(batch)
+                continue
+            data = {}
+        isolate = max(isolate - len(batch), 0)
+        save_intervals(state_dir, data)
+        for path, item in batch:
+            path.unlink(missing_ok=True)
+            if item["type"] == "heartbeat":
+                update_heartbeat(state_dir)
+        items = items[len(batch):]
+
+
+def replay_legacy(headers: dict, backend_url: str, state_dir: Path, items: list[Path]):
+    for path in items:
+        item = json.loads(path.read_text())
+        if item["type"] == "heartbeat":
+            url = f"{backend_url}/api/agent/heartbeat"
+        else:
+            url = f"{backend_url}/api/agent/jobs/{item['payload']['job_id']}/result"
+        try:
+            http_json_retry("POST", url, dict(headers), item["payload"])
+        except Exception as exc:
+            if is_transient(exc):
+                raise
+        path.unlink(missing_ok=True)
+        if item["type"] == "heartbeat":
+            update_heartbeat(state_dir)
 
 
 def register_agent(config: dict, state_dir: Path, backend_url: str) -> str:
     payload = collect_inventory()
+    payload["machine_id"] = read_machine_id()
     headers = {"X-BOOTSTRAP-TOKEN": config.get("BOOTSTRAP_TOKEN", "")}
     data = http_json_retry("POST", f"{backend_url}/api/agent/register", headers, payload)
     token = data.get("agent_token")
@@ -283,26 +670,64 @@ def register_agent(config: dict, state_dir: Path, backend_url: str) -> str:
     return token
 
 
-def send_heartbeat(config: dict, token: str, backend_url: str):
-    inventory = collect_inventory()
-    payload = {"inventory": inventory}
+def send_heartbeat(config: dict, token: str, backend_url: str, state_dir: Path):
+    with phase("collect_inventory"):
+        inventory = collect_inventory()
+    payload = {"inventory": inventory, "telemetry": telemetry_snapshot()}
+    headers = {"X-AGENT-TOKEN": token}
+    try:
+        data = post_inventory(f"{backend_url}/api/agent/heartbeat", headers, payload, state_dir)
+    except Exception as exc:
+        if is_transient(exc):
+            spool_item(state_dir, "heartbeat", payload)
+        raise
+    reset_telemetry()
+    return data
+
+
+def renew_lease(stop: threading.Event, token: str, backend_url: str, job_id: int, interval: float):
     headers = {"X-AGENT-TOKEN": token}
-    http_json_retry("POST", f"{backend_url}/api/agent/heartbeat", headers, payload)
+    while not stop.wait(interval):
+        try:
+            http_json("POST", f"{backend_url}/api/agent/jobs/{job_id}/lease", headers, None)
+        except Exception:
+            continue
 
 
-def poll_job(config: dict, token: str, backend_url: str):
+def poll_job(config: dict, token: str, backend_url: str, state_dir: Path):
     headers = {"X-AGENT-TOKEN": token}
     data = http_json_retry("GET", f"{backend_url}/api/agent/jobs/poll", headers, None)
+    mark_done(state_dir, "last_poll")
+    save_intervals(state_dir, data)
     job = data.get("job")
     if not job:
         return
+    payload = run_job(token, backend_url, state_dir, job)
+    try:
+        post_inventory(f"{backend_url}/api/agent/jobs/{job['id']}/result", headers, payload, state_dir)
+    except Exception as exc:
+        if is_transient(exc):
+            spool_item(state_dir, "result", payload)
+        raise
+
+
+def run_job(token: str, backend_url: str, state_dir: Path, job: dict) -> dict:
     job_id = job["id"]
     job_type = job["job_type"]
+    interval = max(job.get("lease_seconds", 300) / 3, 10)
+    stop = threading.Event()
+    renewer = threading.Thread(target=renew_lease, args=(stop, token, backend_url, job_id, interval), daemon=True)
+    renewer.start()
     start = datetime.now(timezone.utc)
-    exit_code, stdout, stderr = execute_job(job_type)
+    try:
+        with phase(f"job {job_type}"):
+            exit_code, stdout, stderr, metrics = execute_job(job_type, state_dir)
+    finally:
+        stop.set()
     finish = datetime.now(timezone.utc)
-    inventory = collect_inventory()
-    payload = {
+    with phase("collect_inventory"):
+        inventory = collect_inventory()
+    return {
         "job_id": job_id,
         "started_at": start.isoformat(),
         "finished_at": finish.isoformat(),
@@ -310,9 +735,79 @@ def poll_job(config: dict, token: str, backend_url: str):
         "stdout": stdout,
         "stderr": stderr,
         "status": "COMPLETED" if exit_code == 0 else "FAILED",
-        "inventory": inventory
+        "inventory": inventory,
+        "inventory_fingerprint": inventory_fingerprint(inventory),
+        **metrics
     }
-    http_json_retry("POST", f"{backend_url}/api/agent/jobs/{job_id}/result", headers, payload)
+
+
+def inventory_fingerprint(inventory: dict) -> str:
+    return hashlib.sha256(json.dumps(inventory, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def last_fingerprint(state_dir: Path) -> str | None:
+    path = state_dir / "inventory_fingerprint"
+    return path.read_text().strip() if path.exists() else None
+
+
+def save_fingerprint(state_dir: Path, fingerprint: str | None):
+    path = state_dir / "inventory_fingerprint"
+    if fingerprint:
+        path.write_text(fingerprint)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def sync_unsupported(exc: Exception) -> bool:
+    return isinstance(exc, error.HTTPError) and exc.code in {404, 405}
+
+
+def send_sync(token: str, backend_url: str, state_dir: Path, payload: dict) -> dict:
+    try:
+        data = post_inventory(f"{backend_url}/api/agent/sync", {"X-AGENT-TOKEN": token}, payload, state_dir)
+    except Exception as exc:
+        if is_transient(exc) or sync_unsupported(exc):
+            for result in payload["results"]:
+                spool_item(state_dir, "result", result)
+            if "inventory" in payload:
+                spool_item(state_dir, "heartbeat", {"inventory": payload["inventory"], "telemetry": payload.get("telemetry")})
+        raise
+    save_intervals(state_dir, data)
+    if "telemetry" in payload:
+        reset_telemetry()
+    return data
+
+
+def sync_cycle(token: str, backend_url: str, state_dir: Path):
+    heartbeat_due = should_send_heartbeat(state_dir)
+    poll_due = is_due(state_dir, "last_poll", load_intervals(state_dir)["poll_seconds"])
+    if not heartbeat_due and not poll_due:
+        return
+    payload = {"version": SYNC_VERSION, "claim": poll_due, "results": []}
+    if heartbeat_due:
+        with phase("collect_inventory"):
+            inventory = collect_inventory()
+        fingerprint = inventory_fingerprint(inventory)
+        payload["inventory_fingerprint"] = fingerprint
+        payload["telemetry"] = telemetry_snapshot()
+        if fingerprint != last_fingerprint(state_dir):
+            payload["inventory"] = inventory
+    data = send_sync(token, backend_url, state_dir, payload)
+    if heartbeat_due:
+        if data.get("inventory") == "required":
+            save_fingerprint(state_dir, None)
+            (state_dir / "last_heartbeat").unlink(missing_ok=True)
+        else:
+            save_fingerprint(state_dir, fingerprint)
+            update_heartbeat(state_dir)
+    if poll_due:
+        mark_done(state_dir, "last_poll")
+    jobs = list(data.get("jobs") or [])
+    while jobs:
+        result = run_job(token, backend_url, state_dir, jobs.pop(0))
+        data = send_sync(token, backend_url, state_dir, {"version": SYNC_VERSION, "claim": True, "results": [result]})
+        save_fingerprint(state_dir, result["inventory_fingerprint"])
+        jobs.extend(data.get("jobs") or [])
 
 
 def run_once(state_dir: Path):
@@ -320,15 +815,36 @@ def run_once(state_dir: Path):
     backend_url = config.get("BACKEND_URL") or config.get("AUTO_PATCH_BACKEND_URL")
     if not backend_url:
         raise RuntimeError("BACKEND_URL missing")
-    token = config.get("AGENT_TOKEN") or config.get("AUTO_PATCH_AGENT_TOKEN")
-    if not token:
-        if not config.get("BOOTSTRAP_TOKEN"):
-            raise RuntimeError("AGENT_TOKEN missing")
-        token = register_agent(config, state_dir, backend_url)
-    if should_send_heartbeat(state_dir):
-        send_heartbeat(config, token, backend_url)
-        update_heartbeat(state_dir)
-    poll_job(config, token, backend_url)
+    if in_backoff(state_dir):
+        return
+    try:
+        token = config.get("AGENT_TOKEN") or config.get("AUTO_PATCH_AGENT_TOKEN")
+        if not token:
+            if not config.get("BOOTSTRAP_TOKEN"):
+                raise RuntimeError("AGENT_TOKEN missing")
+            token = register_agent(config, state_dir, backend_url)
+        if spooled_items(state_dir):
+            replay_spool(token, backend_url, state_dir)
+        if is_due(state_dir, "sync_unsupported", SYNC_RECHECK_SECONDS):
+            try:
+                sync_cycle(token, backend_url, state_dir)
+                clear_failures(state_dir)
+                return
+            except error.HTTPError as exc:
+                if not sync_unsupported(exc):
+                    raise
+                mark_done(state_dir, "sync_unsupported")
+                if spooled_items(state_dir):
+                    replay_spool(token, backend_url, state_dir)
+        if should_send_heartbeat(state_dir):
+            save_intervals(state_dir, send_heartbeat(config, token, backend_url, state_dir))
+            update_heartbeat(state_dir)
+        if is_due(state_dir, "last_poll", load_intervals(state_dir)["poll_seconds"]):
+            poll_job(config, token, backend_url, state_dir)
+    except Exception:
+        record_failure(state_dir)
+        raise
+    clear_failures(state_dir)
 
 
 def main():
@@ -340,9 +856,14 @@ def main():
     if args.once:
         run_once(state_dir)
         return
+    fraction = host_fraction()
+    time.sleep(next_slot_delay(load_intervals(state_dir)["poll_seconds"], fraction))
     while True:
-        run_once(state_dir)
-        time.sleep(60)
+        try:
+            run_once(state_dir)
+        except Exception as exc:
+            print(f"Agent cycle failed: {exc}", file=sys.stderr)
+        time.sleep(next_slot_delay(load_intervals(state_dir)["poll_seconds"], fraction))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,18 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("job_results", sa.Column("staged_bytes", sa.BigInteger(), nullable=True))
+    op.add_column("job_results", sa.Column("install_seconds", sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("job_results", "install_seconds")
+    op.drop_column("job_results", "staged_bytes")
@@ -0,0 +1,22 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("jobs", sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("jobs", sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"))
+    op.create_index("ix_jobs_status_lease_expires_at", "jobs", ["status", "lease_expires_at"])
+    op.add_column("servers", sa.Column("boot_time", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column("servers", "boot_time")
+    op.drop_index("ix_jobs_status_lease_expires_at", table_name="jobs")
+    op.drop_column("jobs", "attempts")
+    op.drop_column("jobs", "lease_expires_at")
@@ -0,0 +1,26 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "server_packages",
+        sa.Column("server_id", sa.Integer(), sa.ForeignKey("servers.id"), primary_key=True),
+        sa.Column("name", sa.String(length=255), primary_key=True),
+        sa.Column("current_version", sa.String(length=128), nullable=True),
+        sa.Column("candidate_version", sa.String(length=128), nullable=True),
+        sa.Column("is_security", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_server_packages_name", "server_packages", ["name"], postgresql_ops={"name": "varchar_pattern_ops"})
+
+
+def downgrade():
+    op.drop_index("ix_server_packages_name", table_name="server_packages")
+    op.drop_table("server_packages")
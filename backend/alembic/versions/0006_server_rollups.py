@@ -0,0 +1,27 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("servers", sa.Column("updates_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("servers", sa.Column("security_updates_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("servers", sa.Column("reboot_required", sa.Boolean(), nullable=False, server_default=sa.text("false")))
+    latest = "(SELECT inventories.{column} FROM inventories WHERE inventories.server_id = servers.id ORDER BY inventories.collected_at DESC LIMIT 1)"
+    op.execute(
+        "UPDATE servers SET "
+        f"updates_count = COALESCE({latest.format(column='updates_count')}, 0), "
+        f"security_updates_count = COALESCE({latest.format(column='security_updates_count')}, 0), "
+        f"reboot_required = COALESCE({latest.format(column='reboot_required')}, false)"
+    )
+
+
+def downgrade():
+    op.drop_column("servers", "reboot_required")
+    op.drop_column("servers", "security_updates_count")
+    op.drop_column("servers", "updates_count")
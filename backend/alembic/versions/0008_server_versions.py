@@ -0,0 +1,20 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("servers", sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"))
+    op.add_column("servers", sa.Column("inventory_version", sa.BigInteger(), nullable=False, server_default="0"))
+    op.add_column("servers", sa.Column("jobs_version", sa.BigInteger(), nullable=False, server_default="0"))
+
+
+def downgrade():
+    op.drop_column("servers", "jobs_version")
+    op.drop_column("servers", "inventory_version")
+    op.drop_column("servers", "version")
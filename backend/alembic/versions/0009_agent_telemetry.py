@@ -0,0 +1,18 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("inventories", sa.Column("telemetry", sa.Text(), nullable=True))
+    op.add_column("servers", sa.Column("scan_seconds", sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("servers", "scan_seconds")
+    op.drop_column("inventories", "telemetry")
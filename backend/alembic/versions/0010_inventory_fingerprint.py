@@ -0,0 +1,16 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("servers", sa.Column("inventory_fingerprint", sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    op.drop_column("servers", "inventory_fingerprint")
@@ -0,0 +1,22 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("servers", sa.Column("machine_id", sa.String(length=64), nullable=False, server_default=""))
+    op.execute(
+        "UPDATE servers SET machine_id = 'duplicate-' || id "
+        "WHERE id NOT IN (SELECT min(id) FROM servers GROUP BY hostname, ip)"
+    )
+    op.create_index("ix_servers_identity", "servers", ["hostname", "ip", "machine_id"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_servers_identity", table_name="servers")
+    op.drop_column("servers", "machine_id")
@@ -5,6 +5,13 @@ class Settings(BaseSettings):
     app_name: str = "AUTO PATCH"
     api_prefix: str = "/api"
     database_url: str
+    database_replica_url: str | None = None
+    replica_read_after_write_seconds: float = 10.0
+    sqlite_tuning: bool = False
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_writer_timeout_seconds: float = 30.0
     jwt_secret: str
     jwt_algorithm: str = "HS256"
     jwt_exp_minutes: int = 60 * 24
@@ -16,6 +23,45 @@ class Settings(BaseSettings):
     telegram_bot_token: str | None = None
     telegram_chat_id: str | None = None
     agent_rate_limit_seconds: int = 5
+    agent_poll_seconds: int = 60
+    agent_heartbeat_seconds: int = 300
+    agent_active_poll_seconds: int = 15
+    agent_overload_pool_ratio: float = 1.0
+    agent_overload_multiplier: float = 3.0
+    agent_batch_max_items: int = 100
+    relay_token: str | None = None
+    relay_max_agents: int = 500
+    ingest_async: bool = False
+    ingest_workers: int = 2
+    ingest_queue_max: int = 10000
+    ingest_batch_size: int = 100
+    ingest_poll_seconds: float = 1.0
+    ingest_lease_seconds: int = 60
+    ingest_max_attempts: int = 5
+    ingest_retry_after_seconds: int = 30
+    job_lease_seconds: int = 300
+    reboot_lease_seconds: int = 1800
+    job_max_attempts: int = 3
+    reaper_batch_size: int = 500
+    scheduler_enabled: bool = True
+    scheduler_interval_seconds: int = 30
+    scheduler_lease_seconds: int = 90
+    fleet_summary_ttl_seconds: int = 15
+    event_poll_seconds: float = 2.0
+    event_retention_hours: int = 24
+    event_lookback_seconds: float = 30.0
+    event_ticket_seconds: int = 60
+    fast_json_responses: bool = False
+    user_cache_ttl_seconds: int = 30
+    user_cache_size: int = 1024
+    password_hash_rounds: int = 29000
+    password_hash_workers: int = 2
+    password_hash_queue: int = 64
+    metrics_enabled: bool = True
+    metrics_token: str | None = None
+    profile_sample_rate: float = 0.0
+    profiler: str = "cprofile"
+    profile_dir: str = "/tmp/autopatch-profiles"
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,148 @@
+import asyncio
+import cProfile
+import functools
+import inspect
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+
+from app.core.config import settings
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+
+logger = logging.getLogger(__name__)
+
+async_profile_lock = asyncio.Lock()
+
+REQUEST_LATENCY = Histogram(
+    "autopatch_http_request_duration_seconds",
+    "Request latency by route",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+AGENT_REQUESTS = Counter("autopatch_agent_requests_total", "Authenticated agent requests", ["kind"])
+RATE_LIMITED = Counter("autopatch_agent_rate_limited_total", "Agent requests rejected by the rate limiter")
+SCHEDULER_TICK = Histogram(
+    "autopatch_scheduler_tick_seconds",
+    "Scheduler tick duration",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+INVENTORY_SECONDS = Histogram(
+    "autopatch_store_inventory_seconds",
+    "store_inventory duration",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+INVENTORY_ROWS = Histogram(
+    "autopatch_store_inventory_rows",
+    "Update rows written per inventory",
+    buckets=(0, 10, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+ALERT_SECONDS = Histogram("autopatch_alert_send_seconds", "Alert delivery latency", ["channel", "outcome"])
+INGEST_ITEMS = Counter("autopatch_ingest_items_total", "Queued agent payloads by outcome", ["kind", "outcome"])
+INGEST_BATCH_SECONDS = Histogram(
+    "autopatch_ingest_batch_seconds",
+    "Ingest worker batch duration",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+def metrics_response() -> Response:
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def write_profile(name: str, profiler) -> Path:
+    directory = Path(settings.profile_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    if isinstance(profiler, cProfile.Profile):
+        path = directory / f"{stamp}-{name}.prof"
+        profiler.dump_stats(path)
+    else:
+        path = directory / f"{stamp}-{name}.html"
+        path.write_text(profiler.output_html())
+    return path
+
+
+def start_profiler():
+    if settings.profiler == "pyinstrument" and pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profiler(name: str, profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+    logger.info("Profiled %s: %s", name, write_profile(name, profiler))
+
+
+def sampled_profile(endpoint: Callable) -> Callable:
+    if getattr(endpoint, "__profiled__", False):
+        return endpoint
+    name = endpoint.__name__
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            if random.random() >= settings.profile_sample_rate or async_profile_lock.locked():
+                return await endpoint(*args, **kwargs)
+            async with async_profile_lock:
+                profiler = start_profiler()
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    stop_profiler(name, profiler)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            if random.random() >= settings.profile_sample_rate:
+                return endpoint(*args, **kwargs)
+            profiler = start_profiler()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                stop_profiler(name, profiler)
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+class InstrumentedRoute(APIRoute):
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if settings.profile_sample_rate > 0:
+            endpoint = sampled_profile(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        method = ",".join(sorted(self.methods or []))
+        route = self.path_format
+
+        async def timed_handler(request: Request) -> Response:
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except Exception as exc:
+                status = getattr(exc, "status_code", 500)
+                raise
+            finally:
+                REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - started)
+
+        return timed_handler
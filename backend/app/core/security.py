@@ -1,12 +1,29 @@
+import asyncio
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
-from jose import jwt
+from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
 
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=settings.password_hash_rounds,
+    pbkdf2_sha256__min_rounds=settings.password_hash_rounds,
+    pbkdf2_sha256__max_rounds=settings.password_hash_rounds,
+)
+
+hash_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="password-hash")
+hash_slots = threading.BoundedSemaphore(settings.password_hash_workers + settings.password_hash_queue)
+
+
+class PasswordHasherBusy(Exception):
+    pass
 
 
 def hash_password(password: str) -> str:
@@ -17,6 +34,27 @@ def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
 
+def verify_and_update_password(password: str, password_hash: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(password, password_hash)
+
+
+async def run_in_hash_pool(func, *args):
+    if not hash_slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        return await asyncio.wrap_future(hash_executor.submit(func, *args))
+    finally:
+        hash_slots.release()
+
+
+async def hash_password_async(password: str) -> str:
+    return await run_in_hash_pool(hash_password, password)
+
+
+async def verify_and_update_password_async(password: str, password_hash: str) -> tuple[bool, str | None]:
+    return await run_in_hash_pool(verify_and_update_password, password, password_hash)
+
+
 def create_access_token(subject: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.jwt_exp_minutes)
     to_encode = {"sub": subject, "exp": expire}
@@ -24,4 +62,20 @@ def create_access_token(subject: str) -> str:
 
 
 def decode_access_token(token: str) -> dict:
-    return jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    if payload.get("purpose"):
+        raise JWTError("Not an access token")
+    return payload
+
+
+def create_stream_ticket(subject: str, session_exp: int) -> str:
+    expire = min(datetime.now(timezone.utc) + timedelta(seconds=settings.event_ticket_seconds), datetime.fromtimestamp(session_exp, timezone.utc))
+    to_encode = {"sub": subject, "exp": expire, "purpose": "events", "session_exp": session_exp, "jti": secrets.token_urlsafe(16)}
+    return jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+
+
+def decode_stream_ticket(ticket: str) -> dict:
+    payload = jwt.decode(ticket, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    if payload.get("purpose") != "events":
+        raise JWTError("Not a stream ticket")
+    return payload
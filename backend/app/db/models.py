@@ -1,7 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text, event, inspect, update
+from sqlalchemy.orm import Session, relationship
 
 from app.db.base import Base
 
@@ -23,12 +23,22 @@ class Server(Base):
     id = Column(Integer, primary_key=True)
     hostname = Column(String(255), nullable=False)
     ip = Column(String(64), nullable=False)
+    machine_id = Column(String(64), default="", server_default="", nullable=False)
     os_name = Column(String(128), nullable=False)
     os_version = Column(String(128), nullable=False)
     kernel_version = Column(String(128), nullable=False)
     package_manager = Column(String(32), nullable=False)
     last_update_time = Column(DateTime(timezone=True), nullable=True)
     last_seen = Column(DateTime(timezone=True), nullable=True)
+    boot_time = Column(DateTime(timezone=True), nullable=True)
+    updates_count = Column(Integer, default=0, nullable=False)
+    security_updates_count = Column(Integer, default=0, nullable=False)
+    reboot_required = Column(Boolean, default=False, nullable=False)
+    scan_seconds = Column(Float, nullable=True)
+    version = Column(BigInteger, default=0, nullable=False)
+    inventory_version = Column(BigInteger, default=0, nullable=False)
+    inventory_fingerprint = Column(String(64), nullable=True)
+    jobs_version = Column(BigInteger, default=0, nullable=False)
     agent_token = Column(String(255), unique=True, index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
@@ -36,6 +46,8 @@ class Server(Base):
     inventories = relationship("Inventory", back_populates="server")
     jobs = relationship("Job", back_populates="server")
 
+    __table_args__ = (Index("ix_servers_identity", "hostname", "ip", "machine_id", unique=True),)
+
 
 class Inventory(Base):
     __tablename__ = "inventories"
@@ -53,6 +65,7 @@ class Inventory(Base):
     reboot_required = Column(Boolean, default=False, nullable=False)
     security_updates_count = Column(Integer, default=0, nullable=False)
     updates_count = Column(Integer, default=0, nullable=False)
+    telemetry = Column(Text, nullable=True)
 
     server = relationship("Server", back_populates="inventories")
     updates = relationship("Update", back_populates="inventory", cascade="all, delete-orphan")
@@ -86,10 +99,14 @@ class Job(Base):
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
 
     server = relationship("Server", back_populates="jobs")
     results = relationship("JobResult", back_populates="job", cascade="all, delete-orphan")
 
+    __table_args__ = (Index("ix_jobs_status_lease_expires_at", "status", "lease_expires_at"),)
+
 
 class JobResult(Base):
     __tablename__ = "job_results"
@@ -102,6 +119,8 @@ class JobResult(Base):
     stdout = Column(Text, nullable=True)
     stderr = Column(Text, nullable=True)
     status = Column(String(64), nullable=False)
+    staged_bytes = Column(BigInteger, nullable=True)
+    install_seconds = Column(Float, nullable=True)
 
     job = relationship("Job", back_populates="results")
 
@@ -117,3 +136,74 @@ class AuditLog(Base):
     target_id = Column(Integer, nullable=True)
     message = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+
+class ServerPackage(Base):
+    __tablename__ = "server_packages"
+
+    server_id = Column(Integer, ForeignKey("servers.id"), primary_key=True)
+    name = Column(String(255), primary_key=True)
+    current_version = Column(String(128), nullable=True)
+    candidate_version = Column(String(128), nullable=True)
+    is_security = Column(Boolean, default=False, nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    server = relationship("Server")
+
+    __table_args__ = (Index("ix_server_packages_name", "name", postgresql_ops={"name": "varchar_pattern_ops"}),)
+
+
+class Event(Base):
+    __tablename__ = "events"
+
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String(64), nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, index=True, nullable=False)
+
+
+class IngestItem(Base):
+    __tablename__ = "ingest_queue"
+
+    id = Column(Integer, primary_key=True)
+    server_id = Column(Integer, ForeignKey("servers.id"), nullable=False)
+    kind = Column(String(16), nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    claimed_by = Column(String(64), nullable=True)
+    claimed_until = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, index=True, nullable=False)
+
+
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(255), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+UNVERSIONED_SERVER_COLUMNS = {"last_seen"}
+
+
+def versioned_change(server: Server) -> bool:
+    return any(attr.history.has_changes() for attr in inspect(server).attrs if attr.key not in UNVERSIONED_SERVER_COLUMNS)
+
+
+@event.listens_for(Session, "before_flush")
+def bump_versions(session, flush_context, instances):
+    job_server_ids = set()
+    for obj in list(session.new) + list(session.dirty):
+        if obj not in session.new and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Server) and obj in session.new:
+            obj.version = (obj.version or 0) + 1
+        elif isinstance(obj, Server) and versioned_change(obj):
+            obj.version = Server.version + 1
+        elif isinstance(obj, Job) and obj.server_id is not None:
+            job_server_ids.add(obj.server_id)
+    if job_server_ids:
+        servers = Server.__table__
+        session.connection().execute(
+            update(servers).where(servers.c.id.in_(job_server_ids)).values(jobs_version=servers.c.jobs_version + 1)
+        )
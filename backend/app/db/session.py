@@ -1,8 +1,172 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
 
 
+class WriterLock:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.mutex = threading.Lock()
+        self.waiters: deque[threading.Event] = deque()
+        self.held = False
+        self.owner = None
+
+    def acquire(self):
+        with self.mutex:
+            if not self.held:
+                self.held = True
+                self.owner = threading.get_ident()
+                return
+            waiter = threading.Event()
+            self.waiters.append(waiter)
+        if waiter.wait(self.timeout):
+            self.owner = threading.get_ident()
+            return
+        with self.mutex:
+            if waiter.is_set():
+                self.owner = threading.get_ident()
+                return
+            self.waiters.remove(waiter)
+            nested = self.owner == threading.get_ident()
+        if nested:
+            raise TimeoutError("Timed out waiting for the SQLite writer held by this thread; close the other write session first")
+        raise TimeoutError("Timed out waiting for the SQLite writer")
+
+    def release(self):
+        with self.mutex:
+            self.owner = None
+            if self.waiters:
+                self.waiters.popleft().set()
+            else:
+                self.held = False
+
+
+def sqlite_file(url: str) -> bool:
+    database = make_url(url)
+    return database.get_backend_name() == "sqlite" and database.database not in (None, "", ":memory:")
+
+
+def tune_sqlite(sqlite_engine, writer_lock: WriterLock | None = None):
+    @event.listens_for(sqlite_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        if writer_lock:
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.close()
+
+    if writer_lock is None:
+        return
+
+    @event.listens_for(sqlite_engine, "begin")
+    def begin_immediate(conn):
+        info = conn.connection.info
+        if not info.get("writer"):
+            writer_lock.acquire()
+            info["writer"] = True
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    @event.listens_for(sqlite_engine, "checkin")
+    def release_writer(dbapi_connection, connection_record):
+        if connection_record.info.pop("writer", False):
+            writer_lock.release()
+
+    @event.listens_for(sqlite_engine, "invalidate")
+    def release_invalidated_writer(dbapi_connection, connection_record, exception):
+        release_writer(dbapi_connection, connection_record)
+
+
 engine = create_engine(settings.database_url, pool_pre_ping=True)
+sqlite_profile = settings.sqlite_tuning and sqlite_file(settings.database_url)
+if sqlite_profile:
+    read_engine = create_engine(settings.database_url, pool_pre_ping=True)
+    tune_sqlite(engine, WriterLock(settings.sqlite_writer_timeout_seconds))
+    tune_sqlite(read_engine)
+elif settings.database_replica_url:
+    read_engine = create_engine(settings.database_replica_url, pool_pre_ping=True)
+else:
+    read_engine = engine
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AuthSessionLocal = ReadSessionLocal if sqlite_profile else SessionLocal
+
+db_stats = {"commits": 0, "rollbacks": 0}
+
+recent_writes: dict[str, float] = {}
+recent_writes_lock = threading.Lock()
+RECENT_WRITES_PRUNE_SIZE = 4096
+
+
+@event.listens_for(engine, "commit")
+def count_commit(conn):
+    db_stats["commits"] += 1
+
+
+@event.listens_for(engine, "rollback")
+def count_rollback(conn):
+    db_stats["rollbacks"] += 1
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def note_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def note_bulk_write(state):
+    if not state.is_select:
+        state.session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def note_commit(session):
+    writer = session.info.get("writer")
+    if session.info.pop("wrote", False) and writer:
+        mark_write(writer)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def note_rollback(session):
+    session.info.pop("wrote", None)
+
+
+def mark_write(writer: str):
+    now = time.monotonic()
+    with recent_writes_lock:
+        recent_writes[writer] = now + settings.replica_read_after_write_seconds
+        if len(recent_writes) > RECENT_WRITES_PRUNE_SIZE:
+            for key in [key for key, until in recent_writes.items() if until <= now]:
+                del recent_writes[key]
+
+
+def wrote_recently(writer: str | None) -> bool:
+    if not writer:
+        return False
+    with recent_writes_lock:
+        until = recent_writes.get(writer)
+    return until is not None and time.monotonic() < until
+
+
+def read_session_factory(writer: str | None = None) -> sessionmaker:
+    if read_engine is engine or wrote_recently(writer):
+        return SessionLocal
+    return ReadSessionLocal
+
+
+@contextmanager
+def single_transaction(db: Session):
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
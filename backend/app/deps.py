@@ -1,27 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.security import decode_access_token
-from app.db.session import SessionLocal
+from app.db.session import AuthSessionLocal, SessionLocal, read_session_factory
 from app.db.models import User
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+user_cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+user_cache_lock = threading.Lock()
 
-def get_db():
+
+def get_db(request: Request):
     db = SessionLocal()
+    if settings.database_replica_url:
+        db.info["writer"] = request.headers.get("Authorization")
     try:
         yield db
     finally:
         db.close()
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def get_read_db(request: Request):
+    db = read_session_factory(request.headers.get("Authorization"))()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_auth_db():
+    db = AuthSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_auth_db)) -> User:
+    return resolve_user(db, token)
+
+
+def resolve_user(db: Session, token: str) -> User:
+    cached = get_cached_user(token)
+    if cached is not None:
+        return cached
     try:
         payload = decode_access_token(token)
         subject = payload.get("sub")
@@ -32,9 +64,54 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user = db.query(User).filter(User.email == subject).first()
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="Inactive user")
+    cache_user(token, user, payload.get("exp"))
     return user
 
 
+def get_cached_user(token: str) -> User | None:
+    if settings.user_cache_ttl_seconds <= 0:
+        return None
+    with user_cache_lock:
+        entry = user_cache.get(token)
+        if entry is None:
+            return None
+        expires, data = entry
+        if time.time() >= expires:
+            del user_cache[token]
+            return None
+        user_cache.move_to_end(token)
+    return User(**data)
+
+
+def cache_user(token: str, user: User, token_exp: int | float | None):
+    if settings.user_cache_ttl_seconds <= 0:
+        return
+    expires = time.time() + settings.user_cache_ttl_seconds
+    if token_exp:
+        expires = min(expires, float(token_exp))
+    data = {
+        "id": user.id,
+        "email": user.email,
+        "role": user.role,
+        "is_active": user.is_active,
+        "created_at": user.created_at,
+    }
+    with user_cache_lock:
+        user_cache[token] = (expires, data)
+        user_cache.move_to_end(token)
+        while len(user_cache) > settings.user_cache_size:
+            user_cache.popitem(last=False)
+
+
+def invalidate_user_cache(email: str | None = None):
+    with user_cache_lock:
+        if email is None:
+            user_cache.clear()
+            return
+        for token in [token for token, (_, data) in user_cache.items() if data["email"] == email]:
+            del user_cache[token]
+
+
 def get_current_admin(user: User = Depends(get_current_user)) -> User:
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin role required")
@@ -0,0 +1,14 @@
+import logging
+
+from app.core.config import settings
+from app.services.ingest import ingest_loop, start_ingest_workers
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    start_ingest_workers(max(settings.ingest_workers - 1, 0))
+    ingest_loop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import threading
-import time
 from datetime import datetime, timezone
 
 from fastapi import FastAPI
@@ -9,9 +8,10 @@ from app.core.config import settings
 from app.core.security import hash_password
 from app.db.session import SessionLocal
 from app.db.models import User
-from app.routers import agent, approvals, audit, auth, jobs, servers, users
-from app.services.jobs import queue_due_jobs
-from app.services.alerts import check_offline_servers
+from app.routers import agent, approvals, audit, auth, events, exports, fleet, jobs, metrics, packages, servers, users
+from app.services.ingest import start_ingest_workers
+from app.services.metrics import register_collectors
+from app.services.scheduler import scheduler_loop
 
 
 app = FastAPI(title=settings.app_name)
@@ -34,6 +34,10 @@ app.include_router(servers.router, prefix=settings.api_prefix)
 app.include_router(jobs.router, prefix=settings.api_prefix)
 app.include_router(approvals.router, prefix=settings.api_prefix)
 app.include_router(audit.router, prefix=settings.api_prefix)
+app.include_router(packages.router, prefix=settings.api_prefix)
+app.include_router(fleet.router, prefix=settings.api_prefix)
+app.include_router(events.router, prefix=settings.api_prefix)
+app.include_router(exports.router, prefix=settings.api_prefix)
 app.include_router(agent.router, prefix=settings.api_prefix)
 
 
@@ -42,15 +46,9 @@ def healthz():
     return {"status": "ok"}
 
 
-def scheduler_loop():
-    while True:
-        db = SessionLocal()
-        try:
-            queue_due_jobs(db)
-            check_offline_servers(db)
-        finally:
-            db.close()
-        time.sleep(30)
+if settings.metrics_enabled:
+    register_collectors()
+    app.include_router(metrics.router)
 
 
 @app.on_event("startup")
@@ -71,5 +69,9 @@ def seed_admin_and_scheduler():
                 db.commit()
     finally:
         db.close()
+    if settings.ingest_async:
+        start_ingest_workers()
+    if not settings.scheduler_enabled:
+        return
     thread = threading.Thread(target=scheduler_loop, daemon=True)
     thread.start()
@@ -0,0 +1,19 @@
+from pydantic_settings import BaseSettings
+
+
+class RelaySettings(BaseSettings):
+    backend_url: str
+    token: str
+    flush_seconds: float = 2.0
+    batch_agents: int = 200
+    poll_wait_seconds: float = 5.0
+    timeout_seconds: float = 30.0
+    max_known_agents: int = 10000
+    max_unverified_agents: int = 1000
+    agent_ttl_seconds: float = 3600.0
+    invalid_ttl_seconds: float = 3600.0
+
+    class Config:
+        env_file = ".env"
+        env_prefix = "RELAY_"
+        case_sensitive = False
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import httpx
+from fastapi import HTTPException
+
+
+SYNC_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def inventory_fingerprint(inventory: dict) -> str:
+    return hashlib.sha256(json.dumps(inventory, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class AgentState:
+    def __init__(self):
+        self.acked = None
+        self.required = False
+        self.heartbeat = None
+        self.claim = False
+        self.jobs = []
+        self.intervals = None
+        self.seen = time.monotonic()
+
+    def pending(self) -> bool:
+        return bool(self.heartbeat or (self.claim and not self.jobs))
+
+
+class Relay:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        token: str,
+        batch_agents: int = 200,
+        poll_wait_seconds: float = 5.0,
+        max_known_agents: int = 10000,
+        max_unverified_agents: int = 1000,
+        agent_ttl_seconds: float = 3600.0,
+        invalid_ttl_seconds: float = 3600.0,
+    ):
+        self.client = client
+        self.token = token
+        self.batch_agents = batch_agents
+        self.poll_wait_seconds = poll_wait_seconds
+        self.max_known_agents = max_known_agents
+        self.max_unverified_agents = max_unverified_agents
+        self.agent_ttl_seconds = agent_ttl_seconds
+        self.invalid_ttl_seconds = invalid_ttl_seconds
+        self.agents: dict[str, AgentState] = {}
+        self.unverified: set[str] = set()
+        self.invalid: OrderedDict[str, float] = OrderedDict()
+        self.flushed = asyncio.Event()
+        self.stats = {"flushes": 0, "backend_requests": 0, "backend_errors": 0, "evicted": 0, "last_flush": None}
+
+    def agent(self, token: str) -> AgentState:
+        now = time.monotonic()
+        expires = self.invalid.get(token)
+        if expires is not None:
+            if expires > now:
+                raise HTTPException(status_code=401, detail="Invalid agent token")
+            del self.invalid[token]
+        state = self.agents.get(token)
+        if state is None:
+            if len(self.unverified) >= self.max_unverified_agents or len(self.agents) >= self.max_known_agents:
+                self.evict(now)
+            if len(self.unverified) >= self.max_unverified_agents or len(self.agents) >= self.max_known_agents:
+                raise HTTPException(status_code=503, detail="Relay is full", headers={"Retry-After": str(int(self.poll_wait_seconds) + 1)})
+            state = self.agents[token] = AgentState()
+            self.unverified.add(token)
+        state.seen = now
+        return state
+
+    def evict(self, now: float):
+        cutoff = now - self.agent_ttl_seconds
+        for token in [token for token, state in self.agents.items() if state.seen < cutoff]:
+            self.forget(token)
+            self.stats["evicted"] += 1
+
+    def forget(self, token: str):
+        self.agents.pop(token, None)
+        self.unverified.discard(token)
+
+    def reject(self, token: str):
+        self.forget(token)
+        self.invalid[token] = time.monotonic() + self.invalid_ttl_seconds
+        self.invalid.move_to_end(token)
+        while len(self.invalid) > self.max_known_agents:
+            self.invalid.popitem(last=False)
+
+    def heartbeat(self, token: str, inventory: dict | None, fingerprint: str | None, telemetry: dict | None = None) -> str:
+        state = self.agent(token)
+        if inventory is not None:
+            fingerprint = fingerprint or inventory_fingerprint(inventory)
+            state.required = False
+        elif state.heartbeat and state.heartbeat["fingerprint"] == fingerprint:
+            inventory = state.heartbeat["inventory"]
+            telemetry = state.heartbeat["telemetry"]
+        state.heartbeat = {"inventory": inventory, "fingerprint": fingerprint, "telemetry": telemetry}
+        if state.required:
+            return "required"
+        return "stored" if inventory is not None else "unchanged"
+
+    async def submit_results(self, token: str, results: list[dict]) -> httpx.Response:
+        state = self.agent(token)
+        response = await self.client.post(
+            "/api/agent/sync",
+            json={"version": SYNC_VERSION, "results": results, "claim": False},
+            headers={"X-AGENT-TOKEN": token},
+        )
+        if response.status_code != 200:
+            return response
+        self.unverified.discard(token)
+        answers = response.json()
+        for result, answer in zip(results, answers["results"]):
+            if answer["status"] != "rejected" and result.get("inventory_fingerprint"):
+                state.acked = result["inventory_fingerprint"]
+        state.intervals = answers.get("intervals") or state.intervals
+        return response
+
+    def intervals(self, token: str) -> dict | None:
+        return self.agent(token).intervals
+
+    def rename(self, token: str, new_token: str):
+        if token in self.agents:
+            self.agents[new_token] = self.agents.pop(token)
+            self.unverified.discard(token)
+
+    async def wait_for_jobs(self, token: str) -> list[dict]:
+        state = self.agent(token)
+        if not state.jobs:
+            state.claim = True
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.poll_wait_seconds
+            while state.claim and loop.time() < deadline:
+                try:
+                    await asyncio.wait_for(self.flushed.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+        jobs, state.jobs = state.jobs, []
+        return jobs
+
+    async def flush(self):
+        self.evict(time.monotonic())
+        pending = [(token, state) for token, state in self.agents.items() if state.pending()]
+        for start in range(0, len(pending), self.batch_agents):
+            if not await self.send([self.take(token, state) for token, state in pending[start:start + self.batch_agents]]):
+                break
+        self.stats["flushes"] += 1
+        self.stats["last_flush"] = datetime.now(timezone.utc).isoformat()
+        self.flushed.set()
+        self.flushed = asyncio.Event()
+
+    def take(self, token: str, state: AgentState) -> tuple:
+        heartbeat, state.heartbeat = state.heartbeat, None
+        sync = {"version": SYNC_VERSION, "results": [], "claim": state.claim and not state.jobs}
+        if heartbeat:
+            sync["inventory_fingerprint"] = heartbeat["fingerprint"]
+            if heartbeat["inventory"] is not None and heartbeat["fingerprint"] != state.acked:
+                sync["inventory"] = heartbeat["inventory"]
+                sync["telemetry"] = heartbeat["telemetry"]
+        return token, state, heartbeat, sync
+
+    async def send(self, batch: list[tuple]) -> bool:
+        self.stats["backend_requests"] += 1
+        try:
+            response = await self.client.post(
+                "/api/agent/relay",
+                json={"items": [{"agent_token": token, "sync": sync} for token, _, _, sync in batch]},
+                headers={"X-RELAY-TOKEN": self.token},
+            )
+            response.raise_for_status()
+            answers = response.json()["agents"]
+        except (httpx.HTTPError, ValueError, KeyError) as exc:
+            logger.warning("Relay flush failed: %s", exc)
+            self.stats["backend_errors"] += 1
+            for _, state, heartbeat, _ in batch:
+                state.heartbeat = state.heartbeat or heartbeat
+            return False
+        for (token, state, heartbeat, sync), answer in zip(batch, answers):
+            self.apply(token, state, heartbeat, sync, answer)
+        return True
+
+    def apply(self, token: str, state: AgentState, heartbeat: dict | None, sync: dict, answer: dict):
+        if answer.get("status") == "rejected":
+            logger.warning("Backend rejected agent sync: %s", answer.get("detail"))
+            if answer.get("detail") == "Invalid agent token":
+                self.reject(token)
+            else:
+                state.heartbeat = state.heartbeat or heartbeat
+            return
+        self.unverified.discard(token)
+        if heartbeat:
+            if answer.get("inventory") == "required":
+                state.acked = None
+                state.required = True
+            else:
+                state.acked = heartbeat["fingerprint"]
+                state.required = False
+        if sync["claim"]:
+            state.claim = False
+        state.jobs.extend(answer.get("jobs") or [])
+        state.intervals = answer.get("intervals") or state.intervals
+
+    async def run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Relay flush loop failed")
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+
+import httpx
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response
+
+from app.relay.config import RelaySettings
+from app.relay.forwarder import SYNC_VERSION, Relay
+from app.schemas import AgentBatchIn, AgentHeartbeat, AgentJobResultIn, AgentSyncIn
+
+
+logger = logging.getLogger(__name__)
+
+relay_settings = RelaySettings()
+relay = Relay(
+    httpx.AsyncClient(base_url=relay_settings.backend_url, timeout=relay_settings.timeout_seconds),
+    relay_settings.token,
+    batch_agents=relay_settings.batch_agents,
+    poll_wait_seconds=relay_settings.poll_wait_seconds,
+    max_known_agents=relay_settings.max_known_agents,
+    max_unverified_agents=relay_settings.max_unverified_agents,
+    agent_ttl_seconds=relay_settings.agent_ttl_seconds,
+    invalid_ttl_seconds=relay_settings.invalid_ttl_seconds,
+)
+tasks: set[asyncio.Task] = set()
+
+app = FastAPI(title="AUTO PATCH relay")
+router = APIRouter(prefix="/api/agent", tags=["relay"])
+
+
+def agent_token(request: Request) -> str:
+    token = request.headers.get("X-AGENT-TOKEN")
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing agent token")
+    return token
+
+
+async def forward(request: Request, path: str, headers: dict) -> httpx.Response:
+    try:
+        return await relay.client.request(request.method, path, headers=headers, content=await request.body())
+    except httpx.HTTPError as exc:
+        raise HTTPException(status_code=502, detail=f"Backend unreachable: {exc}")
+
+
+async def store_results(token: str, results: list[dict]) -> httpx.Response:
+    try:
+        return await relay.submit_results(token, results)
+    except httpx.HTTPError as exc:
+        raise HTTPException(status_code=502, detail=f"Backend unreachable: {exc}")
+
+
+def proxied(response: httpx.Response) -> Response:
+    headers = {"Retry-After": response.headers["Retry-After"]} if "Retry-After" in response.headers else None
+    return Response(response.content, response.status_code, headers, response.headers.get("content-type"))
+
+
+@router.post("/register")
+async def register_agent(request: Request):
+    headers = {"X-BOOTSTRAP-TOKEN": request.headers.get("X-BOOTSTRAP-TOKEN", ""), "Content-Type": "application/json"}
+    return proxied(await forward(request, "/api/agent/register", headers))
+
+
+@router.post("/rotate-token")
+async def rotate_agent_token(request: Request):
+    token = agent_token(request)
+    response = await forward(request, "/api/agent/rotate-token", {"X-AGENT-TOKEN": token})
+    if response.status_code == 200:
+        relay.rename(token, response.json()["agent_token"])
+    return proxied(response)
+
+
+@router.post("/jobs/{job_id}/lease")
+async def renew_lease(job_id: int, request: Request):
+    return proxied(await forward(request, f"/api/agent/jobs/{job_id}/lease", {"X-AGENT-TOKEN": agent_token(request)}))
+
+
+@router.post("/heartbeat")
+async def heartbeat(payload: AgentHeartbeat, request: Request):
+    token = agent_token(request)
+    telemetry = payload.telemetry.model_dump(mode="json") if payload.telemetry else None
+    relay.heartbeat(token, payload.inventory.model_dump(mode="json"), None, telemetry)
+    return {"status": "ok", "intervals": relay.intervals(token)}
+
+
+@router.get("/jobs/poll")
+async def poll_job(request: Request):
+    token = agent_token(request)
+    jobs = await relay.wait_for_jobs(token)
+    relay.agent(token).jobs[:0] = jobs[1:]
+    return {"job": jobs[0] if jobs else None, "intervals": relay.intervals(token)}
+
+
+@router.post("/jobs/{job_id}/result")
+async def submit_job_result(job_id: int, request: Request):
+    headers = {"X-AGENT-TOKEN": agent_token(request), "Content-Type": "application/json"}
+    return proxied(await forward(request, f"/api/agent/jobs/{job_id}/result", headers))
+
+
+@router.post("/batch")
+async def submit_batch(payload: AgentBatchIn, request: Request):
+    token = agent_token(request)
+    results = []
+    pending = {}
+    for index, item in enumerate(payload.items):
+        try:
+            if item.type == "heartbeat":
+                beat = AgentHeartbeat.model_validate(item.payload)
+                telemetry = beat.telemetry.model_dump(mode="json") if beat.telemetry else None
+                relay.heartbeat(token, beat.inventory.model_dump(mode="json"), None, telemetry)
+                results.append({"status": "ok"})
+            else:
+                pending[index] = AgentJobResultIn.model_validate(item.payload).model_dump(mode="json")
+                results.append(None)
+        except ValueError as exc:
+            results.append({"status": "rejected", "detail": str(exc)})
+    if pending:
+        response = await store_results(token, list(pending.values()))
+        if response.status_code != 200:
+            return proxied(response)
+        for index, answer in zip(pending, response.json()["results"]):
+            results[index] = {key: value for key, value in answer.items() if key != "job_id"}
+    return {"results": results, "intervals": relay.intervals(token)}
+
+
+@router.post("/sync")
+async def sync_agent(payload: AgentSyncIn, request: Request):
+    token = agent_token(request)
+    if payload.version != SYNC_VERSION:
+        raise HTTPException(status_code=400, detail=f"Unsupported sync version {payload.version}")
+    results = []
+    if payload.results:
+        response = await store_results(token, [result.model_dump(mode="json") for result in payload.results])
+        if response.status_code != 200:
+            return proxied(response)
+        results = response.json()["results"]
+    inventory = None
+    if payload.inventory or payload.inventory_fingerprint:
+        inventory = relay.heartbeat(
+            token,
+            payload.inventory.model_dump(mode="json") if payload.inventory else None,
+            payload.inventory_fingerprint,
+            payload.telemetry.model_dump(mode="json") if payload.telemetry else None,
+        )
+    return {
+        "version": SYNC_VERSION,
+        "inventory": inventory,
+        "results": results,
+        "jobs": await relay.wait_for_jobs(token) if payload.claim else [],
+        "intervals": relay.intervals(token),
+    }
+
+
+app.include_router(router)
+
+
+@app.get("/healthz")
+def healthz():
+    pending = sum(1 for state in relay.agents.values() if state.pending())
+    return {"status": "ok", "agents": len(relay.agents), "unverified": len(relay.unverified), "pending": pending, **relay.stats}
+
+
+@app.on_event("startup")
+async def start_flush_loop():
+    task = asyncio.create_task(relay.run(relay_settings.flush_seconds))
+    tasks.add(task)
+
+
+@app.on_event("shutdown")
+async def stop_flush_loop():
+    for task in tasks:
+        task.cancel()
+    await relay.flush()
+    await relay.client.aclose()
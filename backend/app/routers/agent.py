@@ -1,20 +1,38 @@
+import hmac
+import logging
 import secrets
 from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import case, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, aliased
 
 from app.core.config import settings
-from app.db.models import Job, JobResult, Server
+from app.core.metrics import AGENT_REQUESTS, RATE_LIMITED, InstrumentedRoute
+from app.db.models import Job, Server
+from app.db.session import single_transaction
 from app.deps import get_db
-from app.schemas import AgentHeartbeat, AgentJobResultIn
+from app.schemas import AgentBatchIn, AgentHeartbeat, AgentJobResultIn, AgentSyncIn, RelaySyncIn
+from app.services.agents import claim_next_job, job_assignment, record_heartbeat, record_job_result
 from app.services.audit import create_audit
-from app.services.inventory import store_inventory
-from app.services.jobs import resolve_job_status
-from app.services.alerts import send_telegram
+from app.services.ingest import IngestQueueFull, enqueue_item
+from app.services.intervals import interval_hints
+from app.services.jobs import renew_job_lease
+from app.services.servers import invalidate_fleet_summary
 
 
-router = APIRouter(prefix="/agent", tags=["agent"])
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/agent", tags=["agent"], route_class=InstrumentedRoute)
+
+SYNC_VERSION = 1
+HOST_DETAILS = ("os_name", "os_version", "kernel_version", "package_manager")
+UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
 
 rate_state: dict[str, datetime] = {}
 
@@ -25,7 +43,8 @@ def enforce_rate_limit(token: str):
     now = datetime.now(timezone.utc)
     last = rate_state.get(token)
     if last and (now - last).total_seconds() < settings.agent_rate_limit_seconds:
-        raise HTTPException(status_code=429, detail="Rate limit")
+        RATE_LIMITED.inc()
+        raise HTTPException(status_code=429, detail="Rate limit", headers={"Retry-After": str(settings.agent_rate_limit_seconds)})
     rate_state[token] = now
 
 
@@ -42,43 +61,62 @@ async def register_agent(request: Request, db: Session = Depends(get_db)):
     if not settings.agent_bootstrap_token or bootstrap != settings.agent_bootstrap_token:
         raise HTTPException(status_code=401, detail="Invalid bootstrap token")
     body = await await_json(request)
-    hostname = body.get("hostname")
-    ip = body.get("ip")
-    os_name = body.get("os_name")
-    os_version = body.get("os_version")
-    kernel_version = body.get("kernel_version")
-    package_manager = body.get("package_manager")
-    if not hostname or not ip:
+    if not body.get("hostname") or not body.get("ip"):
         raise HTTPException(status_code=400, detail="Missing host identity")
-    existing = db.query(Server).filter(Server.hostname == hostname, Server.ip == ip).first()
+    machine_id = body.get("machine_id") or ""
+    if not isinstance(machine_id, str) or len(machine_id) > 64:
+        raise HTTPException(status_code=400, detail="Invalid machine id")
+    return await run_in_threadpool(register_server, db, body)
+
+
+def adopt_legacy_server(db: Session, hostname: str, ip: str, machine_id: str):
+    other = aliased(Server)
+    claimed = select(other.id).where(other.hostname == hostname, other.ip == ip, other.machine_id == machine_id)
+    db.execute(
+        update(Server)
+        .where(Server.hostname == hostname, Server.ip == ip, Server.machine_id == "", ~claimed.exists())
+        .values(machine_id=machine_id)
+    )
+
+
+def register_server(db: Session, body: dict) -> dict:
+    hostname = body.get("hostname")
+    now = datetime.now(timezone.utc)
     token = secrets.token_hex(24)
-    if existing:
-        existing.agent_token = token
-        existing.os_name = os_name or existing.os_name
-        existing.os_version = os_version or existing.os_version
-        existing.kernel_version = kernel_version or existing.kernel_version
-        existing.package_manager = package_manager or existing.package_manager
-        existing.updated_at = datetime.now(timezone.utc)
-        db.commit()
-        create_audit(db, "agent", existing.id, "agent_token_rotated", "server", existing.id, hostname)
-        return {"agent_token": token, "server_id": existing.id}
-    server = Server(
-        hostname=hostname,
-        ip=ip,
-        os_name=os_name or "unknown",
-        os_version=os_version or "unknown",
-        kernel_version=kernel_version or "unknown",
-        package_manager=package_manager or "unknown",
-        agent_token=token,
-        created_at=datetime.now(timezone.utc),
-        updated_at=datetime.now(timezone.utc),
-        last_seen=datetime.now(timezone.utc),
+    details = {field: body[field] for field in HOST_DETAILS if body.get(field)}
+    machine_id = body.get("machine_id") or ""
+    if machine_id:
+        adopt_legacy_server(db, hostname, body.get("ip"), machine_id)
+    statement = UPSERTS[db.get_bind().dialect.name](Server).values(
+        {
+            "hostname": hostname,
+            "ip": body.get("ip"),
+            "machine_id": machine_id,
+            **{field: "unknown" for field in HOST_DETAILS},
+            **details,
+            "agent_token": token,
+            "version": 1,
+            "created_at": now,
+            "updated_at": now,
+            "last_seen": now,
+        }
     )
-    db.add(server)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Server.hostname, Server.ip, Server.machine_id],
+        set_={
+            **{field: statement.excluded[field] for field in details},
+            "agent_token": token,
+            "updated_at": now,
+            "version": case((Server.version < 1, 1), else_=Server.version) + 1,
+        },
+    ).returning(Server.id, Server.version)
+    server_id, version = db.execute(statement).one()
+    created = version == 1
+    create_audit(db, "agent", server_id, "agent_registered" if created else "agent_token_rotated", "server", server_id, hostname)
     db.commit()
-    db.refresh(server)
-    create_audit(db, "agent", server.id, "agent_registered", "server", server.id, hostname)
-    return {"agent_token": token, "server_id": server.id}
+    if created:
+        invalidate_fleet_summary()
+    return {"agent_token": token, "server_id": server_id}
 
 
 @router.post("/rotate-token")
@@ -91,8 +129,8 @@ def rotate_agent_token(request: Request, db: Session = Depends(get_db)):
     new_token = secrets.token_hex(24)
     server.agent_token = new_token
     server.updated_at = datetime.now(timezone.utc)
-    db.commit()
     create_audit(db, "agent", server.id, "agent_token_rotated", "server", server.id, server.hostname)
+    db.commit()
     return {"agent_token": new_token}
 
 
@@ -103,13 +141,32 @@ def heartbeat(payload: AgentHeartbeat, request: Request, db: Session = Depends(g
         raise HTTPException(status_code=401, detail="Missing agent token")
     enforce_rate_limit(token)
     server = get_server_by_token(db, token)
-    server.last_seen = datetime.now(timezone.utc)
+    AGENT_REQUESTS.labels("heartbeat").inc()
+    if settings.ingest_async:
+        queue_payload(db, server, "heartbeat", payload)
+        db.commit()
+        return JSONResponse({"status": "queued", "intervals": interval_hints(db, server.id)}, status_code=202)
+    record_heartbeat(db, server, payload.inventory, payload.telemetry, payload.inventory_fingerprint)
     db.commit()
-    store_inventory(db, server, payload.inventory)
-    if len(payload.inventory.security_updates) > 0:
-        send_telegram(f"Security updates available on {server.hostname} ({server.ip})")
-    create_audit(db, "agent", server.id, "heartbeat", "server", server.id, server.hostname)
-    return {"status": "ok"}
+    return {"status": "ok", "intervals": interval_hints(db, server.id)}
+
+
+def queue_payload(db: Session, server: Server, kind: str, payload: BaseModel):
+    try:
+        enqueue_item(db, server, kind, payload.model_dump_json())
+    except IngestQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Ingest queue full",
+            headers={"Retry-After": str(settings.ingest_retry_after_seconds)},
+        )
+
+
+def queue_job_result(db: Session, server: Server, job_id: int, payload: AgentJobResultIn) -> str:
+    if not db.query(Job.id).filter(Job.id == job_id, Job.server_id == server.id).first():
+        raise HTTPException(status_code=404, detail="Job not found")
+    queue_payload(db, server, "result", payload.model_copy(update={"job_id": job_id}))
+    return "queued"
 
 
 @router.get("/jobs/poll")
@@ -117,54 +174,163 @@ def poll_job(request: Request, db: Session = Depends(get_db)):
     token = request.headers.get("X-AGENT-TOKEN")
     if not token:
         raise HTTPException(status_code=401, detail="Missing agent token")
-    enforce_rate_limit(token)
+    enforce_rate_limit(f"{token}:poll")
     server = get_server_by_token(db, token)
-    job = (
-        db.query(Job)
-        .filter(Job.server_id == server.id, Job.status == "QUEUED")
-        .order_by(Job.created_at.asc())
-        .first()
-    )
-    if not job:
-        return {"job": None}
-    job.status = "RUNNING"
-    job.updated_at = datetime.now(timezone.utc)
+    AGENT_REQUESTS.labels("poll").inc()
+    job = claim_next_job(db, server)
     db.commit()
-    create_audit(db, "agent", server.id, "job_started", "job", job.id, job.job_type)
-    return {"job": {"id": job.id, "job_type": job.job_type}}
+    return {"job": job_assignment(job) if job else None, "intervals": interval_hints(db, server.id)}
 
 
-@router.post("/jobs/{job_id}/result")
-def submit_job_result(job_id: int, payload: AgentJobResultIn, request: Request, db: Session = Depends(get_db)):
+@router.post("/jobs/{job_id}/lease")
+def renew_lease(job_id: int, request: Request, db: Session = Depends(get_db)):
     token = request.headers.get("X-AGENT-TOKEN")
     if not token:
         raise HTTPException(status_code=401, detail="Missing agent token")
-    enforce_rate_limit(token)
+    enforce_rate_limit(f"{token}:lease")
     server = get_server_by_token(db, token)
     job = db.query(Job).filter(Job.id == job_id, Job.server_id == server.id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    status = resolve_job_status(payload.exit_code, payload.status)
-    result = JobResult(
-        job_id=job.id,
-        started_at=payload.started_at,
-        finished_at=payload.finished_at,
-        exit_code=payload.exit_code,
-        stdout=payload.stdout,
-        stderr=payload.stderr,
-        status=status,
-    )
-    db.add(result)
-    job.status = status
-    job.updated_at = datetime.now(timezone.utc)
+    if job.status != "RUNNING":
+        raise HTTPException(status_code=409, detail="Job is not running")
+    renew_job_lease(db, job)
+    return {"lease_expires_at": job.lease_expires_at}
+
+
+@router.post("/jobs/{job_id}/result")
+def submit_job_result(job_id: int, payload: AgentJobResultIn, request: Request, db: Session = Depends(get_db)):
+    token = request.headers.get("X-AGENT-TOKEN")
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing agent token")
+    enforce_rate_limit(f"{token}:result")
+    server = get_server_by_token(db, token)
+    AGENT_REQUESTS.labels("result").inc()
+    if settings.ingest_async:
+        status = queue_job_result(db, server, job_id, payload)
+        db.commit()
+        return JSONResponse({"status": status}, status_code=202)
+    status = record_job_result(db, server, job_id, payload)
     db.commit()
-    store_inventory(db, server, payload.inventory)
-    if status == "FAILED":
-        send_telegram(f"Patch job failed on {server.hostname} ({server.ip})")
-    create_audit(db, "agent", server.id, "job_result", "job", job.id, status)
     return {"status": status}
 
 
+@router.post("/batch")
+def submit_batch(payload: AgentBatchIn, request: Request, db: Session = Depends(get_db)):
+    token = request.headers.get("X-AGENT-TOKEN")
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing agent token")
+    enforce_rate_limit(f"{token}:batch")
+    if len(payload.items) > settings.agent_batch_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {settings.agent_batch_max_items} items per batch")
+    server = get_server_by_token(db, token)
+    AGENT_REQUESTS.labels("batch").inc()
+    results = []
+    for item in payload.items:
+        try:
+            with db.begin_nested():
+                if item.type == "heartbeat":
+                    beat = AgentHeartbeat.model_validate(item.payload)
+                    record_heartbeat(db, server, beat.inventory, beat.telemetry)
+                    status = "ok"
+                else:
+                    result = AgentJobResultIn.model_validate(item.payload)
+                    status = record_job_result(db, server, result.job_id, result)
+            results.append({"status": status})
+        except ValidationError as exc:
+            results.append({"status": "rejected", "detail": str(exc)})
+        except HTTPException as exc:
+            results.append({"status": "rejected", "detail": exc.detail})
+        except Exception:
+            logger.exception("Batch item failed for server %s", server.id)
+            results.append({"status": "rejected", "detail": "Item failed"})
+    db.commit()
+    return {"results": results, "intervals": interval_hints(db, server.id)}
+
+
+@router.post("/sync")
+def sync_agent(payload: AgentSyncIn, request: Request, db: Session = Depends(get_db)):
+    token = request.headers.get("X-AGENT-TOKEN")
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing agent token")
+    if payload.version != SYNC_VERSION:
+        raise HTTPException(status_code=400, detail=f"Unsupported sync version {payload.version}")
+    if not payload.results:
+        enforce_rate_limit(f"{token}:sync")
+    server = get_server_by_token(db, token)
+    AGENT_REQUESTS.labels("sync").inc()
+    with single_transaction(db):
+        response = sync_server(db, server, payload)
+    return response
+
+
+def sync_server(db: Session, server: Server, payload: AgentSyncIn) -> dict:
+    results = []
+    jobs = []
+    record_result = queue_job_result if settings.ingest_async else record_job_result
+    for result in payload.results:
+        try:
+            results.append({"job_id": result.job_id, "status": record_result(db, server, result.job_id, result)})
+        except HTTPException as exc:
+            if exc.status_code == 503:
+                raise
+            results.append({"job_id": result.job_id, "status": "rejected", "detail": exc.detail})
+    if payload.inventory and settings.ingest_async:
+        inventory = "queued"
+        beat = AgentHeartbeat(inventory=payload.inventory, telemetry=payload.telemetry, inventory_fingerprint=payload.inventory_fingerprint)
+        queue_payload(db, server, "heartbeat", beat)
+    elif payload.inventory:
+        inventory = "stored"
+        record_heartbeat(db, server, payload.inventory, payload.telemetry, payload.inventory_fingerprint)
+    elif payload.inventory_fingerprint:
+        inventory = "unchanged" if payload.inventory_fingerprint == server.inventory_fingerprint else "required"
+        record_heartbeat(db, server, None, payload.telemetry)
+    else:
+        inventory = None
+    if payload.claim:
+        job = claim_next_job(db, server)
+        if job:
+            jobs.append(job_assignment(job))
+    return {
+        "version": SYNC_VERSION,
+        "inventory": inventory,
+        "results": results,
+        "jobs": jobs,
+        "intervals": interval_hints(db, server.id),
+    }
+
+
+@router.post("/relay")
+def relay_sync(payload: RelaySyncIn, request: Request, db: Session = Depends(get_db)):
+    relay_token = request.headers.get("X-RELAY-TOKEN", "").encode("utf-8")
+    if not settings.relay_token or not hmac.compare_digest(relay_token, settings.relay_token.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid relay token")
+    if len(payload.items) > settings.relay_max_agents:
+        raise HTTPException(status_code=413, detail=f"At most {settings.relay_max_agents} agents per relay batch")
+    AGENT_REQUESTS.labels("relay").inc()
+    tokens = [item.agent_token for item in payload.items]
+    servers = {server.agent_token: server for server in db.query(Server).filter(Server.agent_token.in_(tokens))}
+    agents = []
+    with single_transaction(db):
+        for item in payload.items:
+            server = servers.get(item.agent_token)
+            if not server:
+                agents.append({"status": "rejected", "detail": "Invalid agent token"})
+            elif item.sync.version != SYNC_VERSION:
+                agents.append({"status": "rejected", "detail": f"Unsupported sync version {item.sync.version}"})
+            else:
+                try:
+                    with db.begin_nested():
+                        response = sync_server(db, server, item.sync)
+                    agents.append({"status": "ok", **response})
+                except HTTPException as exc:
+                    agents.append({"status": "rejected", "detail": exc.detail})
+                except SQLAlchemyError:
+                    logger.exception("Relay sync failed for server %s", server.id)
+                    agents.append({"status": "rejected", "detail": "Sync failed"})
+    return {"agents": agents}
+
+
 async def await_json(request: Request) -> dict:
     try:
         return await request.json()
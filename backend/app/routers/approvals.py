@@ -3,17 +3,19 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
+from app.core.metrics import InstrumentedRoute
 from app.db.models import Job, User
-from app.deps import get_current_user, get_db
+from app.deps import get_current_user, get_db, get_read_db
 from app.schemas import ApprovalAction, JobOut
 from app.services.audit import create_audit
+from app.services.events import publish_job_event
 
 
-router = APIRouter(prefix="/approvals", tags=["approvals"])
+router = APIRouter(prefix="/approvals", tags=["approvals"], route_class=InstrumentedRoute)
 
 
 @router.get("", response_model=list[JobOut])
-def list_pending_approvals(db: Session = Depends(get_db), _: User = Depends(get_current_user)):
+def list_pending_approvals(db: Session = Depends(get_read_db), _: User = Depends(get_current_user)):
     return db.query(Job).filter(Job.status == "PENDING_APPROVAL").order_by(Job.created_at.desc()).all()
 
 
@@ -27,9 +29,10 @@ def approve_job(job_id: int, payload: ApprovalAction, db: Session = Depends(get_
     job.approved_at = datetime.now(timezone.utc)
     job.approval_reason = payload.reason
     job.updated_at = datetime.now(timezone.utc)
+    publish_job_event(db, job)
+    create_audit(db, "user", user.id, "job_approved", "job", job.id, payload.reason)
     db.commit()
     db.refresh(job)
-    create_audit(db, "user", user.id, "job_approved", "job", job.id, payload.reason)
     return job
 
 
@@ -43,7 +46,8 @@ def deny_job(job_id: int, payload: ApprovalAction, db: Session = Depends(get_db)
     job.approved_at = datetime.now(timezone.utc)
     job.approval_reason = payload.reason
     job.updated_at = datetime.now(timezone.utc)
+    publish_job_event(db, job)
+    create_audit(db, "user", user.id, "job_denied", "job", job.id, payload.reason)
     db.commit()
     db.refresh(job)
-    create_audit(db, "user", user.id, "job_denied", "job", job.id, payload.reason)
     return job
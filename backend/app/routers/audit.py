@@ -1,14 +1,19 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.metrics import InstrumentedRoute
 from app.db.models import AuditLog, User
-from app.deps import get_current_user, get_db
+from app.deps import get_current_user, get_read_db
 from app.schemas import AuditLogOut
+from app.services.serialization import audit_rows, fast_json_response
 
 
-router = APIRouter(prefix="/audit", tags=["audit"])
+router = APIRouter(prefix="/audit", tags=["audit"], route_class=InstrumentedRoute)
 
 
 @router.get("", response_model=list[AuditLogOut])
-def list_audit_logs(db: Session = Depends(get_db), _: User = Depends(get_current_user)):
+def list_audit_logs(db: Session = Depends(get_read_db), _: User = Depends(get_current_user)):
+    if settings.fast_json_responses:
+        return fast_json_response(audit_rows(db))
     return db.query(AuditLog).order_by(AuditLog.created_at.desc()).limit(500).all()
@@ -1,22 +1,43 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from app.core.security import create_access_token, verify_password
+from app.core.metrics import InstrumentedRoute
+from app.core.security import PasswordHasherBusy, create_access_token, verify_and_update_password_async
 from app.db.models import User
-from app.deps import get_db
+from app.deps import get_auth_db, get_db
 from app.schemas import Token
 
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=InstrumentedRoute)
+
+
+def find_user(db: Session, email: str) -> User | None:
+    return db.query(User).filter(User.email == email).first()
+
+
+def store_password_hash(db: Session, user: User, password_hash: str):
+    db.query(User).filter(User.id == user.id).update({User.password_hash: password_hash})
+    db.commit()
 
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db),
+    auth_db: Session = Depends(get_auth_db),
+):
+    user = await run_in_threadpool(find_user, auth_db, form_data.username)
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(form_data.password, user.password_hash):
+    try:
+        valid, new_hash = await verify_and_update_password_async(form_data.password, user.password_hash)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Login busy, retry shortly", headers={"Retry-After": "1"})
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        await run_in_threadpool(store_password_hash, db, user, new_hash)
     token = create_access_token(user.email)
     return Token(access_token=token)
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from jose import JWTError
+
+from app.core.config import settings
+from app.core.metrics import InstrumentedRoute
+from app.core.security import create_stream_ticket, decode_access_token, decode_stream_ticket
+from app.db.models import User
+from app.db.session import AuthSessionLocal, ReadSessionLocal
+from app.deps import get_current_user, oauth2_scheme, resolve_user
+from app.services.events import fetch_events, latest_event_id, recent_event_ids
+
+
+router = APIRouter(prefix="/events", tags=["events"], route_class=InstrumentedRoute)
+
+KEEPALIVE_SECONDS = 15
+
+redeemed_tickets: dict[str, float] = {}
+redeemed_lock = threading.Lock()
+
+
+def redeem_ticket(ticket: str) -> tuple[str, float]:
+    try:
+        payload = decode_stream_ticket(ticket)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid ticket")
+    now = time.time()
+    with redeemed_lock:
+        for jti in [jti for jti, expires in redeemed_tickets.items() if expires <= now]:
+            del redeemed_tickets[jti]
+        if payload["jti"] in redeemed_tickets:
+            raise HTTPException(status_code=401, detail="Ticket already used")
+        redeemed_tickets[payload["jti"]] = payload["exp"]
+    return payload["sub"], payload["session_exp"]
+
+
+def user_is_active(email: str) -> bool:
+    db = AuthSessionLocal()
+    try:
+        return db.query(User.id).filter(User.email == email, User.is_active.is_(True)).first() is not None
+    finally:
+        db.close()
+
+
+def lookback_start() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=settings.event_lookback_seconds)
+
+
+def load_delivered(cursor: int) -> set[int]:
+    db = ReadSessionLocal()
+    try:
+        return recent_event_ids(db, cursor, lookback_start())
+    finally:
+        db.close()
+
+
+def load_events(after_id: int, delivered: set[int]) -> list[tuple[int, str, str]]:
+    db = ReadSessionLocal()
+    try:
+        events = fetch_events(db, after_id, since=lookback_start(), delivered=delivered)
+        return [(event.id, event.event_type, event.payload) for event in events]
+    finally:
+        db.close()
+
+
+async def event_stream(request: Request, cursor: int, email: str, session_exp: float):
+    last_sent = time.monotonic()
+    delivered = dict.fromkeys(await run_in_threadpool(load_delivered, cursor), last_sent)
+    yield f"retry: {int(settings.event_poll_seconds * 1000) + 1000}\n\n"
+    while not await request.is_disconnected():
+        if time.time() >= session_exp or not await run_in_threadpool(user_is_active, email):
+            return
+        events = await run_in_threadpool(load_events, cursor, set(delivered))
+        for event_id, event_type, payload in events:
+            cursor = max(cursor, event_id)
+            delivered[event_id] = time.monotonic()
+            yield f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n"
+        expired = time.monotonic() - settings.event_lookback_seconds
+        delivered = {event_id: sent for event_id, sent in delivered.items() if sent >= expired}
+        if events:
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent > KEEPALIVE_SECONDS:
+            last_sent = time.monotonic()
+            yield ": keepalive\n\n"
+        await asyncio.sleep(settings.event_poll_seconds)
+
+
+@router.post("/ticket")
+def create_ticket(token: str = Depends(oauth2_scheme), user: User = Depends(get_current_user)):
+    ticket = create_stream_ticket(user.email, decode_access_token(token)["exp"])
+    return {"ticket": ticket, "expires_in": settings.event_ticket_seconds}
+
+
+@router.get("/stream")
+def stream_events(request: Request, ticket: str | None = None, cursor: int | None = None):
+    header = request.headers.get("Authorization", "")
+    if not ticket and not header.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    last_event_id = request.headers.get("Last-Event-ID")
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    db = AuthSessionLocal()
+    try:
+        if ticket:
+            email, session_exp = redeem_ticket(ticket)
+            if not user_is_active(email):
+                raise HTTPException(status_code=401, detail="Inactive user")
+        else:
+            token = header[7:]
+            email = resolve_user(db, token).email
+            session_exp = decode_access_token(token)["exp"]
+        if cursor is None:
+            cursor = latest_event_id(db)
+    finally:
+        db.close()
+    return StreamingResponse(
+        event_stream(request, cursor, email, session_exp),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
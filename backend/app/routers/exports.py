@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.metrics import InstrumentedRoute
+from app.db.models import User
+from app.db.session import read_session_factory
+from app.deps import get_current_user
+from app.services.exports import audit_statement, jobs_statement, stream_export, updates_statement
+
+
+router = APIRouter(prefix="/exports", tags=["exports"], route_class=InstrumentedRoute)
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def export_response(request: Request, name: str, statement, fmt: str, gzip: bool) -> StreamingResponse:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    filename = f"{name}-{stamp}.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(statement, fmt, gzip, read_session_factory(request.headers.get("Authorization"))),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/updates")
+def export_updates(
+    request: Request,
+    format: str = Query(default="csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    _: User = Depends(get_current_user),
+):
+    return export_response(request, "updates", updates_statement(), format, gzip)
+
+
+@router.get("/jobs")
+def export_jobs(
+    request: Request,
+    format: str = Query(default="csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    _: User = Depends(get_current_user),
+):
+    return export_response(request, "jobs", jobs_statement(since, until), format, gzip)
+
+
+@router.get("/audit")
+def export_audit(
+    request: Request,
+    format: str = Query(default="csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    _: User = Depends(get_current_user),
+):
+    return export_response(request, "audit", audit_statement(since, until), format, gzip)
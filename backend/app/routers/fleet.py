@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.core.metrics import InstrumentedRoute
+from app.db.models import User
+from app.deps import get_current_user, get_read_db
+from app.schemas import FleetSummaryOut, ScanTelemetryOut
+from app.services.inventory import slowest_scans
+from app.services.servers import get_fleet_summary
+
+
+router = APIRouter(prefix="/fleet", tags=["fleet"], route_class=InstrumentedRoute)
+
+
+@router.get("/summary", response_model=FleetSummaryOut)
+def fleet_summary(db: Session = Depends(get_read_db), _: User = Depends(get_current_user)):
+    return get_fleet_summary(db)
+
+
+@router.get("/slow-scans", response_model=list[ScanTelemetryOut])
+def slow_scans(limit: int = Query(default=20, ge=1, le=500), db: Session = Depends(get_read_db), _: User = Depends(get_current_user)):
+    return slowest_scans(db, limit)
@@ -3,13 +3,18 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.metrics import InstrumentedRoute
 from app.db.models import Job, JobResult, Server, User
-from app.deps import get_current_user, get_db
-from app.schemas import JobCreate, JobOut, JobResultOut
+from app.deps import get_current_user, get_db, get_read_db
+from app.schemas import BulkJobCreate, JobCreate, JobOut, JobResultOut
 from app.services.audit import create_audit
+from app.services.events import publish_job_event
+from app.services.packages import find_package_hosts
+from app.services.serialization import fast_json_response, job_rows
 
 
-router = APIRouter(prefix="/jobs", tags=["jobs"])
+router = APIRouter(prefix="/jobs", tags=["jobs"], route_class=InstrumentedRoute)
 
 
 @router.post("", response_model=JobOut)
@@ -29,17 +34,57 @@ def create_job(payload: JobCreate, db: Session = Depends(get_db), user: User = D
         updated_at=datetime.now(timezone.utc),
     )
     db.add(job)
+    db.flush()
+    publish_job_event(db, job)
+    create_audit(db, "user", user.id, "job_created", "job", job.id, f"{job.job_type} for server {server.hostname}")
     db.commit()
     db.refresh(job)
-    create_audit(db, "user", user.id, "job_created", "job", job.id, f"{job.job_type} for server {server.hostname}")
     return job
 
 
+@router.post("/bulk", response_model=list[JobOut])
+def create_bulk_jobs(payload: BulkJobCreate, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    server_ids = set(payload.server_ids)
+    if payload.package:
+        query = payload.package
+        if not query.name and not query.prefix:
+            raise HTTPException(status_code=400, detail="package name or prefix is required")
+        hosts = find_package_hosts(db, query.name, query.prefix, query.current_below, query.min_candidate, query.security_only)
+        server_ids.update(host["server_id"] for host in hosts)
+    if not server_ids:
+        raise HTTPException(status_code=400, detail="No target servers")
+    known_ids = {row.id for row in db.query(Server.id).filter(Server.id.in_(server_ids))}
+    status = "PENDING_APPROVAL" if payload.requires_approval else "APPROVED"
+    now = datetime.now(timezone.utc)
+    jobs = [
+        Job(
+            server_id=server_id,
+            job_type=payload.job_type,
+            status=status,
+            scheduled_at=payload.scheduled_at,
+            requires_approval=payload.requires_approval,
+            created_by=user.id,
+            created_at=now,
+            updated_at=now,
+        )
+        for server_id in sorted(known_ids)
+    ]
+    db.add_all(jobs)
+    db.flush()
+    for job in jobs:
+        publish_job_event(db, job)
+    create_audit(db, "user", user.id, "bulk_jobs_created", "job", None, f"{payload.job_type} for {len(jobs)} servers")
+    db.commit()
+    return jobs
+
+
 @router.get("", response_model=list[JobOut])
-def list_jobs(db: Session = Depends(get_db), _: User = Depends(get_current_user)):
+def list_jobs(db: Session = Depends(get_read_db), _: User = Depends(get_current_user)):
+    if settings.fast_json_responses:
+        return fast_json_response(job_rows(db))
     return db.query(Job).order_by(Job.created_at.desc()).all()
 
 
 @router.get("/{job_id}/results", response_model=list[JobResultOut])
-def list_job_results(job_id: int, db: Session = Depends(get_db), _: User = Depends(get_current_user)):
+def list_job_results(job_id: int, db: Session = Depends(get_read_db), _: User = Depends(get_current_user)):
     return db.query(JobResult).filter(JobResult.job_id == job_id).order_by(JobResult.id.desc()).all()
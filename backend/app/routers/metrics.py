@@ -0,0 +1,19 @@
+import hmac
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.core.config import settings
+from app.core.metrics import metrics_response
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    if not settings.metrics_token:
+        raise HTTPException(status_code=403, detail="METRICS_TOKEN is not configured")
+    supplied = request.headers.get("Authorization", "").encode("utf-8")
+    if not hmac.compare_digest(supplied, f"Bearer {settings.metrics_token}".encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return metrics_response()
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.core.metrics import InstrumentedRoute
+from app.db.models import User
+from app.deps import get_current_user, get_read_db
+from app.schemas import PackageHostOut
+from app.services.packages import find_package_hosts
+
+
+router = APIRouter(prefix="/packages", tags=["packages"], route_class=InstrumentedRoute)
+
+
+@router.get("", response_model=list[PackageHostOut])
+def search_packages(
+    name: str | None = None,
+    prefix: str | None = None,
+    current_below: str | None = None,
+    min_candidate: str | None = None,
+    security_only: bool = False,
+    limit: int = Query(default=1000, ge=1, le=50000),
+    db: Session = Depends(get_read_db),
+    _: User = Depends(get_current_user),
+):
+    if not name and not prefix:
+        raise HTTPException(status_code=400, detail="name or prefix is required")
+    return find_package_hosts(db, name, prefix, current_below, min_candidate, security_only, limit)
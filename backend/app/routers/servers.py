@@ -1,22 +1,35 @@
 from sqlalchemy import func
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
+from app.core.metrics import InstrumentedRoute
 from app.db.models import Inventory, Job, Server, Update
 import secrets
 from datetime import datetime, timezone
 
-from app.deps import get_current_admin, get_current_user, get_db
+from app.core.config import settings
+from app.deps import get_current_admin, get_current_user, get_db, get_read_db
 from app.services.audit import create_audit
+from app.services.etag import not_modified, server_etag, servers_list_etag, set_etag
+from app.services.serialization import fast_json_response, server_rows
 from app.schemas import InventoryOut, JobOut, ServerOut, UpdateOut
 from app.services.servers import compute_server_status
 
 
-router = APIRouter(prefix="/servers", tags=["servers"])
+router = APIRouter(prefix="/servers", tags=["servers"], route_class=InstrumentedRoute)
 
 
 @router.get("", response_model=list[ServerOut])
-def list_servers(db: Session = Depends(get_db), _: str = Depends(get_current_user)):
+def list_servers(request: Request, response: Response, db: Session = Depends(get_read_db), _: str = Depends(get_current_user)):
+    etag = servers_list_etag(db)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    if settings.fast_json_responses:
+        fast = fast_json_response(server_rows(db))
+        set_etag(fast, etag)
+        return fast
+    set_etag(response, etag)
     latest_subq = (
         db.query(Inventory.server_id, func.max(Inventory.collected_at).label("max_time"))
         .group_by(Inventory.server_id)
@@ -54,7 +67,12 @@ def list_servers(db: Session = Depends(get_db), _: str = Depends(get_current_use
 
 
 @router.get("/{server_id}/inventory", response_model=InventoryOut)
-def get_server_inventory(server_id: int, db: Session = Depends(get_db), _: str = Depends(get_current_user)):
+def get_server_inventory(server_id: int, request: Request, response: Response, db: Session = Depends(get_read_db), _: str = Depends(get_current_user)):
+    etag = server_etag(db, server_id, "inventory_version")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_etag(response, etag)
     inventory = (
         db.query(Inventory)
         .filter(Inventory.server_id == server_id)
@@ -69,12 +87,22 @@ def get_server_inventory(server_id: int, db: Session = Depends(get_db), _: str =
 
 
 @router.get("/{server_id}/jobs", response_model=list[JobOut])
-def list_server_jobs(server_id: int, db: Session = Depends(get_db), _: str = Depends(get_current_user)):
+def list_server_jobs(server_id: int, request: Request, response: Response, db: Session = Depends(get_read_db), _: str = Depends(get_current_user)):
+    etag = server_etag(db, server_id, "jobs_version")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_etag(response, etag)
     return db.query(Job).filter(Job.server_id == server_id).order_by(Job.created_at.desc()).all()
 
 
 @router.get("/{server_id}/updates", response_model=list[UpdateOut])
-def list_server_updates(server_id: int, db: Session = Depends(get_db), _: str = Depends(get_current_user)):
+def list_server_updates(server_id: int, request: Request, response: Response, db: Session = Depends(get_read_db), _: str = Depends(get_current_user)):
+    etag = server_etag(db, server_id, "inventory_version")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_etag(response, etag)
     inventory = (
         db.query(Inventory)
         .filter(Inventory.server_id == server_id)
@@ -93,6 +121,6 @@ def rotate_agent_token(server_id: int, db: Session = Depends(get_db), user=Depen
         raise HTTPException(status_code=404, detail="Server not found")
     server.agent_token = secrets.token_hex(24)
     server.updated_at = datetime.now(timezone.utc)
-    db.commit()
     create_audit(db, "user", user.id, "agent_token_rotated", "server", server.id, server.hostname)
+    db.commit()
     return {"agent_token": server.agent_token}
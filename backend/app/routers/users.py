@@ -1,27 +1,63 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from app.core.security import hash_password
+from app.core.metrics import InstrumentedRoute
+from app.core.security import PasswordHasherBusy, hash_password_async
 from app.db.models import User
-from app.deps import get_current_admin, get_db
-from app.schemas import UserCreate, UserOut
+from app.deps import get_auth_db, get_current_admin, get_db, invalidate_user_cache
+from app.schemas import UserCreate, UserOut, UserUpdate
+from app.services.audit import create_audit
 
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=InstrumentedRoute)
 
 
-@router.post("", response_model=UserOut)
-def create_user(payload: UserCreate, db: Session = Depends(get_db), _: User = Depends(get_current_admin)):
-    existing = db.query(User).filter(User.email == payload.email).first()
-    if existing:
-        raise HTTPException(status_code=409, detail="User already exists")
-    user = User(email=payload.email, password_hash=hash_password(payload.password), role=payload.role)
+def user_exists(db: Session, email: str) -> bool:
+    return db.query(User.id).filter(User.email == email).first() is not None
+
+
+def insert_user(db: Session, user: User) -> User:
     db.add(user)
     db.commit()
     db.refresh(user)
     return user
 
 
+@router.post("", response_model=UserOut)
+async def create_user(
+    payload: UserCreate,
+    db: Session = Depends(get_db),
+    auth_db: Session = Depends(get_auth_db),
+    _: User = Depends(get_current_admin),
+):
+    if await run_in_threadpool(user_exists, auth_db, payload.email):
+        raise HTTPException(status_code=409, detail="User already exists")
+    try:
+        password_hash = await hash_password_async(payload.password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Password hashing busy, retry shortly", headers={"Retry-After": "1"})
+    user = await run_in_threadpool(insert_user, db, User(email=payload.email, password_hash=password_hash, role=payload.role))
+    invalidate_user_cache(user.email)
+    return user
+
+
 @router.get("", response_model=list[UserOut])
 def list_users(db: Session = Depends(get_db), _: User = Depends(get_current_admin)):
     return db.query(User).all()
+
+
+@router.patch("/{user_id}", response_model=UserOut)
+def update_user(user_id: int, payload: UserUpdate, db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if payload.role is not None:
+        user.role = payload.role
+    if payload.is_active is not None:
+        user.is_active = payload.is_active
+    create_audit(db, "user", admin.id, "user_updated", "user", user.id, f"role={user.role} active={user.is_active}")
+    db.commit()
+    db.refresh(user)
+    invalidate_user_cache(user.email)
+    return user
@@ -0,0 +1,12 @@
+import logging
+
+from app.services.scheduler import scheduler_loop
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    scheduler_loop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import Base64Bytes, BaseModel, EmailStr, Field, model_validator
 
 
 class Token(BaseModel):
@@ -15,6 +15,11 @@ class UserCreate(BaseModel):
     role: str = "operator"
 
 
+class UserUpdate(BaseModel):
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+
+
 class UserOut(BaseModel):
     id: int
     email: EmailStr
@@ -45,6 +50,16 @@ class ServerOut(ServerBase):
         from_attributes = True
 
 
+class FleetSummaryOut(BaseModel):
+    total: int
+    by_status: Dict[str, int]
+    by_os: Dict[str, int]
+    by_package_manager: Dict[str, int]
+    security_updates_pending: int
+    servers_with_security_updates: int
+    generated_at: datetime
+
+
 class UpdateOut(BaseModel):
     id: int
     name: str
@@ -82,6 +97,22 @@ class JobCreate(BaseModel):
     requires_approval: bool = True
 
 
+class PackageQuery(BaseModel):
+    name: Optional[str] = None
+    prefix: Optional[str] = None
+    current_below: Optional[str] = None
+    min_candidate: Optional[str] = None
+    security_only: bool = False
+
+
+class BulkJobCreate(BaseModel):
+    job_type: str
+    server_ids: List[int] = []
+    package: Optional[PackageQuery] = None
+    scheduled_at: Optional[datetime] = None
+    requires_approval: bool = True
+
+
 class JobOut(BaseModel):
     id: int
     server_id: int
@@ -95,6 +126,8 @@ class JobOut(BaseModel):
     created_by: Optional[int]
     created_at: datetime
     updated_at: datetime
+    lease_expires_at: Optional[datetime]
+    attempts: int
 
     class Config:
         from_attributes = True
@@ -109,11 +142,22 @@ class JobResultOut(BaseModel):
     stdout: Optional[str]
     stderr: Optional[str]
     status: str
+    staged_bytes: Optional[int]
+    install_seconds: Optional[float]
 
     class Config:
         from_attributes = True
 
 
+class PackageHostOut(BaseModel):
+    server_id: int
+    hostname: str
+    name: str
+    current_version: Optional[str]
+    candidate_version: Optional[str]
+    is_security: bool
+
+
 class AuditLogOut(BaseModel):
     id: int
     actor_type: str
@@ -135,6 +179,21 @@ class UpdateIn(BaseModel):
     is_security: bool
 
 
+class PackageColumns(BaseModel):
+    name: List[str]
+    current: List[Optional[str]]
+    candidate: List[Optional[str]]
+    security: Base64Bytes = b""
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        if not len(self.name) == len(self.current) == len(self.candidate):
+            raise ValueError("Package columns must have the same length")
+        if len(self.security) > (len(self.name) + 7) // 8:
+            raise ValueError("Security bitmap is longer than the package list")
+        return self
+
+
 class InventoryIn(BaseModel):
     hostname: str
     ip: str
@@ -144,12 +203,31 @@ class InventoryIn(BaseModel):
     package_manager: str
     last_update_time: Optional[datetime]
     reboot_required: bool
-    updates: List[UpdateIn]
-    security_updates: List[UpdateIn]
+    boot_time: Optional[datetime] = None
+    updates: List[UpdateIn] = []
+    security_updates: List[UpdateIn] = []
+    packages: Optional[PackageColumns] = None
+
+
+class AgentTelemetryIn(BaseModel):
+    phases: Dict[str, Dict[str, float]] = {}
+    commands: Dict[str, Dict[str, float]] = {}
+    requests: Dict[str, Dict[str, float]] = {}
+    scan_seconds: Optional[float] = None
 
 
 class AgentHeartbeat(BaseModel):
     inventory: InventoryIn
+    telemetry: Optional[AgentTelemetryIn] = None
+    inventory_fingerprint: Optional[str] = Field(default=None, max_length=64)
+
+
+class ScanTelemetryOut(BaseModel):
+    server_id: int
+    hostname: str
+    scan_seconds: float
+    last_seen: Optional[datetime]
+    telemetry: Optional[AgentTelemetryIn]
 
 
 class AgentJobResultIn(BaseModel):
@@ -161,6 +239,36 @@ class AgentJobResultIn(BaseModel):
     stderr: str
     status: str
     inventory: InventoryIn
+    inventory_fingerprint: Optional[str] = Field(default=None, max_length=64)
+    staged_bytes: Optional[int] = None
+    install_seconds: Optional[float] = None
+
+
+class AgentBatchItem(BaseModel):
+    type: Literal["heartbeat", "result"]
+    payload: Dict[str, Any]
+
+
+class AgentBatchIn(BaseModel):
+    items: List[AgentBatchItem]
+
+
+class AgentSyncIn(BaseModel):
+    version: int = 1
+    inventory: Optional[InventoryIn] = None
+    inventory_fingerprint: Optional[str] = Field(default=None, max_length=64)
+    telemetry: Optional[AgentTelemetryIn] = None
+    results: List[AgentJobResultIn] = []
+    claim: bool = True
+
+
+class RelayAgentSync(BaseModel):
+    agent_token: str
+    sync: AgentSyncIn
+
+
+class RelaySyncIn(BaseModel):
+    items: List[RelayAgentSync]
 
 
 class ApprovalAction(BaseModel):
@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.db.models import Job, JobResult, Server
+from app.schemas import AgentJobResultIn, AgentTelemetryIn, InventoryIn
+from app.services.alerts import alert_after_commit
+from app.services.audit import create_audit
+from app.services.events import publish_event, publish_job_event, server_payload
+from app.services.inventory import store_inventory, store_telemetry
+from app.services.jobs import claim_job, complete_rebooted_jobs, lease_duration, resolve_job_status
+from app.services.servers import as_utc, invalidate_fleet_summary, server_status
+
+
+def record_heartbeat(
+    db: Session,
+    server: Server,
+    inventory: InventoryIn | None,
+    telemetry: AgentTelemetryIn | None = None,
+    fingerprint: str | None = None,
+    seen_at: datetime | None = None,
+):
+    previous_status = server_status(server)
+    if previous_status == "offline":
+        invalidate_fleet_summary()
+    seen_at = as_utc(seen_at) if seen_at else datetime.now(timezone.utc)
+    if server.last_seen is None or seen_at > as_utc(server.last_seen):
+        server.last_seen = seen_at
+    if inventory:
+        if inventory.boot_time:
+            for job in complete_rebooted_jobs(db, server, inventory.boot_time):
+                publish_job_event(db, job)
+        store_inventory(db, server, inventory, telemetry, fingerprint)
+        if server.security_updates_count > 0:
+            alert_after_commit(db, f"Security updates available on {server.hostname} ({server.ip})")
+    elif telemetry:
+        store_telemetry(db, server, telemetry)
+    publish_status_change(db, server, previous_status)
+    create_audit(db, "agent", server.id, "heartbeat", "server", server.id, server.hostname)
+
+
+def claim_next_job(db: Session, server: Server) -> Job | None:
+    job = (
+        db.query(Job)
+        .filter(Job.server_id == server.id, Job.status == "QUEUED")
+        .order_by(Job.created_at.asc())
+        .first()
+    )
+    if not job:
+        return None
+    claim_job(db, job)
+    publish_job_event(db, job)
+    create_audit(db, "agent", server.id, "job_started", "job", job.id, job.job_type)
+    return job
+
+
+def job_assignment(job: Job) -> dict:
+    return {"id": job.id, "job_type": job.job_type, "lease_seconds": int(lease_duration(job).total_seconds())}
+
+
+def record_job_result(db: Session, server: Server, job_id: int, payload: AgentJobResultIn) -> str:
+    job = db.query(Job).filter(Job.id == job_id, Job.server_id == server.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    duplicate = db.query(JobResult.id).filter(JobResult.job_id == job.id, JobResult.finished_at == payload.finished_at).first()
+    if duplicate:
+        return job.status
+    previous_status = server_status(server)
+    status = resolve_job_status(payload.exit_code, payload.status)
+    result = JobResult(
+        job_id=job.id,
+        started_at=payload.started_at,
+        finished_at=payload.finished_at,
+        exit_code=payload.exit_code,
+        stdout=payload.stdout,
+        stderr=payload.stderr,
+        status=status,
+        staged_bytes=payload.staged_bytes,
+        install_seconds=payload.install_seconds,
+    )
+    db.add(result)
+    job.status = status
+    job.lease_expires_at = None
+    job.updated_at = datetime.now(timezone.utc)
+    publish_job_event(db, job)
+    store_inventory(db, server, payload.inventory, fingerprint=payload.inventory_fingerprint)
+    publish_status_change(db, server, previous_status)
+    if status == "FAILED":
+        alert_after_commit(db, f"Patch job failed on {server.hostname} ({server.ip})")
+    create_audit(db, "agent", server.id, "job_result", "job", job.id, status)
+    return status
+
+
+def publish_status_change(db: Session, server: Server, previous_status: str):
+    status = server_status(server)
+    if status != previous_status:
+        publish_event(db, "server_status", server_payload(server, status))
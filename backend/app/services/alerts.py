@@ -1,24 +1,78 @@
+import logging
+import queue
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 
 import httpx
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.metrics import ALERT_SECONDS
 from app.db.models import Server
+from app.services.events import publish_event, server_payload
+from app.services.servers import as_utc, invalidate_fleet_summary
 
 
+logger = logging.getLogger(__name__)
+
 offline_alerted: set[int] = set()
+alert_queue: queue.Queue[str] = queue.Queue(maxsize=1000)
+alert_worker: threading.Thread | None = None
+alert_worker_lock = threading.Lock()
+
+
+def alerts_enabled() -> bool:
+    return bool(settings.telegram_bot_token and settings.telegram_chat_id)
+
+
+def send_alerts():
+    while True:
+        send_telegram(alert_queue.get())
+
+
+def notify(message: str):
+    global alert_worker
+    if not alerts_enabled():
+        return
+    with alert_worker_lock:
+        if alert_worker is None:
+            alert_worker = threading.Thread(target=send_alerts, name="alerts", daemon=True)
+            alert_worker.start()
+    try:
+        alert_queue.put_nowait(message)
+    except queue.Full:
+        logger.warning("Alert queue full, dropping: %s", message)
+
+
+def alert_after_commit(db: Session, message: str):
+    db.info.setdefault("alerts", []).append(message)
+
+
+@event.listens_for(Session, "after_commit")
+def release_alerts(session):
+    for message in session.info.pop("alerts", []):
+        notify(message)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_alerts(session):
+    session.info.pop("alerts", None)
 
 
 def send_telegram(message: str):
-    if not settings.telegram_bot_token or not settings.telegram_chat_id:
+    if not alerts_enabled():
         return
     url = f"https://api.telegram.org/bot{settings.telegram_bot_token}/sendMessage"
     payload = {"chat_id": settings.telegram_chat_id, "text": message}
+    started = time.perf_counter()
+    outcome = "ok"
     try:
         httpx.post(url, data=payload, timeout=10)
     except Exception:
-        return
+        outcome = "error"
+    ALERT_SECONDS.labels("telegram", outcome).observe(time.perf_counter() - started)
 
 
 def check_offline_servers(db: Session):
@@ -26,10 +80,13 @@ def check_offline_servers(db: Session):
     offline_before = now - timedelta(minutes=10)
     servers = db.query(Server).all()
     for server in servers:
-        if server.last_seen and server.last_seen < offline_before:
+        if server.last_seen and as_utc(server.last_seen) < offline_before:
             if server.id not in offline_alerted:
-                send_telegram(f"Server offline: {server.hostname} ({server.ip})")
+                alert_after_commit(db, f"Server offline: {server.hostname} ({server.ip})")
                 offline_alerted.add(server.id)
+                invalidate_fleet_summary()
+                publish_event(db, "server_status", server_payload(server, "offline"))
         else:
             if server.id in offline_alerted:
                 offline_alerted.remove(server.id)
+                invalidate_fleet_summary()
@@ -21,6 +21,4 @@ def create_audit(
         message=message,
     )
     db.add(log)
-    db.commit()
-    db.refresh(log)
     return log
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+
+from fastapi import Request, Response
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.db.models import Server
+from app.services.servers import OFFLINE_AFTER
+
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def servers_list_etag(db: Session) -> str:
+    cutoff = datetime.now(timezone.utc) - OFFLINE_AFTER
+    count, total, offline = db.query(
+        func.count(Server.id),
+        func.coalesce(func.sum(Server.version), 0),
+        func.count(case(((Server.last_seen == None) | (Server.last_seen < cutoff), 1))),
+    ).one()
+    return f'"servers-{count}-{total}-{offline}"'
+
+
+def server_etag(db: Session, server_id: int, column: str) -> str | None:
+    version = db.query(getattr(Server, column)).filter(Server.id == server_id).scalar()
+    if version is None:
+        return None
+    return f'"{column}-{server_id}-{version}"'
+
+
+def not_modified(request: Request, etag: str | None) -> Response | None:
+    if etag is None:
+        return None
+    candidates = [value.strip() for value in request.headers.get("If-None-Match", "").split(",")]
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+def set_etag(response: Response, etag: str | None):
+    if etag is None:
+        return
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,66 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Event, Job, Server
+
+
+def job_payload(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "server_id": job.server_id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "requires_approval": job.requires_approval,
+        "scheduled_at": job.scheduled_at,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+def server_payload(server: Server, status: str) -> dict:
+    return {"id": server.id, "hostname": server.hostname, "ip": server.ip, "status": status, "last_seen": server.last_seen}
+
+
+def publish_event(db: Session, event_type: str, payload: dict) -> Event:
+    event = Event(
+        event_type=event_type,
+        payload=json.dumps(payload, default=str),
+        created_at=datetime.now(timezone.utc),
+    )
+    db.add(event)
+    return event
+
+
+def publish_job_event(db: Session, job: Job) -> Event:
+    event_type = "approval_created" if job.status == "PENDING_APPROVAL" else "job_updated"
+    return publish_event(db, event_type, job_payload(job))
+
+
+def latest_event_id(db: Session) -> int:
+    return db.query(func.max(Event.id)).scalar() or 0
+
+
+def recent_event_ids(db: Session, up_to_id: int, since: datetime) -> set[int]:
+    return {event_id for (event_id,) in db.query(Event.id).filter(Event.id <= up_to_id, Event.created_at >= since)}
+
+
+def fetch_events(db: Session, after_id: int, limit: int = 500, since: datetime | None = None, delivered: set[int] | None = None) -> list[Event]:
+    condition = Event.id > after_id
+    if since is not None:
+        late = recent_event_ids(db, after_id, since) - (delivered or set())
+        if late:
+            condition = or_(condition, Event.id.in_(late))
+    return db.query(Event).filter(condition).order_by(Event.id.asc()).limit(limit).all()
+
+
+def prune_events(db: Session, now: datetime | None = None) -> int:
+    if now is None:
+        now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=settings.event_retention_hours)
+    deleted = db.query(Event).filter(Event.created_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return deleted
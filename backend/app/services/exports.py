@@ -0,0 +1,132 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app.db.models import AuditLog, Inventory, Job, JobResult, Server, Update
+from app.db.session import SessionLocal
+from app.services.serialization import dumps
+
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def updates_statement():
+    latest = (
+        select(Inventory.server_id, func.max(Inventory.collected_at).label("max_time"))
+        .group_by(Inventory.server_id)
+        .subquery()
+    )
+    return (
+        select(
+            Inventory.server_id,
+            Inventory.hostname,
+            Inventory.collected_at,
+            Update.name,
+            Update.current_version,
+            Update.candidate_version,
+            Update.is_security,
+        )
+        .join(latest, (Inventory.server_id == latest.c.server_id) & (Inventory.collected_at == latest.c.max_time))
+        .join(Update, Update.inventory_id == Inventory.id)
+        .order_by(Inventory.server_id.asc(), Update.name.asc())
+    )
+
+
+def jobs_statement(since: datetime | None = None, until: datetime | None = None):
+    statement = (
+        select(
+            Job.id.label("job_id"),
+            Job.server_id,
+            Server.hostname,
+            Job.job_type,
+            Job.status.label("job_status"),
+            Job.created_at,
+            JobResult.id.label("result_id"),
+            JobResult.started_at,
+            JobResult.finished_at,
+            JobResult.exit_code,
+            JobResult.status.label("result_status"),
+            JobResult.staged_bytes,
+            JobResult.install_seconds,
+            JobResult.stdout,
+            JobResult.stderr,
+        )
+        .join(Server, Server.id == Job.server_id)
+        .outerjoin(JobResult, JobResult.job_id == Job.id)
+        .order_by(Job.id.asc(), JobResult.id.asc())
+    )
+    if since:
+        statement = statement.where(Job.created_at >= since)
+    if until:
+        statement = statement.where(Job.created_at < until)
+    return statement
+
+
+def audit_statement(since: datetime | None = None, until: datetime | None = None):
+    statement = select(
+        AuditLog.id,
+        AuditLog.created_at,
+        AuditLog.actor_type,
+        AuditLog.actor_id,
+        AuditLog.action,
+        AuditLog.target_type,
+        AuditLog.target_id,
+        AuditLog.message,
+    ).order_by(AuditLog.id.asc())
+    if since:
+        statement = statement.where(AuditLog.created_at >= since)
+    if until:
+        statement = statement.where(AuditLog.created_at < until)
+    return statement
+
+
+def encode_csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(statement, session_factory=SessionLocal):
+    db = session_factory()
+    try:
+        result = db.execute(statement.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+        keys = list(result.keys())
+        yield keys
+        for partition in result.partitions():
+            yield partition
+    finally:
+        db.close()
+
+
+def encode_chunks(statement, fmt: str, session_factory=SessionLocal):
+    rows = iter_rows(statement, session_factory)
+    keys = next(rows)
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(keys)
+        for partition in rows:
+            writer.writerows([encode_csv_value(value) for value in row] for row in partition)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+        return
+    for partition in rows:
+        yield b"".join(dumps(dict(zip(keys, row))) + b"\n" for row in partition)
+
+
+def stream_export(statement, fmt: str, compress: bool, session_factory=SessionLocal):
+    chunks = encode_chunks(statement, fmt, session_factory)
+    if not compress:
+        yield from chunks
+        return
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
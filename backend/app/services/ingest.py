@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import INGEST_BATCH_SECONDS, INGEST_ITEMS
+from app.db.models import IngestItem, Server
+from app.db.session import SessionLocal, single_transaction
+from app.schemas import AgentHeartbeat, AgentJobResultIn
+from app.services.agents import record_heartbeat, record_job_result
+
+
+logger = logging.getLogger(__name__)
+
+ingest_stats: dict[str, int | float] = {"depth": 0, "depth_checked_at": 0.0, "processed": 0, "coalesced": 0, "failed": 0}
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+def queue_depth(db: Session) -> int:
+    depth = db.execute(select(func.count(IngestItem.id))).scalar() or 0
+    ingest_stats["depth"] = depth
+    ingest_stats["depth_checked_at"] = time.monotonic()
+    return depth
+
+
+def enqueue_item(db: Session, server: Server, kind: str, payload: str) -> IngestItem:
+    depth = ingest_stats["depth"]
+    if time.monotonic() - ingest_stats["depth_checked_at"] > 1 or depth >= settings.ingest_queue_max:
+        depth = queue_depth(db)
+    if depth >= settings.ingest_queue_max:
+        INGEST_ITEMS.labels(kind, "rejected").inc()
+        raise IngestQueueFull()
+    item = IngestItem(server_id=server.id, kind=kind, payload=payload, created_at=datetime.now(timezone.utc))
+    db.add(item)
+    ingest_stats["depth"] += 1
+    INGEST_ITEMS.labels(kind, "queued").inc()
+    return item
+
+
+def claim_items(db: Session, limit: int, now: datetime | None = None) -> list[IngestItem]:
+    if now is None:
+        now = datetime.now(timezone.utc)
+    available = or_(IngestItem.claimed_until == None, IngestItem.claimed_until < now)
+    ids = db.execute(select(IngestItem.id).where(available).order_by(IngestItem.id).limit(limit)).scalars().all()
+    if not ids:
+        return []
+    holder = uuid.uuid4().hex
+    db.execute(
+        update(IngestItem)
+        .where(IngestItem.id.in_(ids), available)
+        .values(claimed_by=holder, claimed_until=now + timedelta(seconds=settings.ingest_lease_seconds), attempts=IngestItem.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return db.query(IngestItem).filter(IngestItem.claimed_by == holder).order_by(IngestItem.id).all()
+
+
+def process_items(db: Session, items: list[IngestItem]):
+    latest = {item.server_id: item.id for item in items if item.kind == "heartbeat"}
+    servers = {server.id: server for server in db.query(Server).filter(Server.id.in_({item.server_id for item in items}))}
+    for item in items:
+        server = servers.get(item.server_id)
+        if server is None:
+            INGEST_ITEMS.labels(item.kind, "dropped").inc()
+        elif item.kind == "heartbeat" and latest[item.server_id] != item.id:
+            ingest_stats["coalesced"] += 1
+            INGEST_ITEMS.labels(item.kind, "coalesced").inc()
+        elif item.kind == "heartbeat":
+            beat = AgentHeartbeat.model_validate_json(item.payload)
+            record_heartbeat(db, server, beat.inventory, beat.telemetry, beat.inventory_fingerprint, item.created_at)
+            INGEST_ITEMS.labels(item.kind, "processed").inc()
+        else:
+            result = AgentJobResultIn.model_validate_json(item.payload)
+            try:
+                record_job_result(db, server, result.job_id, result)
+                INGEST_ITEMS.labels(item.kind, "processed").inc()
+            except HTTPException as exc:
+                logger.warning("Dropping queued result for job %s: %s", result.job_id, exc.detail)
+                INGEST_ITEMS.labels(item.kind, "dropped").inc()
+        db.delete(item)
+    ingest_stats["processed"] += len(items)
+
+
+def drain_ingest_queue(db: Session, limit: int | None = None) -> int:
+    items = claim_items(db, limit or settings.ingest_batch_size)
+    if not items:
+        return 0
+    started = time.perf_counter()
+    try:
+        with single_transaction(db):
+            process_items(db, items)
+    except Exception:
+        logger.exception("Ingest batch of %s failed, retrying items one by one", len(items))
+        for item in items:
+            try:
+                with single_transaction(db):
+                    process_items(db, [item])
+            except Exception:
+                ingest_stats["failed"] += 1
+                if item.attempts >= settings.ingest_max_attempts:
+                    logger.exception("Discarding %s for server %s after %s attempts", item.kind, item.server_id, item.attempts)
+                    INGEST_ITEMS.labels(item.kind, "failed").inc()
+                    db.delete(item)
+                    db.commit()
+    INGEST_BATCH_SECONDS.observe(time.perf_counter() - started)
+    ingest_stats["depth"] = max(ingest_stats["depth"] - len(items), 0)
+    return len(items)
+
+
+def ingest_loop(interval: float | None = None):
+    if interval is None:
+        interval = settings.ingest_poll_seconds
+    while True:
+        db = SessionLocal()
+        try:
+            drained = drain_ingest_queue(db)
+        except Exception:
+            logger.exception("Ingest worker failed")
+            drained = 0
+        finally:
+            db.close()
+        if drained < settings.ingest_batch_size:
+            time.sleep(interval)
+
+
+def start_ingest_workers(count: int | None = None) -> list[threading.Thread]:
+    threads = []
+    for index in range(settings.ingest_workers if count is None else count):
+        thread = threading.Thread(target=ingest_loop, name=f"ingest-{index}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
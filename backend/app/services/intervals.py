@@ -0,0 +1,30 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from app.core.config import settings
+from app.db.models import Job
+from app.db.session import engine
+
+
+ACTIVE_JOB_STATUSES = ("APPROVED", "QUEUED", "RUNNING")
+
+
+def backend_overloaded() -> bool:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return False
+    return pool.checkedout() >= pool.size() * settings.agent_overload_pool_ratio
+
+
+def interval_hints(db: Session, server_id: int) -> dict:
+    active = db.execute(
+        select(Job.id).where(Job.server_id == server_id, Job.status.in_(ACTIVE_JOB_STATUSES)).limit(1)
+    ).first()
+    if active:
+        return {"poll_seconds": settings.agent_active_poll_seconds, "heartbeat_seconds": settings.agent_heartbeat_seconds}
+    factor = settings.agent_overload_multiplier if backend_overloaded() else 1
+    return {
+        "poll_seconds": int(settings.agent_poll_seconds * factor),
+        "heartbeat_seconds": int(settings.agent_heartbeat_seconds * factor),
+    }
@@ -1,12 +1,37 @@
+import time
 from datetime import datetime, timezone
 
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 
+from app.core.metrics import INVENTORY_ROWS, INVENTORY_SECONDS
 from app.db.models import Inventory, Update, Server
-from app.schemas import InventoryIn
+from app.schemas import AgentTelemetryIn, InventoryIn
+from app.services.packages import merge_updates, sync_server_packages
+from app.services.servers import invalidate_fleet_summary
 
 
-def store_inventory(db: Session, server: Server, inventory_in: InventoryIn) -> Inventory:
+def summary_fields(server: Server) -> tuple:
+    return (
+        server.os_name,
+        server.os_version,
+        server.package_manager,
+        server.updates_count,
+        server.security_updates_count,
+        server.reboot_required,
+    )
+
+
+def store_inventory(
+    db: Session,
+    server: Server,
+    inventory_in: InventoryIn,
+    telemetry: AgentTelemetryIn | None = None,
+    fingerprint: str | None = None,
+) -> Inventory:
+    started = time.perf_counter()
+    previous = summary_fields(server)
+    pending = merge_updates(inventory_in)
     inventory = Inventory(
         server_id=server.id,
         collected_at=datetime.now(timezone.utc),
@@ -18,31 +43,14 @@ def store_inventory(db: Session, server: Server, inventory_in: InventoryIn) -> I
         package_manager=inventory_in.package_manager,
         last_update_time=inventory_in.last_update_time,
         reboot_required=inventory_in.reboot_required,
-        security_updates_count=len(inventory_in.security_updates),
-        updates_count=len(inventory_in.updates),
+        security_updates_count=sum(1 for data in pending.values() if data["is_security"]),
+        updates_count=len(pending),
+        telemetry=telemetry.model_dump_json() if telemetry else None,
     )
     db.add(inventory)
     db.flush()
-    for update in inventory_in.updates:
-        db.add(
-            Update(
-                inventory_id=inventory.id,
-                name=update.name,
-                current_version=update.current_version,
-                candidate_version=update.candidate_version,
-                is_security=update.is_security,
-            )
-        )
-    for update in inventory_in.security_updates:
-        db.add(
-            Update(
-                inventory_id=inventory.id,
-                name=update.name,
-                current_version=update.current_version,
-                candidate_version=update.candidate_version,
-                is_security=True,
-            )
-        )
+    if pending:
+        db.execute(insert(Update), [{"inventory_id": inventory.id, "name": name, **data} for name, data in pending.items()])
     server.hostname = inventory_in.hostname
     server.ip = inventory_in.ip
     server.os_name = inventory_in.os_name
@@ -50,7 +58,51 @@ def store_inventory(db: Session, server: Server, inventory_in: InventoryIn) -> I
     server.kernel_version = inventory_in.kernel_version
     server.package_manager = inventory_in.package_manager
     server.last_update_time = inventory_in.last_update_time
+    server.updates_count = inventory.updates_count
+    server.security_updates_count = inventory.security_updates_count
+    server.reboot_required = inventory.reboot_required
+    if telemetry and telemetry.scan_seconds is not None:
+        server.scan_seconds = telemetry.scan_seconds
+    server.inventory_version = Server.inventory_version + 1
+    server.inventory_fingerprint = fingerprint
     server.updated_at = datetime.now(timezone.utc)
-    db.commit()
-    db.refresh(inventory)
+    sync_server_packages(db, server, pending)
+    db.flush()
+    if summary_fields(server) != previous:
+        invalidate_fleet_summary()
+    INVENTORY_ROWS.observe(len(pending))
+    INVENTORY_SECONDS.observe(time.perf_counter() - started)
     return inventory
+
+
+def store_telemetry(db: Session, server: Server, telemetry: AgentTelemetryIn):
+    latest = db.scalar(select(Inventory).where(Inventory.server_id == server.id).order_by(Inventory.id.desc()).limit(1))
+    if latest is not None:
+        latest.telemetry = telemetry.model_dump_json()
+    if telemetry.scan_seconds is not None:
+        server.scan_seconds = telemetry.scan_seconds
+
+
+def slowest_scans(db: Session, limit: int = 20) -> list[dict]:
+    servers = db.execute(
+        select(Server.id, Server.hostname, Server.scan_seconds, Server.last_seen)
+        .where(Server.scan_seconds.is_not(None))
+        .order_by(Server.scan_seconds.desc())
+        .limit(limit)
+    ).all()
+    latest = (
+        select(func.max(Inventory.id))
+        .where(Inventory.server_id.in_([server.id for server in servers]), Inventory.telemetry.is_not(None))
+        .group_by(Inventory.server_id)
+    )
+    telemetry = dict(db.execute(select(Inventory.server_id, Inventory.telemetry).where(Inventory.id.in_(latest))).all())
+    return [
+        {
+            "server_id": server.id,
+            "hostname": server.hostname,
+            "scan_seconds": server.scan_seconds,
+            "last_seen": server.last_seen,
+            "telemetry": AgentTelemetryIn.model_validate_json(telemetry[server.id]) if server.id in telemetry else None,
+        }
+        for server in servers
+    ]
@@ -1,8 +1,11 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 
-from app.db.models import Job
+from app.core.config import settings
+from app.db.models import Job, JobResult, Server
+from app.services.servers import as_utc
 
 
 def queue_due_jobs(db: Session, now: datetime | None = None) -> int:
@@ -25,3 +28,87 @@ def resolve_job_status(exit_code: int, status: str | None) -> str:
     if status in {"COMPLETED", "FAILED"}:
         return status
     return "COMPLETED" if exit_code == 0 else "FAILED"
+
+
+def lease_duration(job: Job) -> timedelta:
+    if job.job_type == "REBOOT":
+        return timedelta(seconds=settings.reboot_lease_seconds)
+    return timedelta(seconds=settings.job_lease_seconds)
+
+
+def claim_job(db: Session, job: Job, now: datetime | None = None) -> Job:
+    if now is None:
+        now = datetime.now(timezone.utc)
+    job.status = "RUNNING"
+    job.attempts = (job.attempts or 0) + 1
+    job.lease_expires_at = now + lease_duration(job)
+    job.updated_at = now
+    return job
+
+
+def renew_job_lease(db: Session, job: Job, now: datetime | None = None) -> Job:
+    if now is None:
+        now = datetime.now(timezone.utc)
+    job.lease_expires_at = now + lease_duration(job)
+    db.commit()
+    return job
+
+
+def reap_expired_jobs(db: Session, now: datetime | None = None, limit: int | None = None) -> list[Job]:
+    if now is None:
+        now = datetime.now(timezone.utc)
+    if limit is None:
+        limit = settings.reaper_batch_size
+    unleased_before = now - timedelta(seconds=settings.reboot_lease_seconds)
+    expired = (
+        db.query(Job)
+        .filter(Job.status == "RUNNING")
+        .filter(or_(Job.lease_expires_at < now, and_(Job.lease_expires_at == None, Job.updated_at < unleased_before)))
+        .order_by(Job.lease_expires_at.asc())
+        .limit(limit)
+        .all()
+    )
+    for job in expired:
+        job.lease_expires_at = None
+        job.updated_at = now
+        if job.job_type != "REBOOT" and job.attempts < settings.job_max_attempts:
+            job.status = "QUEUED"
+            continue
+        job.status = "FAILED"
+        db.add(
+            JobResult(
+                job_id=job.id,
+                finished_at=now,
+                status="FAILED",
+                stderr="Job lease expired without a result from the agent",
+            )
+        )
+    db.commit()
+    return expired
+
+
+def complete_rebooted_jobs(db: Session, server: Server, boot_time: datetime) -> list[Job]:
+    previous = server.boot_time
+    server.boot_time = boot_time
+    if previous is None or as_utc(boot_time) - as_utc(previous) < timedelta(minutes=1):
+        return []
+    jobs = (
+        db.query(Job)
+        .filter(Job.server_id == server.id, Job.status == "RUNNING", Job.job_type == "REBOOT")
+        .all()
+    )
+    now = datetime.now(timezone.utc)
+    for job in jobs:
+        job.status = "COMPLETED"
+        job.lease_expires_at = None
+        job.updated_at = now
+        db.add(
+            JobResult(
+                job_id=job.id,
+                finished_at=boot_time,
+                exit_code=0,
+                stdout=f"Reboot confirmed by heartbeat, booted at {boot_time.isoformat()}",
+                status="COMPLETED",
+            )
+        )
+    return jobs
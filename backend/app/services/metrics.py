@@ -0,0 +1,90 @@
+import logging
+from datetime import datetime, timezone
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from sqlalchemy import func, select
+from sqlalchemy.pool import QueuePool
+
+from app.db.models import IngestItem, Job
+from app.db.session import ReadSessionLocal, db_stats, engine
+from app.services.scheduler import scheduler_metrics
+from app.services.servers import as_utc
+
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseCollector:
+    def collect(self):
+        commits = CounterMetricFamily("autopatch_db_commits", "Committed transactions in this process")
+        commits.add_metric([], db_stats["commits"])
+        yield commits
+        rollbacks = CounterMetricFamily("autopatch_db_rollbacks", "Rolled back transactions in this process")
+        rollbacks.add_metric([], db_stats["rollbacks"])
+        yield rollbacks
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            stats = GaugeMetricFamily("autopatch_db_pool_connections", "Connection pool state", labels=["state"])
+            stats.add_metric(["size"], pool.size())
+            stats.add_metric(["checked_out"], pool.checkedout())
+            stats.add_metric(["checked_in"], pool.checkedin())
+            stats.add_metric(["overflow"], pool.overflow())
+            yield stats
+
+
+class SchedulerCollector:
+    def collect(self):
+        leader = GaugeMetricFamily("autopatch_scheduler_leader", "Whether this process holds the scheduler lease")
+        leader.add_metric([], 1 if scheduler_metrics["is_leader"] else 0)
+        yield leader
+        errors = CounterMetricFamily("autopatch_scheduler_errors", "Scheduler ticks that raised")
+        errors.add_metric([], scheduler_metrics["errors_total"])
+        yield errors
+        if scheduler_metrics["last_lag_seconds"] is not None:
+            lag = GaugeMetricFamily("autopatch_scheduler_lag_seconds", "How late the last scheduler tick started")
+            lag.add_metric([], scheduler_metrics["last_lag_seconds"])
+            yield lag
+
+
+class JobQueueCollector:
+    def describe(self):
+        return []
+
+    def collect(self):
+        depth = GaugeMetricFamily("autopatch_jobs", "Jobs by status", labels=["status"])
+        db = ReadSessionLocal()
+        try:
+            for status, count in db.execute(select(Job.status, func.count()).group_by(Job.status)):
+                depth.add_metric([status], count)
+        except Exception:
+            logger.exception("Job queue metrics failed")
+        finally:
+            db.close()
+        yield depth
+
+
+class IngestQueueCollector:
+    def describe(self):
+        return []
+
+    def collect(self):
+        depth = GaugeMetricFamily("autopatch_ingest_queue_depth", "Agent payloads waiting in the ingest queue")
+        age = GaugeMetricFamily("autopatch_ingest_queue_oldest_seconds", "Age of the oldest queued agent payload")
+        db = ReadSessionLocal()
+        try:
+            count, oldest = db.execute(select(func.count(IngestItem.id), func.min(IngestItem.created_at))).one()
+            depth.add_metric([], count)
+            age.add_metric([], (datetime.now(timezone.utc) - as_utc(oldest)).total_seconds() if oldest else 0)
+        except Exception:
+            logger.exception("Ingest queue metrics failed")
+        finally:
+            db.close()
+        yield depth
+        yield age
+
+
+def register_collectors():
+    REGISTRY.register(DatabaseCollector())
+    REGISTRY.register(SchedulerCollector())
+    REGISTRY.register(JobQueueCollector())
+    REGISTRY.register(IngestQueueCollector())
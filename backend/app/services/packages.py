@@ -0,0 +1,141 @@
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.models import Server, ServerPackage
+from app.schemas import InventoryIn
+
+
+VERSION_SEGMENT = re.compile(r"\d+|[a-zA-Z]+|~")
+PACKAGE_BATCH_SIZE = 1000
+
+
+def merge_updates(inventory_in: InventoryIn) -> dict[str, dict]:
+    merged = {}
+    packages = inventory_in.packages
+    if packages:
+        flags = int.from_bytes(packages.security, "little")
+        for index, (name, current, candidate) in enumerate(zip(packages.name, packages.current, packages.candidate)):
+            merged[name] = {"current_version": current, "candidate_version": candidate, "is_security": bool(flags >> index & 1)}
+    for update in inventory_in.updates:
+        merged[update.name] = {
+            "current_version": update.current_version,
+            "candidate_version": update.candidate_version,
+            "is_security": update.is_security,
+        }
+    for update in inventory_in.security_updates:
+        entry = merged.setdefault(
+            update.name,
+            {"current_version": update.current_version, "candidate_version": update.candidate_version, "is_security": True},
+        )
+        entry["is_security"] = True
+    return merged
+
+
+def sync_server_packages(db: Session, server: Server, pending: dict[str, dict]) -> int:
+    now = datetime.now(timezone.utc)
+    existing = {row.name: row for row in db.query(ServerPackage).filter(ServerPackage.server_id == server.id)}
+    changed = 0
+    for name, row in existing.items():
+        if name not in pending:
+            db.delete(row)
+            changed += 1
+    for name, data in pending.items():
+        row = existing.get(name)
+        if row is None:
+            db.add(ServerPackage(server_id=server.id, name=name, updated_at=now, **data))
+            changed += 1
+            continue
+        if (row.current_version, row.candidate_version, row.is_security) != (
+            data["current_version"],
+            data["candidate_version"],
+            data["is_security"],
+        ):
+            row.current_version = data["current_version"]
+            row.candidate_version = data["candidate_version"]
+            row.is_security = data["is_security"]
+            row.updated_at = now
+            changed += 1
+    return changed
+
+
+def split_version(version: str) -> tuple[int, list[str]]:
+    epoch = 0
+    if ":" in version:
+        head, version = version.split(":", 1)
+        epoch = int(head) if head.isdigit() else 0
+    return epoch, VERSION_SEGMENT.findall(version)
+
+
+def compare_versions(left: str, right: str) -> int:
+    left_epoch, left_parts = split_version(left)
+    right_epoch, right_parts = split_version(right)
+    if left_epoch != right_epoch:
+        return -1 if left_epoch < right_epoch else 1
+    for a, b in zip(left_parts, right_parts):
+        if a == b:
+            continue
+        if a == "~" or b == "~":
+            return -1 if a == "~" else 1
+        if a.isdigit() and b.isdigit():
+            a_num, b_num = int(a), int(b)
+            if a_num != b_num:
+                return -1 if a_num < b_num else 1
+            continue
+        if a.isdigit() != b.isdigit():
+            return 1 if a.isdigit() else -1
+        return -1 if a < b else 1
+    if len(left_parts) == len(right_parts):
+        return 0
+    longer, sign = (left_parts, 1) if len(left_parts) > len(right_parts) else (right_parts, -1)
+    if longer[min(len(left_parts), len(right_parts))] == "~":
+        return -sign
+    return sign
+
+
+def find_package_hosts(
+    db: Session,
+    name: str | None = None,
+    prefix: str | None = None,
+    current_below: str | None = None,
+    min_candidate: str | None = None,
+    security_only: bool = False,
+    limit: int | None = None,
+) -> list[dict]:
+    statement = select(
+        ServerPackage.server_id,
+        Server.hostname,
+        ServerPackage.name,
+        ServerPackage.current_version,
+        ServerPackage.candidate_version,
+        ServerPackage.is_security,
+    ).join(Server, Server.id == ServerPackage.server_id)
+    if name:
+        statement = statement.where(ServerPackage.name == name)
+    elif prefix:
+        statement = statement.where(ServerPackage.name.startswith(prefix, autoescape=True))
+    if security_only:
+        statement = statement.where(ServerPackage.is_security == True)
+    if current_below:
+        statement = statement.where(ServerPackage.current_version.is_not(None))
+    if min_candidate:
+        statement = statement.where(ServerPackage.candidate_version.is_not(None))
+    statement = statement.order_by(ServerPackage.name.asc(), ServerPackage.server_id.asc())
+    if limit and not current_below and not min_candidate:
+        statement = statement.limit(limit)
+    result = db.execute(statement.execution_options(stream_results=True, yield_per=PACKAGE_BATCH_SIZE))
+    results = []
+    try:
+        for row in result.mappings():
+            if current_below and compare_versions(row["current_version"], current_below) >= 0:
+                continue
+            if min_candidate and compare_versions(row["candidate_version"], min_candidate) < 0:
+                continue
+            results.append(dict(row))
+            if limit and len(results) >= limit:
+                break
+    finally:
+        result.close()
+    return results
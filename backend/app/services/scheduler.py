@@ -0,0 +1,141 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, or_, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import SCHEDULER_TICK
+from app.db.models import SchedulerLease
+from app.db.session import SessionLocal, engine
+from app.services.alerts import check_offline_servers
+from app.services.events import prune_events, publish_job_event
+from app.services.jobs import queue_due_jobs, reap_expired_jobs
+
+
+logger = logging.getLogger(__name__)
+
+ADVISORY_LOCK_KEY = 0x4155544F
+
+scheduler_metrics: dict[str, float | int | bool | None] = {
+    "is_leader": False,
+    "ticks_total": 0,
+    "errors_total": 0,
+    "last_tick_seconds": None,
+    "last_lag_seconds": None,
+    "last_tick_at": None,
+}
+
+
+class LeaderLease:
+    def __init__(self, bind: Engine, name: str = "scheduler", ttl_seconds: int | None = None):
+        self.bind = bind
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds or settings.scheduler_lease_seconds)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.connection: Connection | None = None
+
+    def acquire(self) -> bool:
+        if self.bind.dialect.name == "postgresql":
+            return self._acquire_advisory_lock()
+        return self._acquire_row_lease()
+
+    def release(self):
+        if self.connection is not None:
+            try:
+                self.connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                self.connection.close()
+            finally:
+                self.connection = None
+            return
+        with self.bind.begin() as conn:
+            conn.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name, SchedulerLease.holder == self.holder)
+                .values(expires_at=datetime.now(timezone.utc))
+            )
+
+    def _acquire_advisory_lock(self) -> bool:
+        if self.connection is not None:
+            try:
+                self.connection.execute(text("SELECT 1"))
+                return True
+            except Exception:
+                self.connection.invalidate()
+                self.connection = None
+        conn = self.bind.connect().execution_options(isolation_level="AUTOCOMMIT")
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar()
+        if not locked:
+            conn.close()
+            return False
+        self.connection = conn
+        return True
+
+    def _acquire_row_lease(self) -> bool:
+        now = datetime.now(timezone.utc)
+        with self.bind.begin() as conn:
+            result = conn.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name)
+                .where(or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at < now))
+                .values(holder=self.holder, expires_at=now + self.ttl)
+            )
+            if result.rowcount == 1:
+                return True
+            exists = conn.execute(select(SchedulerLease.name).where(SchedulerLease.name == self.name)).first()
+            if exists:
+                return False
+        try:
+            with self.bind.begin() as conn:
+                conn.execute(insert(SchedulerLease).values(name=self.name, holder=self.holder, expires_at=now + self.ttl))
+        except IntegrityError:
+            return False
+        return True
+
+
+def run_scheduler_tick(db: Session):
+    queue_due_jobs(db)
+    for job in reap_expired_jobs(db):
+        publish_job_event(db, job)
+    check_offline_servers(db)
+    db.commit()
+    prune_events(db)
+
+
+def scheduler_loop(lease: LeaderLease | None = None, interval: int | None = None):
+    if lease is None:
+        lease = LeaderLease(engine)
+    if interval is None:
+        interval = settings.scheduler_interval_seconds
+    next_tick = time.monotonic()
+    while True:
+        started = time.monotonic()
+        try:
+            is_leader = lease.acquire()
+        except Exception:
+            logger.exception("Scheduler leader election failed")
+            is_leader = False
+        scheduler_metrics["is_leader"] = is_leader
+        if is_leader:
+            scheduler_metrics["last_lag_seconds"] = round(max(started - next_tick, 0.0), 3)
+            db = SessionLocal()
+            try:
+                run_scheduler_tick(db)
+            except Exception:
+                scheduler_metrics["errors_total"] += 1
+                logger.exception("Scheduler tick failed")
+            finally:
+                db.close()
+            elapsed = time.monotonic() - started
+            SCHEDULER_TICK.observe(elapsed)
+            scheduler_metrics["ticks_total"] += 1
+            scheduler_metrics["last_tick_seconds"] = round(elapsed, 3)
+            scheduler_metrics["last_tick_at"] = datetime.now(timezone.utc).isoformat()
+        next_tick = started + interval
+        time.sleep(max(next_tick - time.monotonic(), 0.0))
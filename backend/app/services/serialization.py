@@ -0,0 +1,54 @@
+import json
+from datetime import datetime, timezone
+
+from fastapi import Response
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.models import AuditLog, Job, Server
+from app.schemas import AuditLogOut, JobOut, ServerOut
+from app.services.servers import server_status_expression
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_datetime(value: datetime) -> str:
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=encode_datetime, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_json_response(content, headers: dict | None = None) -> Response:
+    return Response(content=dumps(content), media_type="application/json", headers=headers)
+
+
+def schema_columns(model, schema: type[BaseModel], **overrides) -> list:
+    return [overrides[name].label(name) if name in overrides else getattr(model, name) for name in schema.model_fields]
+
+
+def select_rows(db: Session, statement) -> list[dict]:
+    result = db.execute(statement)
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def server_rows(db: Session) -> list[dict]:
+    status = server_status_expression(datetime.now(timezone.utc))
+    return select_rows(db, select(*schema_columns(Server, ServerOut, status=status)).order_by(Server.id.asc()))
+
+
+def job_rows(db: Session) -> list[dict]:
+    return select_rows(db, select(*schema_columns(Job, JobOut)).order_by(Job.created_at.desc()))
+
+
+def audit_rows(db: Session, limit: int = 500) -> list[dict]:
+    return select_rows(db, select(*schema_columns(AuditLog, AuditLogOut)).order_by(AuditLog.created_at.desc()).limit(limit))
@@ -1,10 +1,22 @@
+import time
 from datetime import datetime, timedelta, timezone
 
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Server
+
+
+OFFLINE_AFTER = timedelta(minutes=10)
+
+summary_cache: dict[str, object] = {"expires": 0.0, "value": None}
+
 
 def compute_server_status(last_seen: datetime | None, updates_count: int, security_updates_count: int, reboot_required: bool) -> str:
     if last_seen is None:
         return "offline"
-    if datetime.now(timezone.utc) - last_seen > timedelta(minutes=10):
+    if datetime.now(timezone.utc) - as_utc(last_seen) > OFFLINE_AFTER:
         return "offline"
     if security_updates_count > 0:
         return "security"
@@ -13,3 +25,77 @@ def compute_server_status(last_seen: datetime | None, updates_count: int, securi
     if reboot_required:
         return "reboot"
     return "up_to_date"
+
+
+def as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def is_offline(last_seen: datetime | None, now: datetime | None = None) -> bool:
+    if last_seen is None:
+        return True
+    if now is None:
+        now = datetime.now(timezone.utc)
+    return now - as_utc(last_seen) > OFFLINE_AFTER
+
+
+def server_status(server: Server, now: datetime | None = None) -> str:
+    if is_offline(server.last_seen, now):
+        return "offline"
+    if server.security_updates_count > 0:
+        return "security"
+    if server.updates_count > 0:
+        return "updates"
+    if server.reboot_required:
+        return "reboot"
+    return "up_to_date"
+
+
+def server_status_expression(now: datetime):
+    return case(
+        ((Server.last_seen == None) | (Server.last_seen < now - OFFLINE_AFTER), "offline"),
+        (Server.security_updates_count > 0, "security"),
+        (Server.updates_count > 0, "updates"),
+        (Server.reboot_required == True, "reboot"),
+        else_="up_to_date",
+    )
+
+
+def build_fleet_summary(db: Session, now: datetime | None = None) -> dict:
+    if now is None:
+        now = datetime.now(timezone.utc)
+    status = server_status_expression(now).label("status")
+    by_status = {key: count for key, count in db.query(status, func.count()).group_by(status)}
+    by_os = {
+        f"{name} {version}": count
+        for name, version, count in db.query(Server.os_name, Server.os_version, func.count()).group_by(Server.os_name, Server.os_version)
+    }
+    by_package_manager = {key: count for key, count in db.query(Server.package_manager, func.count()).group_by(Server.package_manager)}
+    pending, affected = db.query(
+        func.coalesce(func.sum(Server.security_updates_count), 0),
+        func.count(case((Server.security_updates_count > 0, 1))),
+    ).one()
+    return {
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "by_os": by_os,
+        "by_package_manager": by_package_manager,
+        "security_updates_pending": int(pending),
+        "servers_with_security_updates": affected,
+        "generated_at": now,
+    }
+
+
+def get_fleet_summary(db: Session) -> dict:
+    if summary_cache["value"] is not None and time.monotonic() < summary_cache["expires"]:
+        return summary_cache["value"]
+    summary = build_fleet_summary(db)
+    summary_cache["value"] = summary
+    summary_cache["expires"] = time.monotonic() + settings.fleet_summary_ttl_seconds
+    return summary
+
+
+def invalidate_fleet_summary():
+    summary_cache["expires"] = 0.0
@@ -0,0 +1,14 @@
+from benchmarks.conftest import PARSER_PACKAGES
+from benchmarks.fleet import apt_simulate_output, yum_check_update_output
+
+
+def test_parse_apt_updates(benchmark, agent):
+    output = apt_simulate_output(PARSER_PACKAGES)
+    updates = benchmark(agent.parse_apt_updates, output)
+    assert len(updates) == PARSER_PACKAGES
+
+
+def test_parse_yum_updates(benchmark, agent):
+    output, advisories = yum_check_update_output(PARSER_PACKAGES)
+    updates = benchmark(agent.parse_yum_updates, output, advisories)
+    assert len(updates) == PARSER_PACKAGES
@@ -0,0 +1,85 @@
+import itertools
+import json
+
+from sqlalchemy import update
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.db.models import Job, Server
+from app.routers.agent import register_server
+from app.routers.servers import list_servers
+from app.schemas import InventoryIn
+from app.services.alerts import check_offline_servers, offline_alerted
+from app.services.audit import create_audit
+from app.services.inventory import store_inventory
+from app.services.jobs import queue_due_jobs
+from app.services.packages import merge_updates
+from benchmarks.conftest import FLEET_SIZE, INVENTORY_PACKAGES
+from benchmarks.fleet import agent_inventory
+
+
+def committed(func):
+    def run(db, *args):
+        result = func(db, *args)
+        db.commit()
+        return result
+
+    return run
+
+
+def test_store_inventory(benchmark, fleet_db, agent):
+    server = fleet_db.get(Server, 1)
+    inventory = InventoryIn(**agent_inventory(agent, 0, INVENTORY_PACKAGES))
+    result = benchmark.pedantic(committed(store_inventory), args=(fleet_db, server, inventory), rounds=20, warmup_rounds=1)
+    assert result.updates_count == INVENTORY_PACKAGES
+
+
+def test_register_new_servers(benchmark, fleet_db, agent):
+    indexes = itertools.count(FLEET_SIZE)
+    registered = []
+    benchmark.pedantic(lambda: registered.append(register_server(fleet_db, agent_inventory(agent, next(indexes), 0))), rounds=200)
+    assert fleet_db.query(Server).count() == FLEET_SIZE + len(registered)
+
+
+def test_register_existing_servers(benchmark, fleet_db, agent):
+    indexes = itertools.cycle(range(FLEET_SIZE))
+    benchmark.pedantic(lambda: register_server(fleet_db, agent_inventory(agent, next(indexes), 0)), rounds=200)
+    assert fleet_db.query(Server).count() == FLEET_SIZE
+
+
+def test_decode_inventory_rows(benchmark, agent):
+    payload = json.loads(json.dumps(agent_inventory(agent, 0, INVENTORY_PACKAGES)))
+    pending = benchmark(lambda: merge_updates(InventoryIn.model_validate(payload)))
+    assert len(pending) == INVENTORY_PACKAGES
+
+
+def test_decode_inventory_columnar(benchmark, agent):
+    payload = json.loads(json.dumps(agent.columnar_inventory(agent_inventory(agent, 0, INVENTORY_PACKAGES))))
+    pending = benchmark(lambda: merge_updates(InventoryIn.model_validate(payload)))
+    assert len(pending) == INVENTORY_PACKAGES
+
+
+def test_list_servers(benchmark, fleet_db):
+    request = Request({"type": "http", "method": "GET", "path": "/api/servers", "headers": []})
+    result = benchmark.pedantic(lambda: list_servers(request, Response(), fleet_db, "bench@example.com"), rounds=10, warmup_rounds=1)
+    assert len(result) == FLEET_SIZE
+
+
+def test_queue_due_jobs(benchmark, fleet_db):
+    def reset():
+        fleet_db.execute(update(Job).where(Job.status == "QUEUED").values(status="APPROVED"))
+        fleet_db.commit()
+
+    benchmark.pedantic(queue_due_jobs, args=(fleet_db,), setup=reset, rounds=10)
+    assert fleet_db.query(Job).filter(Job.status == "APPROVED").count() == 0
+
+
+def test_check_offline_servers(benchmark, fleet_db):
+    benchmark.pedantic(committed(check_offline_servers), args=(fleet_db,), setup=offline_alerted.clear, rounds=10)
+    assert offline_alerted
+    offline_alerted.clear()
+
+
+def test_create_audit(benchmark, fleet_db):
+    log = benchmark(committed(create_audit), fleet_db, "agent", 1, "heartbeat", "server", 1, "host-00001")
+    assert log.id
@@ -0,0 +1,32 @@
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.base import Base
+from benchmarks.fleet import load_agent_module, seed_fleet
+
+FLEET_SIZE = int(os.environ.get("BENCH_FLEET_SIZE", "2000"))
+INVENTORY_PACKAGES = int(os.environ.get("BENCH_INVENTORY_PACKAGES", "500"))
+PARSER_PACKAGES = int(os.environ.get("BENCH_PARSER_PACKAGES", "5000"))
+
+
+@pytest.fixture(scope="session")
+def agent():
+    return load_agent_module()
+
+
+@pytest.fixture
+def fleet_db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    seed_fleet(db, FLEET_SIZE)
+    yield db
+    db.close()
+    engine.dispose()
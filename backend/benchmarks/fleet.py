@@ -0,0 +1,99 @@
+import importlib.util
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import insert
+
+from app.db.models import Job, Server
+
+AGENT_PATH = Path(__file__).resolve().parents[2] / "agent" / "agent.py"
+
+DISTROS = [
+    ("Ubuntu", "22.04", "apt"),
+    ("Ubuntu", "24.04", "apt"),
+    ("Debian GNU/Linux", "12", "apt"),
+    ("Rocky Linux", "9.3", "dnf"),
+    ("CentOS Linux", "7", "yum"),
+]
+
+
+def load_agent_module():
+    spec = importlib.util.spec_from_file_location("autopatch_agent", AGENT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def host_ip(index: int) -> str:
+    return f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+
+
+def apt_simulate_output(packages: int, seed: int = 0, security_ratio: float = 0.1) -> str:
+    rng = random.Random(seed)
+    lines = ["Reading package lists...", "Building dependency tree...", "Reading state information...", "Calculating upgrade..."]
+    for index in range(packages):
+        patch = rng.randint(1, 20)
+        suite = "jammy-updates, Ubuntu:22.04/jammy-security" if rng.random() < security_ratio else "jammy-updates"
+        lines.append(f"Inst pkg-{index} [1.{index % 50}.{patch}-1] (1.{index % 50}.{patch + 1}-1 Ubuntu:22.04/{suite} [amd64])")
+    for index in range(packages):
+        lines.append(f"Conf pkg-{index} (1.{index % 50}.1-1 Ubuntu:22.04/jammy-updates [amd64])")
+    return "\n".join(lines)
+
+
+def yum_check_update_output(packages: int, seed: int = 0, security_ratio: float = 0.1) -> tuple[str, str]:
+    rng = random.Random(seed)
+    lines = ["Last metadata expiration check: 0:12:41 ago on Mon 19 Oct 2026 09:00:00 AM UTC.", ""]
+    advisories = []
+    for index in range(packages):
+        repo = "baseos" if rng.random() < 0.5 else "appstream"
+        version = f"1.{index % 50}.{rng.randint(1, 20)}-1.el9"
+        lines.append(f"pkg-{index}.x86_64    {version}    {repo}")
+        if rng.random() < security_ratio:
+            advisories.append(f"RLSA-2026:{index:04d} Important/Sec. pkg-{index}-{version}.x86_64")
+    return "\n".join(lines), "\n".join(advisories)
+
+
+def agent_inventory(agent, index: int, packages: int, security_ratio: float = 0.1) -> dict:
+    os_name, os_version, package_manager = DISTROS[index % len(DISTROS)]
+    if package_manager == "apt":
+        updates = agent.parse_apt_updates(apt_simulate_output(packages, index, security_ratio))
+    else:
+        updates = agent.parse_yum_updates(*yum_check_update_output(packages, index, security_ratio))
+    return {
+        "hostname": f"host-{index:05d}",
+        "ip": host_ip(index),
+        "os_name": os_name,
+        "os_version": os_version,
+        "kernel_version": "6.1.0-bench",
+        "package_manager": package_manager,
+        "last_update_time": None,
+        "reboot_required": index % 9 == 0,
+        "boot_time": datetime(2026, 1, 1, tzinfo=timezone.utc).isoformat(),
+        "updates": updates,
+    }
+
+
+def seed_fleet(db, servers: int, jobs_per_server: int = 2, offline_ratio: float = 0.05, now: datetime | None = None):
+    now = now or datetime.now(timezone.utc)
+    offline_every = int(1 / offline_ratio) if offline_ratio else 0
+    db.execute(insert(Server), [
+        {
+            "hostname": f"host-{index:05d}", "ip": host_ip(index),
+            "os_name": DISTROS[index % len(DISTROS)][0], "os_version": DISTROS[index % len(DISTROS)][1],
+            "kernel_version": "6.1.0-bench", "package_manager": DISTROS[index % len(DISTROS)][2],
+            "last_seen": now - (timedelta(hours=1) if offline_every and index % offline_every == 0 else timedelta(minutes=index % 5)),
+            "agent_token": f"token-{index}", "updates_count": index % 40, "security_updates_count": index % 4,
+            "reboot_required": index % 9 == 0, "created_at": now, "updated_at": now,
+        }
+        for index in range(servers)
+    ])
+    db.execute(insert(Job), [
+        {
+            "server_id": index % servers + 1, "job_type": "APPLY_PATCHES" if index % 2 else "SCAN_NOW",
+            "status": "APPROVED" if index % 3 == 0 else "COMPLETED", "requires_approval": False,
+            "scheduled_at": now - timedelta(minutes=index % 30), "created_at": now - timedelta(seconds=index), "updated_at": now,
+        }
+        for index in range(servers * jobs_per_server)
+    ])
+    db.commit()
@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.fleet import agent_inventory, load_agent_module
+from benchmarks.local_backend import free_port, start_backend, start_relay
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.windows = {}
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.statuses[name]["error"] += 1
+            return None
+        end = time.perf_counter()
+        self.latencies[name].append(end - start)
+        first, _ = self.windows.get(name, (start, end))
+        self.windows[name] = (min(first, start), end)
+        self.statuses[name][response.status_code] += 1
+        return response
+
+    def report(self):
+        print(f"{'endpoint':<12}{'reqs':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'err %':>8}{'429 %':>8}")
+        for name in sorted(self.statuses):
+            statuses = self.statuses[name]
+            total = sum(statuses.values())
+            errors = sum(count for code, count in statuses.items() if code == "error" or (code >= 400 and code != 429))
+            limited = statuses.get(429, 0)
+            latencies = sorted(self.latencies[name])
+            first, last = self.windows.get(name, (0.0, 1.0))
+            duration = max(last - first, 0.001)
+            p50, p95, p99 = (percentile(latencies, pct) * 1000 for pct in (0.5, 0.95, 0.99))
+            print(f"{name:<12}{total:>8}{total / duration:>9.1f}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{errors * 100 / total:>8.2f}{limited * 100 / total:>8.2f}")
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def run_agent(client: httpx.AsyncClient, stats: Stats, agent, index: int, args, token: str, deadline: float):
+    inventory = agent_inventory(agent, index, args.packages, args.security_ratio)
+    headers = {"X-AGENT-TOKEN": token}
+    rng = random.Random(index)
+    await asyncio.sleep(rng.uniform(0, min(args.poll_interval, args.heartbeat_interval)))
+    next_heartbeat = time.monotonic()
+    while time.monotonic() < deadline:
+        if time.monotonic() >= next_heartbeat:
+            await stats.call(client, "heartbeat", "POST", "/api/agent/heartbeat", headers=headers, json={"inventory": inventory})
+            next_heartbeat = time.monotonic() + args.heartbeat_interval
+        response = await stats.call(client, "poll", "GET", "/api/agent/jobs/poll", headers=headers)
+        job = response.json().get("job") if response is not None and response.status_code == 200 else None
+        if job:
+            payload = await run_job(args, job, inventory)
+            await stats.call(client, "result", "POST", f"/api/agent/jobs/{job['id']}/result", headers=headers, json=payload)
+        await asyncio.sleep(args.poll_interval)
+
+
+async def run_sync_agent(client: httpx.AsyncClient, stats: Stats, agent, index: int, args, token: str, deadline: float):
+    inventory = agent_inventory(agent, index, args.packages, args.security_ratio)
+    fingerprint = agent.inventory_fingerprint(inventory)
+    headers = {"X-AGENT-TOKEN": token}
+    rng = random.Random(index)
+    await asyncio.sleep(rng.uniform(0, min(args.poll_interval, args.heartbeat_interval)))
+    next_heartbeat = time.monotonic()
+    stored = False
+    results = []
+    while time.monotonic() < deadline:
+        payload = {"results": results, "claim": True}
+        if time.monotonic() >= next_heartbeat:
+            payload["inventory_fingerprint"] = fingerprint
+            if not stored:
+                payload["inventory"] = inventory
+        response = await stats.call(client, "sync", "POST", "/api/agent/sync", headers=headers, json=payload)
+        data = response.json() if response is not None and response.status_code == 200 else {}
+        if data:
+            results = []
+            if "inventory_fingerprint" in payload:
+                stored = data.get("inventory") != "required"
+                next_heartbeat = time.monotonic() + args.heartbeat_interval
+        jobs = data.get("jobs") or []
+        if jobs:
+            results = [await run_job(args, jobs[0], inventory, fingerprint)]
+            continue
+        await asyncio.sleep(args.poll_interval)
+
+
+async def run_job(args, job: dict, inventory: dict, fingerprint: str | None = None) -> dict:
+    start = datetime.now(timezone.utc)
+    await asyncio.sleep(args.job_seconds)
+    return {
+        "job_id": job["id"],
+        "started_at": start.isoformat(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "exit_code": 0,
+        "stdout": "Scan complete",
+        "stderr": "",
+        "status": "COMPLETED",
+        "inventory": inventory,
+        "inventory_fingerprint": fingerprint,
+    }
+
+
+async def register_agents(client: httpx.AsyncClient, stats: Stats, agent, args) -> list[tuple[int, str, int]]:
+    semaphore = asyncio.Semaphore(args.register_concurrency)
+
+    async def register(index: int):
+        async with semaphore:
+            inventory = agent_inventory(agent, index, 0, 0)
+            response = await stats.call(client, "register", "POST", "/api/agent/register", headers={"X-BOOTSTRAP-TOKEN": args.bootstrap_token}, json=inventory)
+            if response is None or response.status_code != 200:
+                return None
+            data = response.json()
+            return index, data["agent_token"], data["server_id"]
+
+    registered = await asyncio.gather(*(register(index) for index in range(args.agents)))
+    return [item for item in registered if item]
+
+
+async def queue_jobs(client: httpx.AsyncClient, args, server_ids: list[int]):
+    if not args.jobs_per_agent or not server_ids:
+        return
+    login = await client.post("/api/auth/login", data={"username": args.admin_email, "password": args.admin_password})
+    login.raise_for_status()
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    for _ in range(args.jobs_per_agent):
+        response = await client.post("/api/jobs/bulk", headers=headers, json={"job_type": "SCAN_NOW", "server_ids": server_ids, "requires_approval": False})
+        response.raise_for_status()
+    print(f"queued {args.jobs_per_agent * len(server_ids)} SCAN_NOW jobs (picked up once the scheduler queues them)")
+
+
+async def db_commits(client: httpx.AsyncClient, token: str) -> int | None:
+    try:
+        response = await client.get("/metrics", headers={"Authorization": f"Bearer {token}"})
+        response.raise_for_status()
+    except Exception:
+        return None
+    for line in response.text.splitlines():
+        if line.startswith("autopatch_db_commits_total "):
+            return int(float(line.split()[1]))
+    return None
+
+
+async def run(args, base_url: str, agent_url: str | None = None):
+    agent = load_agent_module()
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as backend, \
+            httpx.AsyncClient(base_url=agent_url or base_url, limits=limits, timeout=60) as client:
+        registered = await register_agents(client, stats, agent, args)
+        print(f"registered {len(registered)} of {args.agents} agents")
+        await queue_jobs(backend, args, [server_id for _, _, server_id in registered])
+        commits_before = await db_commits(backend, args.metrics_token)
+        started = time.monotonic()
+        deadline = started + args.duration
+        runner = run_sync_agent if args.sync else run_agent
+        await asyncio.gather(*(runner(client, stats, agent, index, args, token, deadline) for index, token, _ in registered))
+        elapsed = time.monotonic() - started
+        commits_after = await db_commits(backend, args.metrics_token)
+        relay = (await client.get("/healthz")).json() if agent_url else None
+    stats.report()
+    if commits_before is not None and commits_after is not None:
+        commits = commits_after - commits_before
+        print(f"db commits      {commits} ({commits / elapsed:.1f}/s, single worker count)")
+    if relay:
+        print(f"relay           {relay['backend_requests']} backend requests ({relay['backend_requests'] / elapsed:.1f}/s), {relay['backend_errors']} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many agents against a backend")
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--heartbeat-interval", type=float, default=300.0)
+    parser.add_argument("--poll-interval", type=float, default=60.0)
+    parser.add_argument("--packages", type=int, default=200)
+    parser.add_argument("--security-ratio", type=float, default=0.1)
+    parser.add_argument("--jobs-per-agent", type=int, default=0)
+    parser.add_argument("--job-seconds", type=float, default=0.0)
+    parser.add_argument("--sync", action="store_true", help="Agents use /agent/sync instead of heartbeat, poll and result")
+    parser.add_argument("--ingest-async", action="store_true", help="Queue heartbeats and results for background workers in the local backend")
+    parser.add_argument("--relay", action="store_true", help="Route agents through a local relay")
+    parser.add_argument("--relay-token", default="loadtest")
+    parser.add_argument("--relay-flush-seconds", type=float, default=2.0)
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--register-concurrency", type=int, default=50)
+    parser.add_argument("--backend-url", help="Use a running backend instead of starting one")
+    parser.add_argument("--database-url", help="Database for the local backend (default: temporary SQLite file)")
+    parser.add_argument("--backend-workers", type=int, default=1)
+    parser.add_argument("--scheduler", action="store_true", help="Run the scheduler in the local backend")
+    parser.add_argument("--rate-limit-seconds", type=int, default=5)
+    parser.add_argument("--bootstrap-token", default="loadtest")
+    parser.add_argument("--admin-email", default="bench@example.com")
+    parser.add_argument("--admin-password", default="benchmark")
+    parser.add_argument("--metrics-token", default="loadtest")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        procs = []
+        try:
+            base_url = args.backend_url
+            if not base_url:
+                port = free_port()
+                procs.append(start_backend(port, {
+                    "DATABASE_URL": args.database_url or f"sqlite:///{workdir}/loadtest.db",
+                    "SQLITE_TUNING": "true",
+                    "AGENT_BOOTSTRAP_TOKEN": args.bootstrap_token,
+                    "AGENT_RATE_LIMIT_SECONDS": str(args.rate_limit_seconds),
+                    "SCHEDULER_ENABLED": "true" if args.scheduler else "false",
+                    "RELAY_TOKEN": args.relay_token,
+                    "INGEST_ASYNC": "true" if args.ingest_async else "false",
+                    "METRICS_TOKEN": args.metrics_token,
+                }, workers=args.backend_workers))
+                base_url = f"http://127.0.0.1:{port}"
+            agent_url = None
+            if args.relay:
+                port = free_port()
+                procs.append(start_relay(port, base_url, args.relay_token, args.relay_flush_seconds))
+                agent_url = f"http://127.0.0.1:{port}"
+            asyncio.run(run(args, base_url, agent_url))
+        finally:
+            for proc in procs:
+                proc.terminate()
+                proc.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib import request
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_backend(port: int, env_overrides: dict, workers: int = 1) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "JWT_SECRET": "benchmark",
+        "ADMIN_EMAIL": "bench@example.com",
+        "ADMIN_PASSWORD": "benchmark",
+        "SCHEDULER_ENABLED": "false",
+        "PYTHONPATH": str(BACKEND_DIR),
+        **env_overrides,
+    }
+    subprocess.run(
+        [sys.executable, "-c", "from app.db.base import Base; from app.db import models; from app.db.session import engine; Base.metadata.create_all(engine)"],
+        cwd=BACKEND_DIR, env=env, check=True,
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    return wait_until_healthy(proc, port)
+
+
+def start_relay(port: int, backend_url: str, token: str, flush_seconds: float = 2.0) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "RELAY_BACKEND_URL": backend_url,
+        "RELAY_TOKEN": token,
+        "RELAY_FLUSH_SECONDS": str(flush_seconds),
+        "PYTHONPATH": str(BACKEND_DIR),
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.relay.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    return wait_until_healthy(proc, port)
+
+
+def wait_until_healthy(proc: subprocess.Popen, port: int) -> subprocess.Popen:
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1)
+            return proc
+        except Exception:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"process on port {port} did not start")
@@ -0,0 +1,80 @@
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from urllib import error, parse, request
+
+from benchmarks.local_backend import free_port, start_backend
+
+
+def login_worker(base: str, stop: threading.Event, latencies: list, failures: list):
+    body = parse.urlencode({"username": "bench@example.com", "password": "benchmark"}).encode()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            request.urlopen(request.Request(f"{base}/api/auth/login", data=body, method="POST"), timeout=30).read()
+            latencies.append(time.perf_counter() - start)
+        except error.HTTPError as exc:
+            failures.append(exc.code)
+        except Exception:
+            failures.append(0)
+
+
+def probe_worker(base: str, stop: threading.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            request.urlopen(f"{base}/healthz", timeout=30).read()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            pass
+        time.sleep(0.05)
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput and its effect on other requests")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rounds", type=int, default=29000)
+    parser.add_argument("--hash-workers", type=int, default=2)
+    args = parser.parse_args()
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = start_backend(port, {
+            "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+            "PASSWORD_HASH_ROUNDS": str(args.rounds),
+            "PASSWORD_HASH_WORKERS": str(args.hash_workers),
+        })
+        try:
+            stop = threading.Event()
+            logins, failures, probes = [], [], []
+            threads = [threading.Thread(target=login_worker, args=(base, stop, logins, failures)) for _ in range(args.concurrency)]
+            threads.append(threading.Thread(target=probe_worker, args=(base, stop, probes)))
+            for thread in threads:
+                thread.start()
+            time.sleep(args.duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            proc.terminate()
+            proc.wait()
+    print(f"logins/s        {len(logins) / args.duration:.1f}")
+    print(f"login p50/p99   {percentile(logins, 0.5) * 1000:.1f} / {percentile(logins, 0.99) * 1000:.1f} ms")
+    print(f"login errors    {len(failures)} ({', '.join(sorted({str(code) for code in failures})) or 'none'})")
+    print(f"healthz p50/p99 {percentile(probes, 0.5) * 1000:.1f} / {percentile(probes, 0.99) * 1000:.1f} ms")
+    if probes:
+        print(f"healthz mean    {statistics.mean(probes) * 1000:.1f} ms over {len(probes)} probes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.models import AuditLog, Job, Server
+from app.schemas import AuditLogOut, JobOut, ServerOut
+from app.services.serialization import audit_rows, dumps, job_rows, server_rows
+from app.services.servers import compute_server_status
+
+
+def seed(db, rows: int):
+    now = datetime.now(timezone.utc)
+    db.execute(insert(Server), [
+        {
+            "hostname": f"host-{index}", "ip": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+            "os_name": "Ubuntu", "os_version": "22.04", "kernel_version": "6.1.0", "package_manager": "apt",
+            "last_seen": now - timedelta(minutes=index % 20), "agent_token": f"token-{index}",
+            "updates_count": index % 7, "security_updates_count": index % 3, "reboot_required": index % 5 == 0,
+            "created_at": now, "updated_at": now,
+        }
+        for index in range(rows)
+    ])
+    db.execute(insert(Job), [
+        {
+            "server_id": index + 1, "job_type": "APPLY_PATCHES", "status": "COMPLETED", "requires_approval": True,
+            "approved_by": 1, "approved_at": now, "approval_reason": "maintenance window", "created_by": 1,
+            "created_at": now - timedelta(seconds=index), "updated_at": now,
+        }
+        for index in range(rows)
+    ])
+    db.execute(insert(AuditLog), [
+        {
+            "actor_type": "agent", "actor_id": index, "action": "heartbeat", "target_type": "server",
+            "target_id": index, "message": f"host-{index}", "created_at": now - timedelta(seconds=index),
+        }
+        for index in range(rows)
+    ])
+    db.commit()
+
+
+def legacy_servers(db):
+    servers = db.query(Server).order_by(Server.id.asc()).all()
+    return [
+        ServerOut(
+            id=server.id, hostname=server.hostname, ip=server.ip, os_name=server.os_name, os_version=server.os_version,
+            kernel_version=server.kernel_version, package_manager=server.package_manager,
+            last_update_time=server.last_update_time, last_seen=server.last_seen,
+            status=compute_server_status(server.last_seen, server.updates_count, server.security_updates_count, server.reboot_required),
+        )
+        for server in servers
+    ]
+
+
+def legacy(adapter: TypeAdapter, load):
+    def run(db):
+        content = adapter.dump_python(adapter.validate_python(load(db)), mode="json")
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return run
+
+
+def fast(load):
+    def run(db):
+        return dumps(load(db))
+    return run
+
+
+def measure(db, func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        db.expunge_all()
+        start = time.perf_counter()
+        func(db)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy and fast list serialization")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    cases = [
+        ("servers", legacy(TypeAdapter(list[ServerOut]), legacy_servers), fast(server_rows)),
+        ("jobs", legacy(TypeAdapter(list[JobOut]), lambda db: db.query(Job).order_by(Job.created_at.desc()).all()), fast(job_rows)),
+        ("audit", legacy(TypeAdapter(list[AuditLogOut]), lambda db: db.query(AuditLog).order_by(AuditLog.created_at.desc()).limit(None).all()), fast(lambda db: audit_rows(db, None))),
+    ]
+    print(f"{'endpoint':<10}{'rows':>10}{'legacy ms':>12}{'fast ms':>12}{'speedup':>10}")
+    for rows in args.rows:
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine)()
+        seed(db, rows)
+        for name, legacy_run, fast_run in cases:
+            legacy_time = measure(db, legacy_run, args.repeat)
+            fast_time = measure(db, fast_run, args.repeat)
+            print(f"{name:<10}{rows:>10}{legacy_time * 1000:>12.1f}{fast_time * 1000:>12.1f}{legacy_time / fast_time:>9.1f}x")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.login import percentile
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def seed(servers: int):
+    from app.db import models
+    from app.db.base import Base
+    from app.db.session import SessionLocal, engine
+    from benchmarks.fleet import seed_fleet
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        seed_fleet(db, servers, jobs_per_server=1, offline_ratio=0)
+    finally:
+        db.close()
+
+
+def heartbeat_worker(index: int, packages: int, stop: threading.Event, latencies: list, failures: list):
+    from sqlalchemy.exc import OperationalError
+
+    from app.db.models import Server
+    from app.db.session import SessionLocal
+    from app.schemas import InventoryIn
+    from app.services.agents import record_heartbeat
+    from benchmarks.fleet import agent_inventory, load_agent_module
+
+    inventory = InventoryIn(**agent_inventory(load_agent_module(), index, packages))
+    while not stop.is_set():
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            server = db.query(Server).filter(Server.agent_token == f"token-{index}").first()
+            record_heartbeat(db, server, inventory)
+            db.commit()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            db.rollback()
+            failures.append(index)
+        finally:
+            db.close()
+
+
+def run_writers(first: int, threads: int, packages: int, duration: float):
+    stop = threading.Event()
+    latencies, failures = [], []
+    workers = [
+        threading.Thread(target=heartbeat_worker, args=(first + offset, packages, stop, latencies, failures))
+        for offset in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    print(json.dumps({"latencies": latencies, "failures": len(failures)}))
+
+
+def child(args: list, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.sqlite_writers", *args],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, text=True,
+    )
+
+
+def measure(tuning: bool, args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+            "JWT_SECRET": "benchmark",
+            "SQLITE_TUNING": str(tuning).lower(),
+            "PYTHONPATH": str(BACKEND_DIR),
+        }
+        child(["--seed", str(args.processes * args.threads)], env).wait()
+        procs = [
+            child(["--writer", str(index * args.threads), "--threads", str(args.threads), "--packages", str(args.packages), "--duration", str(args.duration)], env)
+            for index in range(args.processes)
+        ]
+        latencies, failures = [], 0
+        for proc in procs:
+            output, _ = proc.communicate()
+            result = json.loads(output.strip().splitlines()[-1])
+            latencies += result["latencies"]
+            failures += result["failures"]
+    return {"latencies": latencies, "failures": failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent agent heartbeat writes against a SQLite file, untuned and tuned")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--packages", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--seed", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--writer", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.seed is not None:
+        seed(args.seed)
+        return
+    if args.writer is not None:
+        run_writers(args.writer, args.threads, args.packages, args.duration)
+        return
+    print(f"{'sqlite':8}{'writes/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for tuning in (False, True):
+        result = measure(tuning, args)
+        latencies = result["latencies"]
+        print(
+            f"{'tuned' if tuning else 'default':8}{len(latencies) / args.duration:>10.1f}"
+            f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}{result['failures']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
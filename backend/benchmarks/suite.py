@@ -0,0 +1,39 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+BASELINE_DIR = BENCHMARK_DIR / "baselines"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the service and parser benchmarks, save baselines, and fail on regressions")
+    parser.add_argument("--save", metavar="NAME", help="Save this run as a baseline")
+    parser.add_argument("--compare", metavar="ID", nargs="?", const="", help="Compare against a saved run (latest when no id is given)")
+    parser.add_argument("--threshold", type=int, default=int(os.environ.get("BENCH_REGRESSION_THRESHOLD", "15")), help="Allowed slowdown in percent before the run fails")
+    parser.add_argument("--metric", default="median", choices=["min", "max", "mean", "median"])
+    parser.add_argument("-k", dest="keyword", help="Only run benchmarks matching this expression")
+    args, extra = parser.parse_known_args()
+    pytest_args = [
+        str(BENCHMARK_DIR),
+        "-q",
+        "-o", "python_files=bench_*.py",
+        f"--benchmark-storage=file://{BASELINE_DIR}",
+        "--benchmark-columns=min,median,mean,stddev,rounds",
+        "--benchmark-sort=name",
+    ]
+    if args.keyword:
+        pytest_args += ["-k", args.keyword]
+    if args.save:
+        pytest_args.append(f"--benchmark-save={args.save}")
+    if args.compare is not None:
+        pytest_args.append(f"--benchmark-compare={args.compare}" if args.compare else "--benchmark-compare")
+        pytest_args.append(f"--benchmark-compare-fail={args.metric}:{args.threshold}%")
+    sys.exit(pytest.main(pytest_args + extra))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import importlib.util
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from app.schemas import InventoryIn
+from app.services.packages import merge_updates
+
+AGENT_PATH = Path(__file__).resolve().parents[2] / "agent" / "agent.py"
+
+
+def load_agent():
+    spec = importlib.util.spec_from_file_location("autopatch_agent", AGENT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+agent = load_agent()
+
+
+def test_next_slot_delay_keeps_host_phase():
+    assert agent.next_slot_delay(60, 0.25, now=600) == 15
+    assert agent.next_slot_delay(60, 0.25, now=615) == 60
+    assert agent.next_slot_delay(60, 0.5, now=615) == 15
+
+
+def test_interval_hints_are_clamped_and_persisted(tmp_path):
+    agent.save_intervals(tmp_path, {"intervals": {"poll_seconds": 1, "heartbeat_seconds": 900}})
+    assert agent.load_intervals(tmp_path) == {"poll_seconds": 10, "heartbeat_seconds": 900}
+    agent.save_intervals(tmp_path, {"job": None})
+    assert json.loads((tmp_path / "intervals.json").read_text())["poll_seconds"] == 10
+
+
+def test_failed_cycles_back_off(tmp_path, monkeypatch):
+    monkeypatch.setattr(agent.random, "uniform", lambda low, high: high)
+    agent.record_failure(tmp_path)
+    agent.record_failure(tmp_path)
+    state = json.loads((tmp_path / "backoff.json").read_text())
+    assert state["failures"] == 2
+    assert agent.in_backoff(tmp_path)
+    agent.clear_failures(tmp_path)
+    assert not agent.in_backoff(tmp_path)
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    calls = []
+
+    def reject(method, url, headers, payload):
+        calls.append(url)
+        raise agent.error.HTTPError(url, 404, "Not Found", None, None)
+
+    monkeypatch.setattr(agent, "http_json", reject)
+    monkeypatch.setattr(agent.time, "sleep", lambda seconds: None)
+    with pytest.raises(agent.error.HTTPError) as exc:
+        agent.http_json_retry("GET", "http://backend/api/agent/jobs/poll", {}, None)
+    assert exc.value.code == 404
+    assert len(calls) == 1
+
+
+def test_retry_after_is_capped_at_the_maximum_backoff(monkeypatch):
+    sleeps = []
+
+    def overloaded(method, url, headers, payload):
+        raise agent.error.HTTPError(url, 503, "Service Unavailable", {"Retry-After": "86400"}, None)
+
+    monkeypatch.setattr(agent, "http_json", overloaded)
+    monkeypatch.setattr(agent.time, "sleep", sleeps.append)
+    with pytest.raises(agent.error.HTTPError):
+        agent.http_json_retry("POST", "http://backend/api/agent/sync", {}, {}, retries=2)
+    assert sleeps == [agent.RETRY_MAX_SECONDS]
+
+
+def test_spool_keeps_latest_heartbeat_and_trims_oldest(tmp_path, monkeypatch):
+    monkeypatch.setattr(agent, "SPOOL_MAX_ITEMS", 3)
+    agent.spool_item(tmp_path, "result", {"job_id": 1})
+    agent.spool_item(tmp_path, "heartbeat", {"inventory": {"hostname": "old"}})
+    agent.spool_item(tmp_path, "result", {"job_id": 2})
+    agent.spool_item(tmp_path, "heartbeat", {"inventory": {"hostname": "new"}})
+    agent.spool_item(tmp_path, "result", {"job_id": 3})
+    items = [json.loads(path.read_text()) for path in agent.spooled_items(tmp_path)]
+    assert [item["payload"].get("job_id") or item["payload"]["inventory"]["hostname"] for item in items] == [2, "new", 3]
+
+
+def test_rejected_spool_items_are_dropped_without_blocking_the_rest(tmp_path, monkeypatch):
+    batches = []
+
+    def backend(method, url, headers, payload):
+        jobs = [item["payload"]["job_id"] for item in payload["items"]]
+        batches.append(jobs)
+        if 2 in jobs:
+            raise agent.error.HTTPError(url, 422, "Unprocessable Entity", None, None)
+        return {"results": [{"status": "COMPLETED"} for _ in jobs]}
+
+    monkeypatch.setattr(agent, "http_json_retry", backend)
+    for job_id in [1, 2, 3, 4]:
+        agent.spool_item(tmp_path, "result", {"job_id": job_id})
+    agent.replay_spool("t", "http://backend", tmp_path)
+    assert batches == [[1, 2, 3, 4], [1], [2], [3], [4]]
+    assert agent.spooled_items(tmp_path) == []
+
+
+def test_transient_spool_errors_keep_the_items(tmp_path, monkeypatch):
+    def backend(method, url, headers, payload):
+        raise agent.error.HTTPError(url, 503, "Service Unavailable", None, None)
+
+    monkeypatch.setattr(agent, "http_json_retry", backend)
+    agent.spool_item(tmp_path, "result", {"job_id": 1})
+    with pytest.raises(agent.error.HTTPError):
+        agent.replay_spool("t", "http://backend", tmp_path)
+    assert len(agent.spooled_items(tmp_path)) == 1
+
+
+def test_agent_falls_back_to_legacy_endpoints_without_sync(tmp_path, monkeypatch):
+    calls = []
+    inventory = {"hostname": "a", "updates": []}
+
+    def backend(method, url, headers, payload):
+        calls.append(url.rsplit("/api/agent/", 1)[1])
+        if url.endswith(("/sync", "/batch")):
+            raise agent.error.HTTPError(url, 404, "Not Found", None, None)
+        return {"job": None}
+
+    monkeypatch.setattr(agent, "http_json_retry", backend)
+    monkeypatch.setattr(agent, "collect_inventory", lambda: inventory)
+    (tmp_path / "agent.env").write_text("BACKEND_URL=http://backend\nAGENT_TOKEN=t\n")
+    monkeypatch.setattr(agent, "get_config", lambda state_dir: agent.read_env_file(tmp_path / "agent.env"))
+    agent.run_once(tmp_path)
+    assert calls == ["sync", "batch", "heartbeat", "jobs/poll"]
+    for name in ["last_heartbeat", "last_poll"]:
+        (tmp_path / name).unlink()
+    calls.clear()
+    agent.run_once(tmp_path)
+    assert calls == ["heartbeat", "jobs/poll"]
+
+
+def test_apt_updates_are_security_only_from_security_suites():
+    output = "\n".join([
+        "NOTE: This is only a simulation!",
+        "Inst openssl [3.0.2-0ubuntu1.10] (3.0.2-0ubuntu1.12 Ubuntu:22.04/jammy-security [amd64])",
+        "Inst tzdata [2023c-0ubuntu0.22.04.1] (2024a-0ubuntu0.22.04 Ubuntu:22.04/jammy-updates [all])",
+        "Inst libssl3 [3.0.2-0ubuntu1.10] (3.0.2-0ubuntu1.12 Ubuntu:22.04/jammy-updates, Ubuntu:22.04/jammy-security [amd64])",
+        "Inst linux-image-6.5 (6.5.0-1 Ubuntu:22.04/jammy [amd64])",
+        "Conf openssl (3.0.2-0ubuntu1.12 Ubuntu:22.04/jammy-security [amd64])",
+    ])
+    assert agent.parse_apt_updates(output) == [
+        {"name": "openssl", "current_version": "3.0.2-0ubuntu1.10", "candidate_version": "3.0.2-0ubuntu1.12", "is_security": True},
+        {"name": "tzdata", "current_version": "2023c-0ubuntu0.22.04.1", "candidate_version": "2024a-0ubuntu0.22.04", "is_security": False},
+        {"name": "libssl3", "current_version": "3.0.2-0ubuntu1.10", "candidate_version": "3.0.2-0ubuntu1.12", "is_security": True},
+        {"name": "linux-image-6.5", "current_version": None, "candidate_version": "6.5.0-1", "is_security": False},
+    ]
+
+
+def test_yum_updates_merge_security_advisories():
+    output = "\n".join([
+        "Last metadata expiration check: 0:12:01 ago on Mon 01 Jan 2024 10:00:00 AM UTC.",
+        "",
+        "openssl.x86_64                 1:3.0.7-25.el9_3              baseos",
+        "python3-libs.x86_64            3.9.18-1.el9_3                baseos",
+        "tzdata.noarch                  2024a-1.el9                   baseos",
+    ])
+    advisories = "\n".join([
+        "RHSA-2024:0310 Moderate/Sec.  openssl-1:3.0.7-25.el9_3.x86_64",
+        "RHSA-2024:0647 Important/Sec. python3-libs-3.9.18-1.el9_3.x86_64",
+        "RHSA-2024:0647 Important/Sec. python3-libs-3.9.18-1.el9_3.i686",
+    ])
+    updates = agent.parse_yum_updates(output, advisories)
+    assert [(item["name"], item["candidate_version"], item["is_security"]) for item in updates] == [
+        ("openssl.x86_64", "1:3.0.7-25.el9_3", True),
+        ("python3-libs.x86_64", "3.9.18-1.el9_3", True),
+        ("tzdata.noarch", "2024a-1.el9", False),
+    ]
+    assert not any(item["is_security"] for item in agent.parse_yum_updates(output))
+
+
+def test_columnar_inventory_decodes_to_the_same_rows():
+    updates = [
+        {"name": f"pkg{index}", "current_version": None if index == 3 else "1.0", "candidate_version": "1.1", "is_security": index % 4 == 1}
+        for index in range(11)
+    ]
+    inventory = {"hostname": "a", "ip": "10.0.0.1", "os_name": "Ubuntu", "os_version": "22.04", "kernel_version": "6.1", "package_manager": "apt", "last_update_time": None, "reboot_required": False, "updates": updates}
+    compact = agent.columnar_inventory(inventory)
+    assert "updates" not in compact
+    assert merge_updates(InventoryIn.model_validate(compact)) == merge_updates(InventoryIn.model_validate(inventory))
+
+
+def test_columnar_rejection_falls_back_to_rows(tmp_path, monkeypatch):
+    sent = []
+
+    def backend(method, url, headers, payload):
+        sent.append(headers.get("Content-Type"))
+        if headers.get("Content-Type") == agent.COLUMNAR_CONTENT_TYPE:
+            raise agent.error.HTTPError(url, 422, "Unprocessable Entity", None, None)
+        return {"status": "ok"}
+
+    monkeypatch.setattr(agent, "http_json_retry", backend)
+    payload = {"inventory": {"hostname": "a", "updates": []}}
+    assert agent.post_inventory("http://backend/api/agent/heartbeat", {}, payload, tmp_path) == {"status": "ok"}
+    assert agent.post_inventory("http://backend/api/agent/heartbeat", {}, payload, tmp_path) == {"status": "ok"}
+    assert sent == [agent.COLUMNAR_CONTENT_TYPE, None, None]
+
+
+def record_commands(monkeypatch, code=0):
+    commands = []
+
+    def run(args, timeout=900):
+        commands.append(args)
+        return code, "", ""
+
+    monkeypatch.setattr(agent, "run_cmd", run)
+    monkeypatch.setattr(agent, "shutil_which", lambda name: None)
+    monkeypatch.setattr(agent, "package_cache_bytes", lambda pm: 0)
+    return commands
+
+
+def test_prefetch_stamps_only_after_a_successful_download(tmp_path, monkeypatch):
+    commands = record_commands(monkeypatch, code=1)
+    agent.prefetch_packages("dnf", tmp_path)
+    assert commands == [["dnf", "-y", "--downloadonly", "update"]]
+    assert not agent.has_fresh_prefetch(tmp_path)
+    commands = record_commands(monkeypatch)
+    agent.prefetch_packages("apt", tmp_path)
+    assert commands == [["apt-get", "update"], ["apt-get", "-y", "-d", "upgrade"]]
+    assert agent.has_fresh_prefetch(tmp_path)
+
+
+def test_apply_uses_fresh_prefetch_and_refreshes_stale_one(tmp_path, monkeypatch):
+    commands = record_commands(monkeypatch)
+    stamp = tmp_path / "prefetch_stamp"
+    stamp.write_text("")
+    agent.apply_patches("apt", False, tmp_path)
+    assert commands == [["apt-get", "-y", "upgrade"]]
+    assert not stamp.exists()
+    stamp.write_text("")
+    agent.apply_patches("dnf", True, tmp_path)
+    assert commands[-1] == ["dnf", "-y", "update", "--cacheonly", "--security"]
+    stale = time.time() - agent.PREFETCH_MAX_AGE.total_seconds() - 60
+    for pm, expected in [("apt", [["apt-get", "update"], ["apt-get", "-y", "upgrade"]]), ("dnf", [["dnf", "-y", "update"]])]:
+        commands.clear()
+        stamp.write_text("")
+        os.utime(stamp, (stale, stale))
+        agent.apply_patches(pm, False, tmp_path)
+        assert commands == expected
+        assert stamp.exists()
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.security import create_access_token, verify_and_update_password
+from app.db.base import Base
+from app.db.models import User
+from app.deps import invalidate_user_cache, resolve_user
+from app.routers import events
+from app.routers.events import create_ticket, event_stream, stream_events
+
+
+def setup_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return sessionmaker(bind=engine)(), statements
+
+
+def test_user_lookup_cached_until_invalidated():
+    db, statements = setup_db()
+    user = User(email="ops@example.com", password_hash="x", role="operator", is_active=True)
+    db.add(user)
+    db.commit()
+    token = create_access_token(user.email)
+    invalidate_user_cache()
+    statements.clear()
+    first = resolve_user(db, token)
+    second = resolve_user(db, token)
+    assert (second.id, second.role) == (first.id, "operator")
+    assert len([sql for sql in statements if "FROM users" in sql]) == 1
+    user.is_active = False
+    db.commit()
+    invalidate_user_cache(user.email)
+    with pytest.raises(HTTPException):
+        resolve_user(db, token)
+
+
+def test_password_rehashed_when_work_factor_changes():
+    old_hash = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__default_rounds=1000).hash("secret")
+    valid, new_hash = verify_and_update_password("secret", old_hash)
+    assert valid is True
+    assert new_hash.startswith(f"$pbkdf2-sha256${settings.password_hash_rounds}$")
+    assert verify_and_update_password("secret", new_hash) == (True, None)
+    assert verify_and_update_password("wrong", new_hash) == (False, None)
+
+
+def test_stream_ticket_is_single_use_and_stream_ends_with_the_user(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    user = User(email="ops@example.com", password_hash="x", role="operator", is_active=True)
+    db.add(user)
+    db.commit()
+    monkeypatch.setattr(events, "AuthSessionLocal", factory)
+    monkeypatch.setattr(events, "ReadSessionLocal", factory)
+    monkeypatch.setattr(settings, "event_poll_seconds", 0)
+    invalidate_user_cache()
+    token = create_access_token(user.email)
+    ticket = create_ticket(token, resolve_user(db, token))["ticket"]
+    with pytest.raises(HTTPException):
+        resolve_user(db, ticket)
+    request = Request({"type": "http", "headers": []})
+    assert stream_events(request, ticket=ticket, cursor=0).status_code == 200
+    with pytest.raises(HTTPException) as exc:
+        stream_events(request, ticket=ticket, cursor=0)
+    assert exc.value.detail == "Ticket already used"
+
+    class Connected:
+        async def is_disconnected(self):
+            return False
+
+    async def collect(session_exp):
+        return [chunk async for chunk in event_stream(Connected(), 0, user.email, session_exp)]
+
+    assert len(asyncio.run(collect(0))) == 1
+    user.is_active = False
+    db.commit()
+    assert len(asyncio.run(collect(float("inf")))) == 1
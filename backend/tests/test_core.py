@@ -1,12 +1,34 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import create_engine
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
 
+from app.core import metrics as core_metrics
+from app.core.config import settings
+from app.db import session
 from app.db.base import Base
-from app.db.models import Job
-from app.services.jobs import queue_due_jobs
-from app.services.servers import compute_server_status
+from app.db.models import AuditLog, Event, Inventory, Job, JobResult, Server
+from app.db.session import WriterLock, tune_sqlite
+from app.deps import get_auth_db, get_db, get_read_db
+from app.routers import agent as agent_router
+from app.routers.agent import register_server, relay_sync, submit_batch, sync_agent
+from app.routers.metrics import metrics
+from app.schemas import AgentBatchIn, AgentSyncIn, AgentTelemetryIn, InventoryIn, RelaySyncIn
+from app.services import alerts
+from app.services.agents import record_heartbeat
+from app.services.alerts import check_offline_servers, offline_alerted
+from app.services.etag import servers_list_etag
+from app.services.events import fetch_events, publish_event
+from app.services.inventory import slowest_scans, store_inventory
+from app.services.jobs import complete_rebooted_jobs, queue_due_jobs, reap_expired_jobs
+from app.services.scheduler import LeaderLease
+from app.services.servers import build_fleet_summary, compute_server_status
 
 
 def setup_db():
@@ -31,6 +53,58 @@ def test_queue_due_jobs():
     assert job_future.status == "APPROVED"
 
 
+def test_reap_expired_jobs():
+    db = setup_db()
+    now = datetime.now(timezone.utc)
+    expired = Job(server_id=1, job_type="SCAN_NOW", status="RUNNING", attempts=1, lease_expires_at=now - timedelta(minutes=1), created_at=now, updated_at=now)
+    exhausted = Job(server_id=1, job_type="SCAN_NOW", status="RUNNING", attempts=3, lease_expires_at=now - timedelta(minutes=1), created_at=now, updated_at=now)
+    reboot = Job(server_id=1, job_type="REBOOT", status="RUNNING", attempts=1, lease_expires_at=now - timedelta(minutes=1), created_at=now, updated_at=now)
+    active = Job(server_id=1, job_type="SCAN_NOW", status="RUNNING", attempts=1, lease_expires_at=now + timedelta(minutes=1), created_at=now, updated_at=now)
+    stale_unleased = Job(server_id=1, job_type="SCAN_NOW", status="RUNNING", attempts=0, created_at=now - timedelta(days=1), updated_at=now - timedelta(days=1))
+    recent_unleased = Job(server_id=1, job_type="SCAN_NOW", status="RUNNING", attempts=0, created_at=now, updated_at=now - timedelta(minutes=5))
+    db.add_all([expired, exhausted, reboot, active, stale_unleased, recent_unleased])
+    db.commit()
+    reaped = reap_expired_jobs(db, now=now)
+    assert len(reaped) == 4
+    assert expired.status == "QUEUED"
+    assert exhausted.status == "FAILED"
+    assert reboot.status == "FAILED"
+    assert active.status == "RUNNING"
+    assert stale_unleased.status == "QUEUED"
+    assert recent_unleased.status == "RUNNING"
+    assert db.query(JobResult).count() == 2
+
+
+def test_reboot_completed_by_new_boot_time():
+    db = setup_db()
+    now = datetime.now(timezone.utc)
+    server = Server(hostname="web-1", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="token", boot_time=now - timedelta(days=3))
+    db.add(server)
+    db.commit()
+    job = Job(server_id=server.id, job_type="REBOOT", status="RUNNING", lease_expires_at=now + timedelta(minutes=30), created_at=now, updated_at=now)
+    db.add(job)
+    db.commit()
+    assert complete_rebooted_jobs(db, server, server.boot_time) == []
+    assert complete_rebooted_jobs(db, server, now) == [job]
+    db.commit()
+    db.refresh(job)
+    assert job.status == "COMPLETED"
+    assert job.lease_expires_at is None
+
+
+def test_single_scheduler_leader():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    first = LeaderLease(engine, ttl_seconds=60)
+    second = LeaderLease(engine, ttl_seconds=60)
+    assert first.acquire() is True
+    assert second.acquire() is False
+    assert first.acquire() is True
+    first.release()
+    assert second.acquire() is True
+    assert first.acquire() is False
+
+
 def test_offline_detection():
     now = datetime.now(timezone.utc)
     status = compute_server_status(now - timedelta(minutes=11), 0, 0, False)
@@ -43,3 +117,348 @@ def test_offline_detection():
     assert status == "reboot"
     status = compute_server_status(now, 0, 0, False)
     assert status == "up_to_date"
+
+
+def test_check_offline_servers_publishes_once():
+    db = setup_db()
+    now = datetime.now(timezone.utc)
+    server = Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="a", last_seen=now - timedelta(hours=1))
+    db.add(server)
+    db.commit()
+    offline_alerted.discard(server.id)
+    check_offline_servers(db)
+    check_offline_servers(db)
+    assert server.id in offline_alerted
+    assert db.query(Event).filter(Event.event_type == "server_status").count() == 1
+    offline_alerted.discard(server.id)
+
+
+def test_fetch_events_rereads_late_commits_behind_the_cursor():
+    db = setup_db()
+    now = datetime.now(timezone.utc)
+    for index in range(3):
+        publish_event(db, "job_updated", {"index": index})
+    db.add(Event(event_type="job_updated", payload="{}", created_at=now - timedelta(hours=1)))
+    db.commit()
+    since = now - timedelta(seconds=30)
+    assert [event.id for event in fetch_events(db, 3, since=since, delivered={1, 3})] == [2, 4]
+    assert [event.id for event in fetch_events(db, 4, since=since, delivered={1, 2, 3, 4})] == []
+    assert [event.id for event in fetch_events(db, 2)] == [3, 4]
+
+
+def test_alerts_are_sent_after_commit(monkeypatch):
+    sent = []
+    monkeypatch.setattr(alerts, "notify", sent.append)
+    db = setup_db()
+    server = Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="a")
+    db.add(server)
+    db.commit()
+    update = {"name": "openssl", "current_version": "3.0.2", "candidate_version": "3.0.13", "is_security": True}
+    inventory = InventoryIn(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", last_update_time=None, reboot_required=False, updates=[update])
+    record_heartbeat(db, server, inventory)
+    assert sent == []
+    db.rollback()
+    assert sent == []
+    record_heartbeat(db, server, inventory)
+    db.commit()
+    assert sent == ["Security updates available on a (10.0.0.1)"]
+    record_heartbeat(db, server, None)
+    db.commit()
+    assert len(sent) == 1
+
+
+def test_fleet_summary_counts():
+    db = setup_db()
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="a", last_seen=now, security_updates_count=3, updates_count=5),
+        Server(hostname="b", ip="10.0.0.2", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="b", last_seen=now),
+        Server(hostname="c", ip="10.0.0.3", os_name="Rocky Linux", os_version="9.3", kernel_version="5.14", package_manager="dnf", agent_token="c", last_seen=now - timedelta(hours=1), updates_count=2),
+    ])
+    db.commit()
+    summary = build_fleet_summary(db, now=now)
+    assert summary["total"] == 3
+    assert summary["by_status"] == {"security": 1, "up_to_date": 1, "offline": 1}
+    assert summary["by_os"] == {"Ubuntu 22.04": 2, "Rocky Linux 9.3": 1}
+    assert summary["by_package_manager"] == {"apt": 2, "dnf": 1}
+    assert summary["security_updates_pending"] == 3
+    assert summary["servers_with_security_updates"] == 1
+
+
+def test_version_counters_bumped_on_writes():
+    db = setup_db()
+    now = datetime.now(timezone.utc)
+    server = Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="a")
+    db.add(server)
+    db.commit()
+    assert (server.version, server.jobs_version) == (1, 0)
+    db.add(Job(server_id=server.id, job_type="SCAN_NOW", status="APPROVED", created_at=now, updated_at=now))
+    db.commit()
+    db.refresh(server)
+    assert (server.version, server.jobs_version) == (1, 1)
+    server.last_seen = now
+    db.commit()
+    online = servers_list_etag(db)
+    assert server.version == 1
+    server.last_seen = now - timedelta(days=1)
+    db.commit()
+    assert server.version == 1
+    assert servers_list_etag(db) != online
+    other = sessionmaker(bind=db.get_bind())()
+    stale = other.get(Server, server.id)
+    server.ip = "10.0.0.2"
+    db.commit()
+    stale.hostname = "b"
+    other.commit()
+    db.refresh(server)
+    assert server.version == 3
+
+
+def test_agent_batch_replays_in_order_and_skips_duplicates():
+    db = setup_db()
+    now = datetime.now(timezone.utc)
+    server = Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="spool")
+    db.add(server)
+    db.commit()
+    job = Job(server_id=server.id, job_type="SCAN_NOW", status="RUNNING", requires_approval=False, created_at=now, updated_at=now)
+    db.add(job)
+    db.commit()
+    inventory = {"hostname": "a", "ip": "10.0.0.1", "os_name": "Ubuntu", "os_version": "22.04", "kernel_version": "6.1", "package_manager": "apt", "last_update_time": None, "reboot_required": False, "updates": []}
+    result = {"job_id": job.id, "started_at": now.isoformat(), "finished_at": now.isoformat(), "exit_code": 0, "stdout": "ok", "stderr": "", "status": "COMPLETED", "inventory": inventory}
+    payload = AgentBatchIn(items=[
+        {"type": "result", "payload": result},
+        {"type": "result", "payload": result},
+        {"type": "result", "payload": dict(result, job_id=999)},
+        {"type": "heartbeat", "payload": {"inventory": {"hostname": "a"}}},
+        {"type": "heartbeat", "payload": {"inventory": inventory}},
+    ])
+    request = Request({"type": "http", "headers": [(b"x-agent-token", b"spool")]})
+    response = submit_batch(payload, request, db)
+    assert [item["status"] for item in response["results"]] == ["COMPLETED", "COMPLETED", "rejected", "rejected", "ok"]
+    assert db.query(JobResult).filter(JobResult.job_id == job.id).count() == 1
+    assert "poll_seconds" in response["intervals"]
+
+
+def test_agent_batch_rolls_back_only_the_failing_item(monkeypatch):
+    db = setup_db()
+    server = Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="flaky")
+    db.add(server)
+    db.commit()
+    inventory = {"hostname": "a", "ip": "10.0.0.1", "os_name": "Ubuntu", "os_version": "22.04", "kernel_version": "6.1", "package_manager": "apt", "last_update_time": None, "reboot_required": False, "updates": []}
+    record_heartbeat = agent_router.record_heartbeat
+    calls = []
+
+    def flaky_heartbeat(db, server, inventory, telemetry):
+        calls.append(inventory.kernel_version)
+        record_heartbeat(db, server, inventory, telemetry)
+        if inventory.kernel_version == "broken":
+            db.flush()
+            raise RuntimeError("unexpected")
+
+    monkeypatch.setattr(agent_router, "record_heartbeat", flaky_heartbeat)
+    payload = AgentBatchIn(items=[
+        {"type": "heartbeat", "payload": {"inventory": dict(inventory, kernel_version="broken")}},
+        {"type": "heartbeat", "payload": {"inventory": inventory}},
+    ])
+    request = Request({"type": "http", "headers": [(b"x-agent-token", b"flaky")]})
+    response = submit_batch(payload, request, db)
+    assert [item["status"] for item in response["results"]] == ["rejected", "ok"]
+    assert calls == ["broken", "6.1"]
+    db.refresh(server)
+    assert server.kernel_version == "6.1"
+    assert server.last_seen is not None
+
+
+def test_agent_sync_records_results_and_claims_in_one_commit():
+    db = setup_db()
+    now = datetime.now(timezone.utc)
+    server = Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="sync", inventory_fingerprint="f1")
+    db.add(server)
+    db.commit()
+    running = Job(server_id=server.id, job_type="SCAN_NOW", status="RUNNING", requires_approval=False, created_at=now, updated_at=now)
+    queued = Job(server_id=server.id, job_type="APPLY_PATCHES", status="QUEUED", requires_approval=False, created_at=now, updated_at=now)
+    db.add_all([running, queued])
+    db.commit()
+    commits = []
+    event.listen(db.get_bind(), "commit", lambda conn: commits.append(conn))
+    inventory = {"hostname": "a", "ip": "10.0.0.1", "os_name": "Ubuntu", "os_version": "22.04", "kernel_version": "6.1", "package_manager": "apt", "last_update_time": None, "reboot_required": False, "updates": []}
+    result = {"job_id": running.id, "started_at": now.isoformat(), "finished_at": now.isoformat(), "exit_code": 0, "stdout": "ok", "stderr": "", "status": "COMPLETED", "inventory": inventory, "inventory_fingerprint": "f2"}
+    request = Request({"type": "http", "headers": [(b"x-agent-token", b"sync")]})
+    response = sync_agent(AgentSyncIn(results=[result], inventory_fingerprint="f2", telemetry={"scan_seconds": 3.5}), request, db)
+    assert response["results"] == [{"job_id": running.id, "status": "COMPLETED"}]
+    assert response["inventory"] == "unchanged"
+    assert [job["id"] for job in response["jobs"]] == [queued.id]
+    assert len(commits) == 1
+    assert db.query(Inventory).count() == 1
+    assert server.scan_seconds == 3.5
+    assert '"scan_seconds":3.5' in db.query(Inventory).one().telemetry
+    response = sync_agent(AgentSyncIn(inventory_fingerprint="f3", claim=False), request, db)
+    assert response["inventory"] == "required"
+    assert response["jobs"] == []
+
+
+def test_slowest_scans_use_latest_telemetry():
+    db = setup_db()
+    fast = Server(hostname="fast", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="fast")
+    slow = Server(hostname="slow", ip="10.0.0.2", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="slow")
+    db.add_all([fast, slow])
+    db.commit()
+    inventory = {"ip": "10.0.0.1", "os_name": "Ubuntu", "os_version": "22.04", "kernel_version": "6.1", "package_manager": "apt", "last_update_time": None, "reboot_required": False, "updates": []}
+    store_inventory(db, fast, InventoryIn(hostname="fast", **inventory), AgentTelemetryIn(scan_seconds=2.5))
+    store_inventory(db, slow, InventoryIn(hostname="slow", **inventory), AgentTelemetryIn(scan_seconds=5.0))
+    store_inventory(db, slow, InventoryIn(hostname="slow", **inventory), AgentTelemetryIn(scan_seconds=48.0, commands={"apt-get -s": {"count": 1, "seconds": 47.1}}))
+    store_inventory(db, slow, InventoryIn(hostname="slow", **inventory))
+    scans = slowest_scans(db, limit=10)
+    assert [scan["hostname"] for scan in scans] == ["slow", "fast"]
+    assert scans[0]["scan_seconds"] == 48.0
+    assert scans[0]["telemetry"].commands["apt-get -s"]["seconds"] == 47.1
+
+
+def test_relay_sync_processes_each_agent(monkeypatch):
+    db = setup_db()
+    server = Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="known", inventory_fingerprint="f1")
+    broken = Server(hostname="b", ip="10.0.0.2", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="broken", inventory_fingerprint="f1")
+    db.add_all([server, broken])
+    db.commit()
+    payload = RelaySyncIn(items=[
+        {"agent_token": "known", "sync": {"inventory_fingerprint": "f1"}},
+        {"agent_token": "broken", "sync": {"inventory_fingerprint": "f1"}},
+        {"agent_token": "unknown", "sync": {"inventory_fingerprint": "f1"}},
+    ])
+    request = Request({"type": "http", "headers": [(b"x-relay-token", b"relay")]})
+    with pytest.raises(HTTPException):
+        relay_sync(payload, request, db)
+    record_heartbeat = agent_router.record_heartbeat
+
+    def failing_heartbeat(db, server, *args):
+        record_heartbeat(db, server, *args)
+        if server.agent_token == "broken":
+            db.flush()
+            raise OperationalError("UPDATE servers", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(agent_router, "record_heartbeat", failing_heartbeat)
+    monkeypatch.setattr(settings, "relay_token", "relay")
+    response = relay_sync(payload, request, db)
+    assert [agent["status"] for agent in response["agents"]] == ["ok", "rejected", "rejected"]
+    assert response["agents"][0]["inventory"] == "unchanged"
+    assert response["agents"][1]["detail"] == "Sync failed"
+    assert server.last_seen is not None
+    db.refresh(broken)
+    assert broken.last_seen is None
+
+
+def test_reads_use_replica_until_the_caller_writes(monkeypatch):
+    primary = create_engine("sqlite://", poolclass=StaticPool)
+    replica = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(primary)
+    Base.metadata.create_all(replica)
+    monkeypatch.setattr(settings, "database_replica_url", "sqlite://")
+    monkeypatch.setattr(session, "read_engine", replica)
+    monkeypatch.setattr(session, "recent_writes", {})
+    monkeypatch.setitem(session.SessionLocal.kw, "bind", primary)
+    monkeypatch.setitem(session.ReadSessionLocal.kw, "bind", replica)
+
+    def request(token):
+        return Request({"type": "http", "headers": [(b"authorization", token)]})
+
+    def write_server(token, hostname):
+        dependency = get_db(request(token))
+        db = next(dependency)
+        db.add(Server(hostname=hostname, ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token=hostname))
+        db.commit()
+        dependency.close()
+
+    def read_hostnames(token):
+        dependency = get_read_db(request(token))
+        db = next(dependency)
+        hostnames = [server.hostname for server in db.query(Server).order_by(Server.id)]
+        dependency.close()
+        return hostnames
+
+    write_server(b"Bearer alice", "web-1")
+    assert read_hostnames(b"Bearer bob") == []
+    assert read_hostnames(b"Bearer alice") == ["web-1"]
+    monkeypatch.setattr(settings, "replica_read_after_write_seconds", 0)
+    write_server(b"Bearer carol", "web-2")
+    assert read_hostnames(b"Bearer carol") == []
+    dependency = get_auth_db()
+    assert next(dependency).query(Server).count() == 2
+    dependency.close()
+
+
+def test_tuned_sqlite_serializes_writers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/autopatch.db")
+    tune_sqlite(engine, WriterLock(timeout=0.2))
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+    first = engine.connect()
+    first.exec_driver_sql("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+    with pytest.raises(TimeoutError, match="held by this thread"):
+        engine.connect().exec_driver_sql("INSERT INTO items DEFAULT VALUES")
+    first.commit()
+    first.close()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO items DEFAULT VALUES")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM items").scalar() == 1
+
+
+def test_register_server_upserts_on_host_identity():
+    db = setup_db()
+    body = {"hostname": "web-1", "ip": "10.0.0.1", "machine_id": "a" * 32, "os_name": "Ubuntu", "os_version": "22.04", "kernel_version": "6.1", "package_manager": "apt"}
+    first = register_server(db, body)
+    second = register_server(db, {**body, "os_name": None, "kernel_version": "6.5"})
+    clone = register_server(db, {**body, "machine_id": "b" * 32})
+    assert second["server_id"] == first["server_id"] != clone["server_id"]
+    server = db.get(Server, first["server_id"])
+    assert (server.os_name, server.kernel_version, server.agent_token, server.version) == ("Ubuntu", "6.5", second["agent_token"], 2)
+    assert [log.action for log in db.query(AuditLog).order_by(AuditLog.id)] == ["agent_registered", "agent_token_rotated", "agent_registered"]
+
+
+def test_register_server_adopts_row_registered_without_machine_id():
+    db = setup_db()
+    body = {"hostname": "web-1", "ip": "10.0.0.1"}
+    legacy = register_server(db, body)
+    db.execute(update(Server).values(version=0))
+    db.commit()
+    upgraded = register_server(db, {**body, "machine_id": "a" * 32})
+    again = register_server(db, {**body, "machine_id": "a" * 32})
+    assert legacy["server_id"] == upgraded["server_id"] == again["server_id"]
+    assert db.query(Server).count() == 1
+    assert db.query(Server.machine_id).scalar() == "a" * 32
+    assert [log.action for log in db.query(AuditLog).order_by(AuditLog.id)] == ["agent_registered", "agent_token_rotated", "agent_token_rotated"]
+
+
+def test_metrics_require_a_token(monkeypatch):
+    def request(authorization):
+        return Request({"type": "http", "headers": [(b"authorization", authorization)]})
+
+    monkeypatch.setattr(settings, "metrics_token", None)
+    with pytest.raises(HTTPException) as exc:
+        metrics(request(b""))
+    assert exc.value.status_code == 403
+    monkeypatch.setattr(settings, "metrics_token", "scrape")
+    with pytest.raises(HTTPException) as exc:
+        metrics(request(b"Bearer wrong"))
+    assert exc.value.status_code == 401
+    assert metrics(request(b"Bearer scrape")).status_code == 200
+
+
+def test_async_handlers_are_profiled_one_at_a_time(monkeypatch):
+    profiled = []
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    monkeypatch.setattr(core_metrics, "start_profiler", lambda: object())
+    monkeypatch.setattr(core_metrics, "stop_profiler", lambda name, profiler: profiled.append(name))
+
+    async def slow_endpoint():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    endpoint = core_metrics.sampled_profile(slow_endpoint)
+
+    async def overlapping():
+        return await asyncio.gather(endpoint(), endpoint(), endpoint())
+
+    assert asyncio.run(overlapping()) == ["ok", "ok", "ok"]
+    assert profiled == ["slow_endpoint"]
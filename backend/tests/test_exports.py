@@ -0,0 +1,43 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.base import Base
+from app.db.models import AuditLog
+from app.services import exports
+from app.services.exports import audit_statement, stream_export
+
+
+def setup_sessions(rows: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    now = datetime.now(timezone.utc)
+    db.add_all([AuditLog(actor_type="agent", actor_id=index, action="heartbeat", message=f"host,{index}", created_at=now) for index in range(rows)])
+    db.commit()
+    db.close()
+    return factory
+
+
+def test_csv_export_streams_in_batches(monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_BATCH_SIZE", 10)
+    factory = setup_sessions(25)
+    chunks = list(stream_export(audit_statement(), "csv", False, factory))
+    assert len(chunks) > 3
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert len(rows) == 25
+    assert rows[3]["message"] == "host,3"
+
+
+def test_gzip_ndjson_export():
+    factory = setup_sessions(5)
+    data = gzip.decompress(b"".join(stream_export(audit_statement(), "ndjson", True, factory)))
+    records = [json.loads(line) for line in data.decode().splitlines()]
+    assert [record["actor_id"] for record in records] == [0, 1, 2, 3, 4]
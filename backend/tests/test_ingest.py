@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.models import IngestItem, Inventory, Job, JobResult, Server
+from app.schemas import AgentHeartbeat, AgentJobResultIn
+from app.services.ingest import IngestQueueFull, drain_ingest_queue, enqueue_item, ingest_stats
+
+
+def setup_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def inventory(hostname: str) -> dict:
+    return {"hostname": hostname, "ip": "10.0.0.1", "os_name": "Ubuntu", "os_version": "22.04", "kernel_version": "6.1", "package_manager": "apt", "last_update_time": None, "reboot_required": False, "updates": []}
+
+
+def test_drain_coalesces_heartbeats_and_commits_once(monkeypatch):
+    monkeypatch.setitem(ingest_stats, "depth_checked_at", 0.0)
+    db = setup_db()
+    now = datetime.now(timezone.utc)
+    server = Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="t")
+    db.add(server)
+    db.commit()
+    job = Job(server_id=server.id, job_type="SCAN_NOW", status="RUNNING", requires_approval=False, created_at=now, updated_at=now)
+    db.add(job)
+    db.commit()
+    enqueue_item(db, server, "heartbeat", AgentHeartbeat(inventory=inventory("old")).model_dump_json())
+    enqueue_item(db, server, "heartbeat", AgentHeartbeat(inventory=inventory("new"), inventory_fingerprint="f").model_dump_json())
+    result = AgentJobResultIn(job_id=job.id, started_at=now, finished_at=now, exit_code=0, stdout="", stderr="", status="COMPLETED", inventory=inventory("new"))
+    enqueue_item(db, server, "result", result.model_dump_json())
+    received = now - timedelta(minutes=3)
+    db.query(IngestItem).update({IngestItem.created_at: received})
+    commits = []
+    event.listen(db.get_bind(), "commit", lambda conn: commits.append(conn))
+    assert drain_ingest_queue(db) == 3
+    assert len(commits) == 2
+    assert db.query(IngestItem).count() == 0
+    assert [row.hostname for row in db.query(Inventory).order_by(Inventory.id)] == ["new", "new"]
+    assert db.query(JobResult).count() == 1
+    assert server.last_seen.replace(tzinfo=timezone.utc) == received
+    db.refresh(job)
+    assert job.status == "COMPLETED"
+
+
+def test_full_queue_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "ingest_queue_max", 1)
+    monkeypatch.setitem(ingest_stats, "depth_checked_at", 0.0)
+    db = setup_db()
+    server = Server(hostname="a", ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token="t")
+    db.add(server)
+    db.commit()
+    enqueue_item(db, server, "heartbeat", "{}")
+    with pytest.raises(IngestQueueFull):
+        enqueue_item(db, server, "heartbeat", "{}")
@@ -0,0 +1,95 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.models import Server, ServerPackage, Update
+from app.schemas import InventoryIn
+from app.services.inventory import store_inventory
+from app.services.packages import compare_versions, find_package_hosts
+
+
+def setup_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def make_inventory(hostname: str, updates: list[dict], security_updates: list[dict] | None = None) -> InventoryIn:
+    return InventoryIn(
+        hostname=hostname,
+        ip="10.0.0.1",
+        os_name="Ubuntu",
+        os_version="22.04",
+        kernel_version="6.1",
+        package_manager="apt",
+        last_update_time=None,
+        reboot_required=False,
+        updates=updates,
+        security_updates=security_updates or [],
+    )
+
+
+def add_server(db, hostname: str) -> Server:
+    server = Server(hostname=hostname, ip="10.0.0.1", os_name="Ubuntu", os_version="22.04", kernel_version="6.1", package_manager="apt", agent_token=hostname)
+    db.add(server)
+    db.commit()
+    return server
+
+
+def test_compare_versions():
+    assert compare_versions("3.0.2-0ubuntu1.10", "3.0.13") < 0
+    assert compare_versions("3.0.13", "3.0.13") == 0
+    assert compare_versions("1:1.0", "2.0") > 0
+    assert compare_versions("1.0~rc1", "1.0") < 0
+    assert compare_versions("1.0a", "1.0") > 0
+
+
+def test_package_index_tracks_latest_inventory():
+    db = setup_db()
+    old = add_server(db, "old")
+    new = add_server(db, "new")
+    store_inventory(db, old, make_inventory("old", [
+        {"name": "openssl", "current_version": "3.0.2", "candidate_version": "3.0.13", "is_security": False},
+        {"name": "openssh-server", "current_version": "8.9p1", "candidate_version": "8.9p1-3", "is_security": False},
+    ], [{"name": "openssl", "current_version": None, "candidate_version": None, "is_security": True}]))
+    store_inventory(db, new, make_inventory("new", [
+        {"name": "openssl", "current_version": "3.0.13", "candidate_version": "3.0.14", "is_security": False},
+    ]))
+    hosts = find_package_hosts(db, name="openssl", current_below="3.0.13")
+    assert [host["hostname"] for host in hosts] == ["old"]
+    assert hosts[0]["is_security"] is True
+    assert len(find_package_hosts(db, prefix="open")) == 3
+    store_inventory(db, old, make_inventory("old", []))
+    assert db.query(ServerPackage).filter(ServerPackage.server_id == old.id).count() == 0
+    assert [host["hostname"] for host in find_package_hosts(db, prefix="openssl")] == ["new"]
+
+
+def test_package_search_skips_unknown_versions_and_stops_at_limit():
+    db = setup_db()
+    for hostname, current in [("apt-1", "3.0.2"), ("yum-1", None), ("apt-2", "3.0.5"), ("apt-3", "3.0.14")]:
+        server = add_server(db, hostname)
+        store_inventory(db, server, make_inventory(hostname, [
+            {"name": "openssl", "current_version": current, "candidate_version": "3.0.14", "is_security": True},
+        ]))
+    db.commit()
+    hosts = find_package_hosts(db, name="openssl", current_below="3.0.13")
+    assert [host["hostname"] for host in hosts] == ["apt-1", "apt-2"]
+    assert [host["hostname"] for host in find_package_hosts(db, name="openssl", current_below="3.0.13", limit=1)] == ["apt-1"]
+    assert len(find_package_hosts(db, name="openssl", limit=3)) == 3
+
+
+def test_inventory_stores_one_row_per_package():
+    db = setup_db()
+    server = add_server(db, "legacy")
+    legacy = store_inventory(db, server, make_inventory("legacy", [
+        {"name": "openssl", "current_version": "3.0.2", "candidate_version": "3.0.13", "is_security": False},
+        {"name": "vim", "current_version": "8.2", "candidate_version": "8.2.1", "is_security": False},
+    ], [{"name": "openssl", "current_version": None, "candidate_version": None, "is_security": True}]))
+    merged = store_inventory(db, server, make_inventory("legacy", [
+        {"name": "openssl", "current_version": "3.0.2", "candidate_version": "3.0.13", "is_security": True},
+        {"name": "vim", "current_version": "8.2", "candidate_version": "8.2.1", "is_security": False},
+    ]))
+    for inventory in (legacy, merged):
+        assert (inventory.updates_count, inventory.security_updates_count) == (2, 1)
+        rows = db.query(Update).filter(Update.inventory_id == inventory.id).order_by(Update.name).all()
+        assert [(row.name, row.candidate_version, row.is_security) for row in rows] == [("openssl", "3.0.13", True), ("vim", "8.2.1", False)]
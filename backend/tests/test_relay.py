@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.relay.forwarder import Relay
+
+
+def stand_in_backend(requests: list, queued: dict, stored: list):
+    fingerprints = {}
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/agent/sync":
+            results = json.loads(request.content)["results"]
+            stored.extend((request.headers["X-AGENT-TOKEN"], result) for result in results)
+            statuses = [{"job_id": result["job_id"], "status": result["status"]} for result in results]
+            return httpx.Response(200, json={"version": 1, "inventory": None, "results": statuses, "jobs": [], "intervals": {"poll_seconds": 15}})
+        assert request.headers["X-RELAY-TOKEN"] == "relay"
+        items = json.loads(request.content)["items"]
+        requests.append(items)
+        agents = []
+        for item in items:
+            token, sync = item["agent_token"], item["sync"]
+            if token == "revoked":
+                agents.append({"status": "rejected", "detail": "Invalid agent token"})
+                continue
+            inventory = None
+            if "inventory" in sync:
+                fingerprints[token] = sync["inventory_fingerprint"]
+                inventory = "stored"
+            elif "inventory_fingerprint" in sync:
+                inventory = "unchanged" if fingerprints.get(token) == sync["inventory_fingerprint"] else "required"
+            jobs = [queued.pop(token)] if sync["claim"] and token in queued else []
+            agents.append({"status": "ok", "inventory": inventory, "jobs": jobs, "intervals": {"poll_seconds": 15}})
+        return httpx.Response(200, json={"agents": agents})
+
+    return handle
+
+
+def test_relay_batches_agents_caches_inventories_and_fans_out_jobs():
+    requests, stored = [], []
+    queued = {"a": {"id": 7, "job_type": "SCAN_NOW", "lease_seconds": 300}}
+
+    async def scenario():
+        client = httpx.AsyncClient(base_url="http://backend", transport=httpx.MockTransport(stand_in_backend(requests, queued, stored)))
+        relay = Relay(client, "relay", poll_wait_seconds=1)
+        inventory = {"hostname": "h", "updates": []}
+        for token in ["a", "b", "revoked"]:
+            relay.heartbeat(token, inventory, None)
+        waiting = asyncio.create_task(relay.wait_for_jobs("a"))
+        await asyncio.sleep(0)
+        await relay.flush()
+        jobs = await waiting
+        for token in ["a", "b"]:
+            relay.heartbeat(token, inventory, None)
+            relay.heartbeat(token, inventory, None)
+        await relay.flush()
+        await relay.flush()
+        response = await relay.submit_results("a", [{"job_id": 7, "status": "COMPLETED", "inventory_fingerprint": "after-7"}])
+        assert response.json()["results"] == [{"job_id": 7, "status": "COMPLETED"}]
+        assert stored == [("a", {"job_id": 7, "status": "COMPLETED", "inventory_fingerprint": "after-7"})]
+        return relay, jobs
+
+    relay, jobs = asyncio.run(scenario())
+    assert jobs == [{"id": 7, "job_type": "SCAN_NOW", "lease_seconds": 300}]
+    assert len(requests) == 2
+    assert [item["agent_token"] for item in requests[0]] == ["a", "b", "revoked"]
+    assert all("inventory" in item["sync"] for item in requests[0])
+    assert [item["agent_token"] for item in requests[1]] == ["a", "b"]
+    assert not any("inventory" in item["sync"] for item in requests[1])
+    assert requests[1][0]["sync"]["results"] == []
+    assert relay.agents["a"].acked == "after-7"
+    assert relay.intervals("a") == {"poll_seconds": 15}
+    assert "revoked" in relay.invalid
+
+
+def test_relay_keeps_pending_work_while_backend_is_down():
+    calls = []
+
+    def unavailable(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(503)
+
+    async def scenario():
+        client = httpx.AsyncClient(base_url="http://backend", transport=httpx.MockTransport(unavailable))
+        relay = Relay(client, "relay", batch_agents=1)
+        relay.heartbeat("a", {"hostname": "a"}, None)
+        relay.heartbeat("b", {"hostname": "b"}, None)
+        await relay.flush()
+        response = await relay.submit_results("a", [{"job_id": 1}])
+        return relay, response
+
+    relay, response = asyncio.run(scenario())
+    assert response.status_code == 503
+    assert len(calls) == 2
+    assert relay.agents["a"].heartbeat["inventory"] == {"hostname": "a"}
+    assert relay.agents["b"].pending()
+    assert relay.stats["backend_errors"] == 1
+
+
+def test_relay_bounds_unverified_agents_and_refuses_invalid_tokens():
+    requests = []
+
+    async def scenario():
+        client = httpx.AsyncClient(base_url="http://backend", transport=httpx.MockTransport(stand_in_backend(requests, {}, [])))
+        relay = Relay(client, "relay", max_unverified_agents=2, agent_ttl_seconds=60)
+        relay.heartbeat("a", {"hostname": "a"}, None)
+        relay.heartbeat("revoked", {"hostname": "r"}, None)
+        with pytest.raises(HTTPException) as full:
+            relay.heartbeat("b", {"hostname": "b"}, None)
+        await relay.flush()
+        with pytest.raises(HTTPException) as invalid:
+            relay.heartbeat("revoked", {"hostname": "r"}, None)
+        relay.heartbeat("b", {"hostname": "b"}, None)
+        relay.agents["a"].seen -= 120
+        await relay.flush()
+        return relay, full.value, invalid.value
+
+    relay, full, invalid = asyncio.run(scenario())
+    assert (full.status_code, invalid.status_code) == (503, 401)
+    assert list(relay.agents) == ["b"]
+    assert relay.unverified == set()
+    assert list(relay.invalid) == ["revoked"]
+    assert relay.stats["evicted"] == 1
@@ -0,0 +1,73 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.models import AuditLog, Inventory, Job, Server
+from app.routers.servers import list_servers
+from app.schemas import AuditLogOut, JobOut, ServerOut
+from app.services.serialization import audit_rows, dumps, job_rows, server_rows
+
+
+def setup_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    now = datetime.now(timezone.utc)
+    for index, (seen, updates, security, reboot) in enumerate([
+        (now, 0, 0, False),
+        (now, 4, 1, False),
+        (now, 2, 0, True),
+        (now, 0, 0, True),
+        (now - timedelta(hours=2), 1, 0, False),
+        (None, 0, 0, False),
+    ]):
+        db.add(Server(
+            hostname=f"host-{index}", ip=f"10.0.0.{index}", os_name="Ubuntu", os_version="22.04", kernel_version="6.1",
+            package_manager="apt", agent_token=f"token-{index}", last_seen=seen, updates_count=updates,
+            security_updates_count=security, reboot_required=reboot,
+        ))
+    db.commit()
+    for server in db.query(Server).filter(Server.last_seen != None):
+        for collected_at, scale in [(now - timedelta(days=1), 2), (now, 1)]:
+            db.add(Inventory(
+                server_id=server.id, collected_at=collected_at, hostname=server.hostname, ip=server.ip, os_name=server.os_name,
+                os_version=server.os_version, kernel_version=server.kernel_version, package_manager=server.package_manager,
+                updates_count=server.updates_count * scale + scale - 1, security_updates_count=server.security_updates_count * scale,
+                reboot_required=server.reboot_required,
+            ))
+    db.commit()
+    for index in range(5):
+        db.add(Job(
+            server_id=1, job_type="SCAN_NOW", status="QUEUED", scheduled_at=now if index % 2 else None,
+            requires_approval=bool(index % 2), approval_reason="ok" if index % 2 else None,
+            created_at=now - timedelta(minutes=index), updated_at=now,
+        ))
+        db.add(AuditLog(actor_type="user", actor_id=1, action="job_created", target_type="job", target_id=index, message="ünïcode", created_at=now - timedelta(minutes=index)))
+    db.commit()
+    return db
+
+
+def test_job_and_audit_parity():
+    db = setup_db()
+    jobs = db.query(Job).order_by(Job.created_at.desc()).all()
+    expected = TypeAdapter(list[JobOut]).dump_python(jobs, mode="json")
+    assert json.loads(dumps(job_rows(db))) == expected
+    logs = db.query(AuditLog).order_by(AuditLog.created_at.desc()).all()
+    expected = TypeAdapter(list[AuditLogOut]).dump_python(logs, mode="json")
+    assert json.loads(dumps(audit_rows(db))) == expected
+
+
+def test_server_parity(monkeypatch):
+    db = setup_db()
+    monkeypatch.setattr(settings, "fast_json_responses", False)
+    request = Request({"type": "http", "method": "GET", "path": "/api/servers", "headers": []})
+    expected = TypeAdapter(list[ServerOut]).dump_python(list_servers(request, Response(), db, None), mode="json")
+    assert json.loads(dumps(server_rows(db))) == expected
+    assert [row["status"] for row in expected] == ["up_to_date", "security", "updates", "reboot", "offline", "offline"]
@@ -2,6 +2,8 @@
 
 import { useEffect, useState } from "react"
 
+import { eventStream } from "../events"
+
 const apiBase = process.env.NEXT_PUBLIC_API_BASE
 
 export default function ApprovalsPage() {
@@ -20,6 +22,18 @@ export default function ApprovalsPage() {
     })
       .then((res) => res.json())
       .then(setItems)
+    const events = eventStream(token)
+    events.addEventListener("approval_created", (event) => {
+      const job = JSON.parse(event.data)
+      setItems((prev) => (prev.some((item) => item.id === job.id) ? prev : [job, ...prev]))
+    })
+    events.addEventListener("job_updated", (event) => {
+      const job = JSON.parse(event.data)
+      if (job.status !== "PENDING_APPROVAL") {
+        setItems((prev) => prev.filter((item) => item.id !== job.id))
+      }
+    })
+    return () => events.close()
   }, [])
 
   const act = async (jobId, action) => {
@@ -0,0 +1,52 @@
+const apiBase = process.env.NEXT_PUBLIC_API_BASE
+
+const RECONNECT_MS = 5000
+
+export function eventStream(token) {
+  const listeners = []
+  let source = null
+  let retry = null
+  let cursor = null
+  let closed = false
+
+  const attach = (type, listener) =>
+    source.addEventListener(type, (event) => {
+      cursor = event.lastEventId || cursor
+      listener(event)
+    })
+
+  const open = async () => {
+    const res = await fetch(`${apiBase}/api/events/ticket`, {
+      method: "POST",
+      headers: { Authorization: `Bearer ${token}` }
+    }).catch(() => null)
+    if (closed || (res && res.status === 401)) return
+    if (!res || !res.ok) {
+      retry = setTimeout(open, RECONNECT_MS)
+      return
+    }
+    const { ticket } = await res.json()
+    if (closed) return
+    const params = new URLSearchParams({ ticket })
+    if (cursor) params.set("cursor", cursor)
+    source = new EventSource(`${apiBase}/api/events/stream?${params}`)
+    listeners.forEach(([type, listener]) => attach(type, listener))
+    source.onerror = () => {
+      source.close()
+      if (!closed) retry = setTimeout(open, RECONNECT_MS)
+    }
+  }
+
+  open()
+  return {
+    addEventListener(type, listener) {
+      listeners.push([type, listener])
+      if (source) attach(type, listener)
+    },
+    close() {
+      closed = true
+      clearTimeout(retry)
+      if (source) source.close()
+    }
+  }
+}
@@ -2,6 +2,8 @@
 
 import { useEffect, useState } from "react"
 
+import { eventStream } from "./events"
+
 const apiBase = process.env.NEXT_PUBLIC_API_BASE
 
 function statusBadge(status) {
@@ -17,6 +19,7 @@ function statusBadge(status) {
 
 export default function HomePage() {
   const [servers, setServers] = useState([])
+  const [summary, setSummary] = useState(null)
   const [filter, setFilter] = useState("")
 
   useEffect(() => {
@@ -30,6 +33,24 @@ export default function HomePage() {
     })
       .then((res) => res.json())
       .then(setServers)
+    const loadSummary = () =>
+      fetch(`${apiBase}/api/fleet/summary`, {
+        headers: { Authorization: `Bearer ${token}` }
+      })
+        .then((res) => res.json())
+        .then(setSummary)
+    loadSummary()
+    const events = eventStream(token)
+    events.addEventListener("server_status", (event) => {
+      const update = JSON.parse(event.data)
+      setServers((prev) => {
+        const exists = prev.some((srv) => srv.id === update.id)
+        if (!exists) return [...prev, update]
+        return prev.map((srv) => (srv.id === update.id ? { ...srv, ...update } : srv))
+      })
+      loadSummary()
+    })
+    return () => events.close()
   }, [])
 
   const filtered = servers.filter((srv) => srv.hostname.toLowerCase().includes(filter.toLowerCase()))
@@ -40,6 +61,20 @@ export default function HomePage() {
         <h1 className="text-2xl font-semibold">Servers</h1>
         <input placeholder="Search hostname" value={filter} onChange={(e) => setFilter(e.target.value)} />
       </div>
+      {summary && (
+        <div className="grid grid-cols-3 gap-4 md:grid-cols-6">
+          <div className="rounded-xl border border-slate-800 bg-slate-950 p-4">
+            <div className="text-xs text-slate-400">Total</div>
+            <div className="text-2xl font-semibold">{summary.total}</div>
+          </div>
+          {["up_to_date", "updates", "security", "reboot", "offline"].map((status) => (
+            <div key={status} className="rounded-xl border border-slate-800 bg-slate-950 p-4">
+              <div className="text-xs text-slate-400">{status}</div>
+              <div className="text-2xl font-semibold">{summary.by_status[status] || 0}</div>
+            </div>
+          ))}
+        </div>
+      )}
       <div className="rounded-xl border border-slate-800 bg-slate-950 p-4">
         <table>
           <thead>
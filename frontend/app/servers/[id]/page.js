@@ -2,6 +2,8 @@
 
 import { useEffect, useState } from "react"
 
+import { eventStream } from "../../events"
+
 const apiBase = process.env.NEXT_PUBLIC_API_BASE
 
 export default function ServerDetail({ params }) {
@@ -32,6 +34,29 @@ export default function ServerDetail({ params }) {
     fetch(`${apiBase}/api/servers/${params.id}/jobs`, { headers: { Authorization: `Bearer ${token}` } })
       .then((res) => res.json())
       .then(setJobs)
+    const events = eventStream(token)
+    const applyJob = (event) => {
+      const job = JSON.parse(event.data)
+      if (job.server_id !== Number(params.id)) return
+      setJobs((prev) => {
+        const exists = prev.some((item) => item.id === job.id)
+        if (!exists) return [job, ...prev]
+        return prev.map((item) => (item.id === job.id ? { ...item, ...job } : item))
+      })
+    }
+    events.addEventListener("job_updated", applyJob)
+    events.addEventListener("approval_created", applyJob)
+    events.addEventListener("server_status", (event) => {
+      const update = JSON.parse(event.data)
+      if (update.id !== Number(params.id)) return
+      fetch(`${apiBase}/api/servers/${params.id}/inventory`, { headers: { Authorization: `Bearer ${token}` } })
+        .then((res) => res.json())
+        .then(setInventory)
+      fetch(`${apiBase}/api/servers/${params.id}/updates`, { headers: { Authorization: `Bearer ${token}` } })
+        .then((res) => res.json())
+        .then(setUpdates)
+    })
+    return () => events.close()
   }, [params.id])
 
   const loadLogs = async (jobId) => {
@@ -43,7 +68,11 @@ export default function ServerDetail({ params }) {
     if (res.ok) {
       const data = await res.json()
       const merged = data
-        .map((item) => `Status: ${item.status}\nExit: ${item.exit_code}\nStdout:\n${item.stdout || ""}\nStderr:\n${item.stderr || ""}`)
+        .map((item) => {
+          const staged = item.staged_bytes != null ? `Staged: ${item.staged_bytes} bytes\n` : ""
+          const install = item.install_seconds != null ? `Install: ${item.install_seconds}s\n` : ""
+          return `Status: ${item.status}\nExit: ${item.exit_code}\n${staged}${install}Stdout:\n${item.stdout || ""}\nStderr:\n${item.stderr || ""}`
+        })
         .join("\n\n")
       setLogs(merged || "No logs")
     } else {
@@ -105,6 +134,7 @@ export default function ServerDetail({ params }) {
         <div className="grid grid-cols-2 gap-4">
           <select value={jobType} onChange={(e) => setJobType(e.target.value)}>
             <option value="SCAN_NOW">SCAN_NOW</option>
+            <option value="PREFETCH_PACKAGES">PREFETCH_PACKAGES</option>
             <option value="APPLY_PATCHES">APPLY_PATCHES</option>
             <option value="APPLY_SECURITY_ONLY">APPLY_SECURITY_ONLY</option>
             <option value="REPORT_ONLY">REPORT_ONLY</option>